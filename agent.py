@@ -1,44 +1,339 @@
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple
 import json
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 import asyncio
 
+import httpx
 import openai
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 from config import config
-from observability import logger, TICKETS_PROCESSED, RUN_DURATION, Timer
-from tools.jira_tools import get_jira_feedback
+from llm_cache import completion_cache, make_cache_key
+from observability import (logger, TICKETS_PROCESSED, RUN_DURATION, STAGE_DURATION, LLM_TOKENS,
+                           LLM_REQUESTS_IN_PROGRESS, Timer, record_error)
+from batch_jobs import build_batch_request, run_batch
+from rate_limit import AsyncRateLimiter, estimate_tokens, parse_retry_after, retry_delay
+from tracing import current_span, start_span
+from tools.jira_tools import get_jira_feedback, parse_jira_timestamp
+from tools.clustering import cluster_tickets, personalize_response
+from tools.story_index import get_story_index
+from tools.watermark_store import INITIAL_WATERMARK, get_watermark_store, ticket_content_hash
+from tools.story_writer import UserStoryResponse
 
-# Initialize OpenAI client
-client = OpenAI(api_key=config.openai_api_key)
+# Shared async OpenAI client, created lazily so all agents reuse one connection pool
+_openai_client: Optional[AsyncOpenAI] = None
+
+# Process-wide OpenAI request and token budget shared by every agent
+openai_rate_limiter = AsyncRateLimiter(config.openai_requests_per_minute, config.openai_tokens_per_minute)
+
+# Errors worth retrying: rate limits, server errors and transport failures
+RETRYABLE_OPENAI_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APIConnectionError
+)
+
+async def observe_rate_limit_headers(response: httpx.Response):
+    """Adapt the shared limiter to the rate-limit headers on every OpenAI response."""
+    openai_rate_limiter.update_from_headers(response.headers)
+
+def get_openai_client() -> AsyncOpenAI:
+    """Return the process-wide async OpenAI client, creating it on first use."""
+    global _openai_client
+    if _openai_client is None:
+        http_client = httpx.AsyncClient(
+            timeout=config.openai_timeout,
+            limits=httpx.Limits(
+                max_connections=config.openai_max_connections,
+                max_keepalive_connections=config.openai_max_keepalive_connections,
+                keepalive_expiry=config.openai_keepalive_expiry
+            ),
+            event_hooks={"response": [observe_rate_limit_headers]}
+        )
+        # Retries are handled in _chat_completion so they respect the shared limiter
+        _openai_client = AsyncOpenAI(
+            api_key=config.openai_api_key,
+            base_url=config.openai_base_url or None,
+            timeout=config.openai_timeout,
+            max_retries=0,
+            http_client=http_client
+        )
+        logger.info("Initialized async OpenAI client",
+                   max_connections=config.openai_max_connections,
+                   max_keepalive_connections=config.openai_max_keepalive_connections)
+    return _openai_client
+
+async def close_openai_client():
+    """Close the shared OpenAI client and its connection pool."""
+    global _openai_client
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
 
 class FeedbackAnalysisResult(BaseModel):
     ticket_id: str
     user_story: Dict[str, Any]
     pm_response: str
+    # Near-duplicate tickets reuse the story generated for their cluster's leader
+    duplicate_of: Optional[str] = None
+    related_ticket_ids: List[str] = []
+
+class CombinedAnalysisResponse(BaseModel):
+    user_story: UserStoryResponse
+    pm_response: str
+
+# Generation modes: "separate" makes one call per artifact, "combined" one structured call per ticket
+GENERATION_MODES = ("separate", "combined")
+
+# Pacing modes: "demo" pauses so the UI can show each step, "none" runs headless
+PACING_MODES = ("demo", "none")
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+DEFAULT_TEMPERATURE = 0.7
+
+# Structured outputs (json_schema) need a model that supports them; gpt-3.5-turbo does not
+STRUCTURED_MODEL = config.structured_model
+COMBINED_MODEL = STRUCTURED_MODEL
+
+# JSON schema matching tools.story_writer.UserStoryResponse
+USER_STORY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "description": {"type": "string"},
+        "acceptance_criteria": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["title", "description", "acceptance_criteria"],
+    "additionalProperties": False
+}
+
+USER_STORY_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "user_story",
+        "strict": True,
+        "schema": USER_STORY_SCHEMA
+    }
+}
+
+COMBINED_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "feedback_analysis",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "user_story": USER_STORY_SCHEMA,
+                "pm_response": {"type": "string"}
+            },
+            "required": ["user_story", "pm_response"],
+            "additionalProperties": False
+        }
+    }
+}
+
+USER_STORY_SYSTEM_PROMPT = """
+You are a Product Manager Assistant. Convert customer feedback into a well-structured user story.
+The user story should include:
+1. title (in the format "As a user, I want to...")
+2. description explaining the value and reasoning
+3. acceptance_criteria: 2-3 criteria that are testable and clear
+"""
+
+REPAIR_PROMPT = """
+Your previous reply did not match the required JSON schema:
+{error}
+
+Reply again with only the corrected JSON object.
+"""
+
+PM_RESPONSE_SYSTEM_PROMPT = """
+You are a Product Manager responding to customer feedback. Write a brief, empathetic response that:
+1. Thanks the user for their feedback
+2. Acknowledges their specific concerns or compliments
+3. Indicates what action will be taken (if appropriate)
+4. Keeps the response under 3-4 sentences
+
+Be professional, helpful, and concise.
+"""
+
+COMBINED_SYSTEM_PROMPT = """
+You are a Product Manager Assistant. For the customer feedback provided, produce:
+1. user_story: a well-structured user story with
+   - title (in the format "As a user, I want to...")
+   - description explaining the value and reasoning
+   - acceptance_criteria: 2-3 criteria that are testable and clear
+2. pm_response: a brief, empathetic reply to the customer that thanks them, acknowledges
+   their specific concerns or compliments, indicates what action will be taken (if
+   appropriate) and stays under 3-4 sentences
+
+Be professional, helpful, and concise.
+"""
+
+def user_story_messages(summary: str, description: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": USER_STORY_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Feedback summary: {summary}\n\nFeedback description: {description}"}
+    ]
+
+def pm_response_messages(ticket_id: str, summary: str, description: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": PM_RESPONSE_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Ticket ID: {ticket_id}\nFeedback summary: {summary}\nFeedback description: {description}"}
+    ]
+
+def combined_analysis_messages(ticket_id: str, summary: str, description: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": COMBINED_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Ticket ID: {ticket_id}\nFeedback summary: {summary}\nFeedback description: {description}"}
+    ]
+
+def repair_messages(messages: List[Dict[str, str]], invalid_output: str,
+                    error: ValidationError) -> List[Dict[str, str]]:
+    """Extend a conversation with the invalid reply and the validation errors to fix."""
+    return messages + [
+        {"role": "assistant", "content": invalid_output},
+        {"role": "user", "content": REPAIR_PROMPT.format(error=error)}
+    ]
+
+def parse_user_story(story_text: str) -> Dict[str, Any]:
+    """Validate a structured user story; raises ValidationError on schema mismatch."""
+    return UserStoryResponse.model_validate_json(story_text).model_dump()
+
+def link_cluster_results(leader_result: FeedbackAnalysisResult, leader: Dict[str, Any],
+                         members: List[Dict[str, Any]]) -> List[FeedbackAnalysisResult]:
+    """Link a cluster leader's result to its members and derive theirs from it."""
+    leader_result.related_ticket_ids = [member["key"] for member in members]
+    return [
+        FeedbackAnalysisResult(
+            ticket_id=member["key"],
+            user_story=leader_result.user_story,
+            pm_response=personalize_response(leader_result.pm_response, leader, member),
+            duplicate_of=leader["key"]
+        )
+        for member in members
+    ]
+
+def record_token_usage(model: str, usage: Any):
+    """Count the prompt and completion tokens a completion reported."""
+    for token_type in ("prompt", "completion"):
+        tokens = getattr(usage, f"{token_type}_tokens", None)
+        if isinstance(tokens, int):
+            LLM_TOKENS.labels(model=model, type=token_type).inc(tokens)
+            current_span().set_attribute(f"{token_type}_tokens", tokens)
+
+def timed_parse(parse, output: str):
+    """Parse structured output, recording its duration and any validation error."""
+    with Timer(STAGE_DURATION.labels(stage="parse")):
+        try:
+            return parse(output)
+        except ValidationError as e:
+            record_error("parse", e)
+            raise
+
+def recall_result(ticket: Dict[str, Any], match: Dict[str, Any]) -> FeedbackAnalysisResult:
+    """Build a ticket's result from a matching story in the story index."""
+    previous = {"key": match["ticket_id"]}
+    return FeedbackAnalysisResult(
+        ticket_id=ticket["key"],
+        user_story=match["user_story"],
+        pm_response=personalize_response(match["pm_response"], previous, ticket),
+        duplicate_of=match["ticket_id"] if match["ticket_id"] != ticket["key"] else None
+    )
+
+def parse_combined_analysis(ticket_id: str, response_text: str) -> FeedbackAnalysisResult:
+    """Validate a combined structured completion; raises on schema mismatch."""
+    analysis = CombinedAnalysisResponse.model_validate_json(response_text)
+    return FeedbackAnalysisResult(
+        ticket_id=ticket_id,
+        user_story=analysis.user_story.model_dump(),
+        pm_response=analysis.pm_response.strip()
+    )
+
+def fetch_incremental(watermark_store, jql: str,
+                      max_results: int) -> Tuple[List[Dict[str, Any]], Dict[int, str], Dict[int, FeedbackAnalysisResult]]:
+    """
+    Fetch the tickets changed since a query's watermark.
+    
+    Returns the tickets, their content hashes and the stored results of the
+    ones whose content is unchanged, all by ticket index. Unchanged tickets
+    do not count toward ``max_results``: while a full page holds fewer than
+    ``max_results`` changed tickets, a larger page is fetched. Otherwise more
+    than ``max_results`` tickets updated in the watermark's minute, as after a
+    bulk edit, would fill every page and the run would never get past them.
+    Blocking; run it in a thread.
+    """
+    updated_since = watermark_store.get_watermark(jql) or INITIAL_WATERMARK
+    limit = max_results
+    while True:
+        tickets_data = get_jira_feedback(jql, limit, updated_since=updated_since)
+        states = watermark_store.get_ticket_states(jql, [ticket["key"] for ticket in tickets_data])
+        content_hashes = {index: ticket_content_hash(ticket) for index, ticket in enumerate(tickets_data)}
+        reused = {}
+        for index, ticket in enumerate(tickets_data):
+            state = states.get(ticket["key"])
+            if state and state[0] == content_hashes[index] and state[1] is not None:
+                reused[index] = FeedbackAnalysisResult(**state[1])
+        if len(tickets_data) < limit or len(tickets_data) - len(reused) >= max_results:
+            break
+        limit *= 2
+    
+    # Stop before the first changed ticket past max_results, so the watermark cannot skip it
+    changed = 0
+    for index in range(len(tickets_data)):
+        if index not in reused:
+            changed += 1
+            if changed > max_results:
+                tickets_data = tickets_data[:index]
+                break
+    return tickets_data, content_hashes, {index: reused[index] for index in reused if index < len(tickets_data)}
 
 class JiraFeedbackAgent:
     """
     Agent that orchestrates the workflow to analyze JIRA feedback tickets.
     """
     
-    def __init__(self, persist_thread: bool = False, user_id: Optional[str] = None):
+    def __init__(self, persist_thread: bool = False, user_id: Optional[str] = None,
+                 concurrency: Optional[int] = None, generation_mode: Optional[str] = None,
+                 pacing: Optional[str] = None, cluster_duplicates: Optional[bool] = None):
         """
         Initialize the agent.
         
         Args:
             persist_thread: Whether to persist the agent thread across requests
             user_id: Optional user ID for personalization
+            concurrency: Maximum number of tickets processed in parallel
+                (defaults to the AGENT_CONCURRENCY setting; 1 processes sequentially)
+            generation_mode: "separate" for one LLM call per artifact or "combined"
+                for a single structured call per ticket (defaults to GENERATION_MODE)
+            pacing: "demo" to pause after each step for the UI or "none" to run
+                without artificial delays (defaults to PACING)
+            cluster_duplicates: Generate one story per cluster of near-duplicate
+                tickets (defaults to CLUSTER_DUPLICATES)
         """
         self.persist_thread = persist_thread
         self.user_id = user_id
         self.thread_id = None
         self.status_callback = None
+        self.concurrency = max(1, concurrency or config.agent_concurrency)
+        self.generation_mode = generation_mode or config.generation_mode
+        
+        self.pacing = pacing or config.pacing
+        self.cluster_duplicates = config.cluster_duplicates if cluster_duplicates is None else cluster_duplicates
+        
+        if self.generation_mode not in GENERATION_MODES:
+            raise ValueError(f"Unknown generation mode: {self.generation_mode}")
+        if self.pacing not in PACING_MODES:
+            raise ValueError(f"Unknown pacing mode: {self.pacing}")
         
         logger.info("Initialized JIRA Feedback Agent", 
                    persist_thread=persist_thread, 
-                   user_id=user_id)
+                   user_id=user_id,
+                   concurrency=self.concurrency,
+                   generation_mode=self.generation_mode,
+                   pacing=self.pacing,
+                   cluster_duplicates=self.cluster_duplicates)
     
     def set_status_callback(self, callback):
         """Set a callback function to receive real-time status updates."""
@@ -50,75 +345,129 @@ class JiraFeedbackAgent:
             self.status_callback(step, message, data)
         logger.info(f"Status update: {step} - {message}")
     
+    async def _pause(self, seconds: float):
+        """Pause so the UI can show a step; skipped when pacing is "none"."""
+        if self.pacing == "demo":
+            with Timer(STAGE_DURATION.labels(stage="pacing")):
+                await asyncio.sleep(seconds)
+    
+    async def _chat_completion(self, messages: List[Dict[str, str]], model: str = DEFAULT_MODEL,
+                               temperature: float = DEFAULT_TEMPERATURE,
+                               response_format: Optional[Dict[str, Any]] = None,
+                               stage: str = "llm") -> str:
+        """
+        Run a chat completion on the shared async client and return the message text.
+        
+        Each attempt first takes a request and estimated tokens from the shared
+        limiter. Rate limits, server errors and connection failures are retried
+        with jittered exponential backoff, honoring Retry-After when present.
+        The whole call, retries included, is timed under ``stage``.
+        """
+        kwargs = {}
+        if response_format is not None:
+            kwargs["response_format"] = response_format
+        estimated_tokens = estimate_tokens(messages)
+        
+        with Timer(STAGE_DURATION.labels(stage=stage)), \
+             LLM_REQUESTS_IN_PROGRESS.labels(model=model).track_inprogress(), \
+             start_span("llm.chat_completion", model=model, stage=stage) as span:
+            for attempt in range(config.openai_max_retries + 1):
+                span.set_attribute("attempts", attempt + 1)
+                await openai_rate_limiter.acquire(estimated_tokens)
+                try:
+                    response = await get_openai_client().chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        **kwargs
+                    )
+                except RETRYABLE_OPENAI_ERRORS as e:
+                    record_error(stage, e)
+                    if attempt == config.openai_max_retries:
+                        raise
+                    response_headers = getattr(getattr(e, "response", None), "headers", {})
+                    delay = retry_delay(attempt, config.openai_retry_base_delay, config.openai_retry_max_delay,
+                                        parse_retry_after(response_headers.get("retry-after")))
+                    if isinstance(e, openai.RateLimitError):
+                        # Back off every caller, not just this one
+                        openai_rate_limiter.pause(delay)
+                    logger.warning("Retrying OpenAI request",
+                                  error=type(e).__name__, attempt=attempt + 1, delay=round(delay, 2))
+                    await asyncio.sleep(delay)
+                    continue
+                except Exception as e:
+                    record_error(stage, e)
+                    raise
+                
+                usage = getattr(response, "usage", None)
+                total_tokens = getattr(usage, "total_tokens", None)
+                if isinstance(total_tokens, int):
+                    openai_rate_limiter.record_usage(estimated_tokens, total_tokens)
+                record_token_usage(model, usage)
+                return response.choices[0].message.content
+    
     async def _create_user_story(self, summary: str, description: str) -> Dict[str, Any]:
         """Create a user story based on the feedback."""
         logger.info("Creating user story", summary=summary)
         
         self.update_status("user_story", "Generating user story from feedback...", None)
         
-        # Use OpenAI to generate a user story
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": """
-You are a Product Manager Assistant. Convert customer feedback into a well-structured user story.
-The user story should include:
-1. Title (in the format "As a user, I want to...")
-2. Description explaining the value and reasoning
-3. 2-3 acceptance criteria that are testable and clear
-"""},
-                {"role": "user", "content": f"Feedback summary: {summary}\n\nFeedback description: {description}"}
-            ],
-            temperature=0.7
+        messages = user_story_messages(summary, description)
+        
+        # Reuse a previously generated story for an identical prompt
+        cache_key = make_cache_key(STRUCTURED_MODEL, DEFAULT_TEMPERATURE, messages, USER_STORY_RESPONSE_FORMAT)
+        cached = await completion_cache.aget(cache_key)
+        current_span().set_attribute("user_story.cache_hit", cached is not None)
+        if cached is not None:
+            self.update_status("user_story", "User story loaded from cache", cached)
+            return cached
+        
+        # Use OpenAI to generate a user story as schema-constrained JSON
+        story_text = await self._chat_completion(
+            model=STRUCTURED_MODEL,
+            messages=messages,
+            temperature=DEFAULT_TEMPERATURE,
+            response_format=USER_STORY_RESPONSE_FORMAT,
+            stage="llm_user_story"
         )
         
-        # Extract the response
-        story_text = response.choices[0].message.content
+        # A second invalid reply propagates so the ticket is reported as failed
+        result = await self._validate_structured_output(
+            messages, story_text, parse_user_story, USER_STORY_RESPONSE_FORMAT
+        )
+        
+        await completion_cache.aset(cache_key, result)
+        self.update_status("user_story", "User story created successfully", result)
+        
+        # Add a pause to make the step visible
+        await self._pause(2)
+        
+        return result
+    
+    async def _validate_structured_output(self, messages: List[Dict[str, str]], output: str, parse,
+                                          response_format: Dict[str, Any]):
+        """
+        Parse a structured completion, asking the model once to repair invalid output.
         
-        # Parse the response - normally we'd have a more robust parser
-        # This is a simple version for demonstration
+        The repair request carries the invalid reply and the validation errors,
+        so only the failing artifact is regenerated.
+        """
         try:
-            lines = story_text.strip().split('\n')
-            title = next((line for line in lines if "As a user" in line), "As a user, I want to improve my experience")
-            
-            # Extract description - assume it's between title and acceptance criteria
-            start_idx = lines.index(title) + 1
-            end_idx = next((i for i, line in enumerate(lines) if "acceptance criteria" in line.lower() or "criteria" in line.lower()), len(lines))
-            description_lines = lines[start_idx:end_idx]
-            description = "\n".join(description_lines).strip()
-            
-            # Extract acceptance criteria
-            criteria = []
-            for line in lines[end_idx:]:
-                if line.strip() and ("- " in line or "* " in line or line[0].isdigit()):
-                    criteria.append(line.replace("- ", "").replace("* ", "").strip())
-            
-            result = {
-                "title": title.strip(),
-                "description": description,
-                "acceptance_criteria": criteria if criteria else ["Functionality works as expected", "User interface is intuitive", "Performance is optimized"]
-            }
-            
-            self.update_status("user_story", "User story created successfully", result)
-            
-            # Add a pause to make the step visible
-            await asyncio.sleep(2)
-            
-            return result
-        except Exception as e:
-            logger.error("Error parsing user story", error=str(e))
-            result = {
-                "title": "As a user, I want to " + summary.lower(),
-                "description": "This feature would improve user experience by addressing the feedback provided.",
-                "acceptance_criteria": ["Functionality works as expected", "UI is intuitive and user-friendly", "Performance is optimized"]
-            }
-            
-            self.update_status("user_story", "Created fallback user story due to parsing error", result)
-            
-            # Add a pause to make the step visible
-            await asyncio.sleep(2)
-            
-            return result
+            return timed_parse(parse, output)
+        except ValidationError as e:
+            error = e
+            logger.warning("Structured output failed validation, requesting repair",
+                          schema=response_format["json_schema"]["name"], errors=e.error_count())
+            self.update_status("repair", "Repairing invalid model output...", None)
+        
+        repaired = await self._chat_completion(
+            model=STRUCTURED_MODEL,
+            messages=repair_messages(messages, output, error),
+            temperature=0,
+            response_format=response_format,
+            stage="llm_repair"
+        )
+        return timed_parse(parse, repaired)
     
     async def _suggest_pm_response(self, ticket_id: str, summary: str, description: str = "") -> str:
         """Generate a PM response for a feedback ticket."""
@@ -126,94 +475,487 @@ The user story should include:
         
         self.update_status("pm_response", "Generating PM response...", None)
         
+        messages = pm_response_messages(ticket_id, summary, description)
+        
+        # Reuse a previously generated response for an identical prompt
+        cache_key = make_cache_key(DEFAULT_MODEL, DEFAULT_TEMPERATURE, messages)
+        cached = await completion_cache.aget(cache_key)
+        current_span().set_attribute("pm_response.cache_hit", cached is not None)
+        if cached is not None:
+            self.update_status("pm_response", "PM response loaded from cache", {"response": cached})
+            return cached
+        
         # Use OpenAI to generate a response
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": """
-You are a Product Manager responding to customer feedback. Write a brief, empathetic response that:
-1. Thanks the user for their feedback
-2. Acknowledges their specific concerns or compliments
-3. Indicates what action will be taken (if appropriate)
-4. Keeps the response under 3-4 sentences
-
-Be professional, helpful, and concise.
-"""},
-                {"role": "user", "content": f"Ticket ID: {ticket_id}\nFeedback summary: {summary}\nFeedback description: {description}"}
-            ],
-            temperature=0.7
+        response_text = await self._chat_completion(
+            model=DEFAULT_MODEL,
+            messages=messages,
+            temperature=DEFAULT_TEMPERATURE,
+            stage="llm_pm_response"
         )
         
         # Extract the response
-        result = response.choices[0].message.content.strip()
+        result = response_text.strip()
+        await completion_cache.aset(cache_key, result)
         
         self.update_status("pm_response", "PM response generated successfully", {"response": result})
         
         # Add a pause to make the step visible
-        await asyncio.sleep(2)
+        await self._pause(2)
         
         return result
     
-    async def analyze_feedback(self, jql: str, max_results: int = 50) -> List[FeedbackAnalysisResult]:
+    async def _create_combined_analysis(self, ticket_id: str, summary: str, description: str = "") -> FeedbackAnalysisResult:
+        """Generate the user story and PM response with a single structured completion."""
+        logger.info("Creating combined analysis", ticket_id=ticket_id, summary=summary)
+        
+        self.update_status("user_story", "Generating user story and PM response from feedback...", None)
+        
+        messages = combined_analysis_messages(ticket_id, summary, description)
+        
+        # Reuse a previous analysis for an identical prompt
+        cache_key = make_cache_key(COMBINED_MODEL, DEFAULT_TEMPERATURE, messages, COMBINED_RESPONSE_FORMAT)
+        cached = await completion_cache.aget(cache_key)
+        current_span().set_attribute("combined.cache_hit", cached is not None)
+        if cached is not None:
+            result = FeedbackAnalysisResult(ticket_id=ticket_id, **cached)
+            self.update_status("user_story", "User story loaded from cache", result.user_story)
+            self.update_status("pm_response", "PM response loaded from cache", {"response": result.pm_response})
+            return result
+        
+        response_text = await self._chat_completion(
+            model=COMBINED_MODEL,
+            messages=messages,
+            temperature=DEFAULT_TEMPERATURE,
+            response_format=COMBINED_RESPONSE_FORMAT,
+            stage="llm_combined"
+        )
+        
+        # Validation errors after the repair attempt propagate so the ticket is reported as failed
+        result = await self._validate_structured_output(
+            messages, response_text, lambda text: parse_combined_analysis(ticket_id, text),
+            COMBINED_RESPONSE_FORMAT
+        )
+        await completion_cache.aset(cache_key, {"user_story": result.user_story, "pm_response": result.pm_response})
+        
+        self.update_status("user_story", "User story created successfully", result.user_story)
+        self.update_status("pm_response", "PM response generated successfully", {"response": result.pm_response})
+        
+        # Add a pause to make the step visible
+        await self._pause(2)
+        
+        return result
+    
+    async def _process_ticket(self, index: int, total: int, ticket: Dict[str, Any]) -> Optional[FeedbackAnalysisResult]:
+        """
+        Create the user story and PM response for a single ticket.
+        
+        Errors are logged and reported through the status callback so that one
+        failing ticket does not abort the rest of the batch.
+        """
+        try:
+            self.update_status("processing", f"Processing ticket {index+1}/{total}: {ticket['key']}", 
+                              {"ticket_id": ticket["key"], "progress": f"{index+1}/{total}"})
+            
+            if self.generation_mode == "combined":
+                # Create user story and PM response in one call
+                result = await self._create_combined_analysis(
+                    ticket_id=ticket["key"],
+                    summary=ticket["summary"],
+                    description=ticket.get("description", "")
+                )
+            else:
+                # Create user story
+                user_story = await self._create_user_story(
+                    summary=ticket["summary"],
+                    description=ticket.get("description", "")
+                )
+                
+                # Generate PM response
+                pm_response = await self._suggest_pm_response(
+                    ticket_id=ticket["key"],
+                    summary=ticket["summary"],
+                    description=ticket.get("description", "")
+                )
+                
+                # Create result
+                result = FeedbackAnalysisResult(
+                    ticket_id=ticket["key"],
+                    user_story=user_story,
+                    pm_response=pm_response
+                )
+            
+            # Log progress
+            logger.info("Processed ticket", ticket_id=ticket["key"])
+            self.update_status("ticket_complete", f"Completed processing ticket {ticket['key']}", 
+                              {"ticket_id": ticket["key"], "progress": f"{index+1}/{total}"})
+            
+            return result
+            
+        except Exception as e:
+            record_error("ticket", e)
+            logger.error("Error processing ticket", ticket_id=ticket["key"], error=str(e))
+            self.update_status("error", f"Error processing ticket {ticket['key']}: {str(e)}", 
+                              {"ticket_id": ticket["key"], "error": str(e)})
+            return None
+    
+    async def analyze_feedback(self, jql: str, max_results: int = 50, incremental: bool = False) -> List[FeedbackAnalysisResult]:
         """
         Analyze JIRA feedback tickets.
         
+        Up to ``self.concurrency`` tickets are processed at the same time.
+        Results are returned in the same order as the tickets were fetched.
+        
         Args:
             jql: JIRA Query Language string to filter tickets
             max_results: Maximum number of tickets to process
+            incremental: Only fetch tickets updated since the last incremental run
+                of this query, reusing stored results for tickets whose content
+                has not changed
             
         Returns:
             List of feedback analysis results
         """
-        with Timer(RUN_DURATION):
-            logger.info("Starting feedback analysis", jql=jql, max_results=max_results)
-            self.update_status("start", f"Starting feedback analysis for {max_results} tickets", {"jql": jql})
+        with start_span("analyze_feedback", jql=jql, max_results=max_results, incremental=incremental,
+                        generation_mode=self.generation_mode):
+            indexed_results = [item async for item in self._iter_results(jql, max_results, incremental)]
+        indexed_results.sort(key=lambda item: item[0])
+        return [result for _, result in indexed_results]
+    
+    async def analyze_feedback_stream(self, jql: str, max_results: int = 50,
+                                      incremental: bool = False) -> AsyncIterator[FeedbackAnalysisResult]:
+        """
+        Analyze JIRA feedback tickets, yielding each result as soon as it is ready.
+        
+        Results arrive in completion order rather than ticket order. At most
+        ``self.concurrency`` tickets are in flight and new tickets are only
+        started as the consumer reads results, so memory use stays flat.
+        
+        Args:
+            jql: JIRA Query Language string to filter tickets
+            max_results: Maximum number of tickets to process
+            incremental: See analyze_feedback
+        """
+        # The span stays active across yields, so it covers the whole stream
+        with start_span("analyze_feedback_stream", jql=jql, max_results=max_results, incremental=incremental,
+                        generation_mode=self.generation_mode) as span:
+            result_count = 0
+            async for _, result in self._iter_results(jql, max_results, incremental):
+                result_count += 1
+                yield result
+            span.set_attribute("result_count", result_count)
+    
+    async def analyze_feedback_batch(self, jql: str, max_results: int = 1000) -> List[FeedbackAnalysisResult]:
+        """
+        Analyze JIRA feedback tickets offline through the provider's batch API.
+        
+        Every prompt that is not already cached goes into one JSONL batch job.
+        The job is polled until it finishes and its outputs are mapped back to
+        tickets. This trades latency (up to the batch completion window) for
+        throughput and cost on large sweeps. Tickets whose requests failed are
+        left out of the results.
+        
+        Args:
+            jql: JIRA Query Language string to filter tickets
+            max_results: Maximum number of tickets to process
             
-            # Get tickets from JIRA
-            tickets_data = get_jira_feedback(jql, max_results)
-            logger.info(f"Retrieved {len(tickets_data)} tickets")
+        Returns:
+            List of feedback analysis results in ticket order
+        """
+        with Timer(RUN_DURATION), start_span("analyze_feedback_batch", jql=jql, max_results=max_results):
+            tickets_data = await asyncio.to_thread(get_jira_feedback, jql, max_results)
+            logger.info("Starting batch feedback analysis", jql=jql, ticket_count=len(tickets_data),
+                        generation_mode=self.generation_mode)
             self.update_status("fetch", f"Retrieved {len(tickets_data)} tickets", {"count": len(tickets_data)})
             
-            results = []
+            # Artifacts by ticket index and kind, filled from the cache first
+            artifacts: Dict[Tuple[int, str], Any] = {}
+            cache_keys: Dict[str, str] = {}
+            batch_messages: Dict[str, List[Dict[str, str]]] = {}
+            requests = []
+            
+            async def add_request(index: int, kind: str, model: str, messages: List[Dict[str, str]],
+                                  response_format: Optional[Dict[str, Any]] = None):
+                cache_key = make_cache_key(model, DEFAULT_TEMPERATURE, messages, response_format)
+                cached = await completion_cache.aget(cache_key)
+                if cached is not None:
+                    artifacts[(index, kind)] = cached
+                    return
+                custom_id = f"{index}:{kind}"
+                cache_keys[custom_id] = cache_key
+                batch_messages[custom_id] = messages
+                requests.append(build_batch_request(custom_id, model, messages, DEFAULT_TEMPERATURE, response_format))
+            
+            recalled = await self._recall_stories(tickets_data, list(range(len(tickets_data))))
+            members_of = self._cluster_duplicates(
+                tickets_data, [i for i in range(len(tickets_data)) if i not in recalled]
+            )
+            duplicates = {member for members in members_of.values() for member in members}
             
-            # Process each ticket
             for index, ticket in enumerate(tickets_data):
+                if index in duplicates or index in recalled:
+                    continue
+                summary, description = ticket["summary"], ticket.get("description", "")
+                if self.generation_mode == "combined":
+                    await add_request(index, "combined", COMBINED_MODEL,
+                                      combined_analysis_messages(ticket["key"], summary, description),
+                                      COMBINED_RESPONSE_FORMAT)
+                else:
+                    await add_request(index, "user_story", STRUCTURED_MODEL, user_story_messages(summary, description),
+                                      USER_STORY_RESPONSE_FORMAT)
+                    await add_request(index, "pm_response", DEFAULT_MODEL,
+                                      pm_response_messages(ticket["key"], summary, description))
+            
+            if requests:
+                self.update_status("batch", f"Submitting batch of {len(requests)} requests", {"count": len(requests)})
+                outputs = await run_batch(
+                    get_openai_client(),
+                    requests,
+                    poll_interval=config.batch_poll_interval,
+                    timeout=config.batch_timeout or None,
+                    completion_window=config.batch_completion_window
+                )
+            else:
+                outputs = {}
+            
+            for custom_id, content in outputs.items():
+                if content is None or custom_id not in cache_keys:
+                    continue
+                index, kind = custom_id.split(":", 1)
+                index = int(index)
+                ticket = tickets_data[index]
+                messages = batch_messages[custom_id]
                 try:
-                    self.update_status("processing", f"Processing ticket {index+1}/{len(tickets_data)}: {ticket['key']}", 
-                                      {"ticket_id": ticket["key"], "progress": f"{index+1}/{len(tickets_data)}"})
-                    
-                    # Create user story
-                    user_story = await self._create_user_story(
-                        summary=ticket["summary"],
-                        description=ticket.get("description", "")
-                    )
-                    
-                    # Generate PM response
-                    pm_response = await self._suggest_pm_response(
-                        ticket_id=ticket["key"],
-                        summary=ticket["summary"],
-                        description=ticket.get("description", "")
-                    )
-                    
-                    # Create result
+                    # Invalid structured outputs get the same single repair call as interactive runs
+                    if kind == "pm_response":
+                        artifact = content.strip()
+                    elif kind == "user_story":
+                        artifact = await self._validate_structured_output(
+                            messages, content, parse_user_story, USER_STORY_RESPONSE_FORMAT
+                        )
+                    else:
+                        analysis = await self._validate_structured_output(
+                            messages, content, lambda text: parse_combined_analysis(ticket["key"], text),
+                            COMBINED_RESPONSE_FORMAT
+                        )
+                        artifact = {"user_story": analysis.user_story, "pm_response": analysis.pm_response}
+                except Exception as e:
+                    logger.error("Error parsing batch output", ticket_id=ticket["key"], kind=kind, error=str(e))
+                    continue
+                await completion_cache.aset(cache_keys[custom_id], artifact)
+                artifacts[(index, kind)] = artifact
+            
+            results = []
+            new_stories = []
+            for index, ticket in enumerate(tickets_data):
+                if index in recalled:
+                    results.append(recalled[index])
+                    continue
+                if index in duplicates:
+                    continue
+                result = None
+                if self.generation_mode == "combined":
+                    combined = artifacts.get((index, "combined"))
+                    if combined is not None:
+                        result = FeedbackAnalysisResult(ticket_id=ticket["key"], **combined)
+                elif (index, "user_story") in artifacts and (index, "pm_response") in artifacts:
                     result = FeedbackAnalysisResult(
                         ticket_id=ticket["key"],
-                        user_story=user_story,
-                        pm_response=pm_response
+                        user_story=artifacts[(index, "user_story")],
+                        pm_response=artifacts[(index, "pm_response")]
                     )
-                    
+                if result is not None:
+                    members = [tickets_data[member] for member in members_of.get(index, [])]
                     results.append(result)
+                    results.extend(link_cluster_results(result, ticket, members))
+                    new_stories.append((ticket, result.model_dump()))
+            
+            story_index = get_story_index()
+            if story_index is not None:
+                await asyncio.to_thread(story_index.add_many, new_stories)
+            
+            TICKETS_PROCESSED.inc(len(results))
+            logger.info("Batch feedback analysis complete", ticket_count=len(results),
+                        failed_count=len(tickets_data) - len(results))
+            self.update_status("complete", f"Batch analysis complete - processed {len(results)} tickets",
+                              {"count": len(results)})
+            return results
+    
+    async def _recall_stories(self, tickets_data: List[Dict[str, Any]],
+                              indices: List[int]) -> Dict[int, FeedbackAnalysisResult]:
+        """Look tickets up in the story index and return the results it can stand in for."""
+        story_index = get_story_index()
+        if story_index is None or not indices:
+            return {}
+        
+        # The index is SQLite, so look every ticket up in one trip off the event loop
+        matches = await asyncio.to_thread(
+            story_index.find_reusable_many, [tickets_data[index] for index in indices], config.story_reuse_threshold
+        )
+        recalled = {}
+        for index, match in zip(indices, matches):
+            if match is not None:
+                recalled[index] = recall_result(tickets_data[index], match)
+        
+        if recalled:
+            logger.info("Reusing indexed stories", count=len(recalled))
+            self.update_status("recall", f"Reusing past stories for {len(recalled)} matching tickets",
+                              {"count": len(recalled)})
+        return recalled
+    
+    def _cluster_duplicates(self, tickets_data: List[Dict[str, Any]], indices: List[int]) -> Dict[int, List[int]]:
+        """Map each cluster leader's index to the indices of its near-duplicates."""
+        if not self.cluster_duplicates or len(indices) < 2:
+            return {}
+        
+        members_of = {}
+        clusters = cluster_tickets([tickets_data[i] for i in indices], config.cluster_similarity_threshold)
+        for cluster in clusters:
+            if len(cluster) > 1:
+                members_of[indices[cluster[0]]] = [indices[i] for i in cluster[1:]]
+        
+        if members_of:
+            duplicate_count = sum(len(members) for members in members_of.values())
+            logger.info("Clustered near-duplicate tickets", clusters=len(members_of), duplicates=duplicate_count)
+            self.update_status("cluster", f"Grouped {duplicate_count} near-duplicate tickets into "
+                              f"{len(members_of)} clusters", {"clusters": len(members_of), "duplicates": duplicate_count})
+        return members_of
+    
+    async def _iter_results(self, jql: str, max_results: int,
+                            incremental: bool) -> AsyncIterator[Tuple[int, FeedbackAnalysisResult]]:
+        """Yield (ticket index, result) pairs as tickets finish processing."""
+        with Timer(RUN_DURATION):
+            logger.info("Starting feedback analysis", jql=jql, max_results=max_results,
+                        concurrency=self.concurrency, incremental=incremental)
+            self.update_status("start", f"Starting feedback analysis for {max_results} tickets", {"jql": jql})
+            
+            watermark_store = get_watermark_store() if incremental else None
+            
+            # Get tickets from JIRA
+            # The JIRA client and the watermark store are synchronous, so fetch off the event loop
+            content_hashes = {}
+            reused = {}
+            if watermark_store is None:
+                tickets_data = await asyncio.to_thread(get_jira_feedback, jql, max_results)
+            else:
+                tickets_data, content_hashes, reused = await asyncio.to_thread(
+                    fetch_incremental, watermark_store, jql, max_results
+                )
+            total = len(tickets_data)
+            logger.info(f"Retrieved {total} tickets")
+            self.update_status("fetch", f"Retrieved {total} tickets", {"count": total})
+            
+            # Reuse stored results for tickets whose content hash is unchanged
+            if watermark_store is not None:
+                if reused:
+                    self.update_status("incremental", f"Reusing stored results for {len(reused)} unchanged tickets",
+                                      {"count": len(reused)})
+            
+            # Tickets matching a past story reuse it without an LLM call
+            recalled = await self._recall_stories(tickets_data, [i for i in range(total) if i not in reused])
+            new_stories = []
+            
+            # Only cluster leaders are generated; their results are shared with the duplicates
+            members_of = self._cluster_duplicates(
+                tickets_data, [i for i in range(total) if i not in reused and i not in recalled]
+            )
+            duplicates = {member for members in members_of.values() for member in members}
+            
+            # Track the watermark as tickets finish instead of holding every result
+            latest_updated = None
+            earliest_failed = None
+            new_states = []
+            
+            def record(index: int, result: Optional[FeedbackAnalysisResult]):
+                nonlocal latest_updated, earliest_failed
+                ticket = tickets_data[index]
+                if result is not None:
+                    TICKETS_PROCESSED.inc()
+                if result is not None and index not in reused and index not in recalled:
+                    new_stories.append((ticket, result.model_dump()))
+                if watermark_store is None or not ticket.get("updated"):
+                    return
+                updated = parse_jira_timestamp(ticket["updated"])
+                if result is None:
+                    if earliest_failed is None or updated < parse_jira_timestamp(earliest_failed):
+                        earliest_failed = ticket["updated"]
+                    return
+                if index not in reused:
+                    new_states.append((ticket["key"], content_hashes[index], result.model_dump()))
+                if latest_updated is None or updated > parse_jira_timestamp(latest_updated):
+                    latest_updated = ticket["updated"]
+            
+            async def run(index: int, ticket: Dict[str, Any]) -> Tuple[int, Optional[FeedbackAnalysisResult]]:
+                with start_span("ticket", ticket_id=ticket["key"], index=index) as span:
+                    result = await self._process_ticket(index, total, ticket)
+                    span.set_attribute("duplicates", len(members_of.get(index, [])))
+                    if result is None:
+                        span.status = "error"
+                    return index, result
+            
+            def finish(index: int, result: Optional[FeedbackAnalysisResult]) -> List[Tuple[int, Optional[FeedbackAnalysisResult]]]:
+                """Expand a finished ticket into itself plus any duplicates it leads."""
+                members = members_of.get(index, [])
+                if result is None:
+                    return [(index, None)] + [(member, None) for member in members]
+                member_results = link_cluster_results(result, tickets_data[index], [tickets_data[m] for m in members])
+                return [(index, result)] + list(zip(members, member_results))
+            
+            # Keep at most self.concurrency tickets in flight; failed tickets come back as None
+            result_count = 0
+            pending = set()
+            try:
+                for index, ticket in enumerate(tickets_data):
+                    if index in reused:
+                        record(index, reused[index])
+                        result_count += 1
+                        yield index, reused[index]
+                        continue
+                    if index in recalled:
+                        record(index, recalled[index])
+                        result_count += 1
+                        yield index, recalled[index]
+                        continue
+                    if index in duplicates:
+                        continue
                     
-                    # Log progress
-                    logger.info("Processed ticket", ticket_id=ticket["key"])
-                    self.update_status("ticket_complete", f"Completed processing ticket {ticket['key']}", 
-                                      {"ticket_id": ticket["key"], "progress": f"{index+1}/{len(tickets_data)}"})
+                    while len(pending) >= self.concurrency:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            for done_index, result in finish(*task.result()):
+                                record(done_index, result)
+                                if result is not None:
+                                    result_count += 1
+                                    yield done_index, result
                     
-                except Exception as e:
-                    logger.error("Error processing ticket", ticket_id=ticket["key"], error=str(e))
-                    self.update_status("error", f"Error processing ticket {ticket['key']}: {str(e)}", 
-                                      {"ticket_id": ticket["key"], "error": str(e)})
+                    pending.add(asyncio.create_task(run(index, ticket)))
+                
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        for done_index, result in finish(*task.result()):
+                            record(done_index, result)
+                            if result is not None:
+                                result_count += 1
+                                yield done_index, result
+            finally:
+                # Stop in-flight work if the consumer goes away early
+                for task in pending:
+                    task.cancel()
+            
+            # New stories are indexed together, in one transaction off the event loop
+            story_index = get_story_index()
+            if story_index is not None:
+                await asyncio.to_thread(story_index.add_many, new_stories)
+            
+            # The watermark never moves past a failed ticket, so the next run fetches
+            # it again (successful tickets around it are skipped via their hash)
+            watermark = earliest_failed or latest_updated
+            if watermark_store is not None:
+                await asyncio.to_thread(watermark_store.save_ticket_states, jql, new_states)
+                if watermark is not None:
+                    await asyncio.to_thread(watermark_store.set_watermark, jql, watermark)
+                    logger.info("Advanced incremental watermark", jql=jql, watermark=watermark)
             
-            logger.info("Feedback analysis complete", ticket_count=len(results))
-            self.update_status("complete", f"Feedback analysis complete - processed {len(results)} tickets", {"count": len(results)})
-            return results 
\ No newline at end of file
+            logger.info("Feedback analysis complete", ticket_count=result_count, reused_count=len(reused),
+                        recalled_count=len(recalled))
+            self.update_status("complete", f"Feedback analysis complete - processed {result_count} tickets", {"count": result_count})
@@ -0,0 +1,77 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, List, Optional, Tuple, TypeVar
+
+from observability import AGENT_CACHE_SIZE, AGENT_CACHE_HITS, AGENT_CACHE_MISSES, AGENT_CACHE_EVICTIONS
+
+T = TypeVar("T")
+
+class AgentCache(Generic[T]):
+    """
+    Bounded cache of persistent-thread agents keyed by user.
+
+    Entries are evicted least recently used first once ``max_entries`` is
+    exceeded, and after ``idle_ttl`` seconds without use. Creation happens
+    under the lock so concurrent requests for one user share a single agent.
+    """
+
+    def __init__(self, max_entries: int = 256, idle_ttl: Optional[float] = 1800.0):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self._entries: "OrderedDict[str, Tuple[T, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key: str, factory: Callable[[], T]) -> T:
+        """Return the agent for key, building it with factory on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], now)
+                self._entries.move_to_end(key)
+                AGENT_CACHE_HITS.inc()
+                return entry[0]
+
+            AGENT_CACHE_MISSES.inc()
+            agent = factory()
+            self._entries[key] = (agent, now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                AGENT_CACHE_EVICTIONS.labels(reason="lru").inc()
+            AGENT_CACHE_SIZE.set(len(self._entries))
+            return agent
+
+    def evict_idle(self) -> List[str]:
+        """Drop agents idle for longer than idle_ttl and return their keys."""
+        with self._lock:
+            return self._evict_idle(time.monotonic())
+
+    def _evict_idle(self, now: float) -> List[str]:
+        if not self.idle_ttl:
+            return []
+        # Entries are kept in last-used order, so the idle ones are at the front
+        expired = []
+        for key, (_, last_used) in self._entries.items():
+            if now - last_used <= self.idle_ttl:
+                break
+            expired.append(key)
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            AGENT_CACHE_EVICTIONS.labels(reason="idle").inc(len(expired))
+            AGENT_CACHE_SIZE.set(len(self._entries))
+        return expired
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            AGENT_CACHE_SIZE.set(0)
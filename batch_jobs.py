@@ -0,0 +1,99 @@
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from openai import AsyncOpenAI
+
+from observability import logger
+
+# Endpoint every batch request targets
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# Batch states after which polling stops
+TERMINAL_BATCH_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+class BatchJobError(Exception):
+    """Raised when a batch job fails, expires, is cancelled or times out."""
+
+def build_batch_request(custom_id: str, model: str, messages: List[Dict[str, str]], temperature: float,
+                        response_format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Build one line of a batch input file."""
+    body = {"model": model, "messages": messages, "temperature": temperature}
+    if response_format is not None:
+        body["response_format"] = response_format
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+def encode_batch_file(requests: List[Dict[str, Any]]) -> bytes:
+    """Serialize batch requests as JSONL."""
+    return "".join(json.dumps(request) + "\n" for request in requests).encode("utf-8")
+
+def parse_batch_output(text: str) -> Dict[str, Optional[str]]:
+    """
+    Map each custom_id in a batch output file to its message text.
+
+    Requests that came back with an error map to None.
+    """
+    outputs = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        custom_id = record["custom_id"]
+        response = record.get("response") or {}
+        if record.get("error") or response.get("status_code") != 200:
+            logger.error("Batch request failed", custom_id=custom_id,
+                         error=record.get("error") or response.get("body"))
+            outputs[custom_id] = None
+            continue
+        outputs[custom_id] = response["body"]["choices"][0]["message"]["content"]
+    return outputs
+
+async def submit_batch(client: AsyncOpenAI, requests: List[Dict[str, Any]], completion_window: str = "24h") -> str:
+    """Upload the requests as a batch input file, start the batch and return its ID."""
+    input_file = await client.files.create(
+        file=("feedback_batch.jsonl", encode_batch_file(requests)),
+        purpose="batch"
+    )
+    batch = await client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=completion_window
+    )
+    logger.info("Submitted batch", batch_id=batch.id, request_count=len(requests))
+    return batch.id
+
+async def wait_for_batch(client: AsyncOpenAI, batch_id: str, poll_interval: float = 30.0,
+                         timeout: Optional[float] = None) -> Any:
+    """Poll a batch until it finishes and return it; raise BatchJobError unless it completed."""
+    started = time.monotonic()
+    while True:
+        batch = await client.batches.retrieve(batch_id)
+        if batch.status in TERMINAL_BATCH_STATUSES:
+            break
+        if timeout is not None and time.monotonic() - started > timeout:
+            raise BatchJobError(f"Batch {batch_id} still {batch.status} after {timeout:.0f}s")
+        await asyncio.sleep(poll_interval)
+
+    if batch.status != "completed":
+        raise BatchJobError(f"Batch {batch_id} ended with status {batch.status}")
+    return batch
+
+async def run_batch(client: AsyncOpenAI, requests: List[Dict[str, Any]], poll_interval: float = 30.0,
+                    timeout: Optional[float] = None, completion_window: str = "24h") -> Dict[str, Optional[str]]:
+    """Submit requests as one batch, wait for it and return message text by custom_id."""
+    batch_id = await submit_batch(client, requests, completion_window)
+    batch = await wait_for_batch(client, batch_id, poll_interval, timeout)
+
+    outputs = {}
+    if batch.output_file_id:
+        content = await client.files.content(batch.output_file_id)
+        outputs.update(parse_batch_output(content.text))
+    if batch.error_file_id:
+        content = await client.files.content(batch.error_file_id)
+        outputs.update(parse_batch_output(content.text))
+
+    logger.info("Batch complete", batch_id=batch_id,
+                succeeded=sum(1 for output in outputs.values() if output is not None),
+                failed=len(requests) - sum(1 for output in outputs.values() if output is not None))
+    return outputs
@@ -1,19 +1,80 @@
 import os
 from dotenv import load_dotenv
+from typing import List
 from pydantic import BaseModel
 
 # Load environment variables from .env file
 load_dotenv()
 
+def env_bool(name: str, default: bool = False) -> bool:
+    """Read a boolean flag from the environment."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
 class JiraConfig(BaseModel):
     api_token: str
     base_url: str
     project_key: str
     user_email: str
+    page_size: int = 100
+    fetch_concurrency: int = 4
+    requests_per_second: float = 5.0
+    max_retries: int = 5
+    expand: List[str] = []
 
 class AppConfig(BaseModel):
     openai_api_key: str
     jira: JiraConfig
+    agent_concurrency: int = 1
+    generation_mode: str = "separate"
+    structured_model: str = "gpt-4o-mini"
+    pacing: str = "demo"
+    openai_timeout: float = 60.0
+    openai_max_connections: int = 100
+    openai_max_keepalive_connections: int = 20
+    openai_keepalive_expiry: float = 30.0
+    openai_requests_per_minute: float = 500.0
+    openai_tokens_per_minute: float = 200000.0
+    openai_max_retries: int = 5
+    openai_retry_base_delay: float = 1.0
+    openai_retry_max_delay: float = 60.0
+    openai_base_url: str = ""
+    batch_poll_interval: float = 30.0
+    batch_timeout: float = 86400.0
+    batch_completion_window: str = "24h"
+    cluster_duplicates: bool = False
+    cluster_similarity_threshold: float = 0.5
+    story_index_path: str = ""
+    story_reuse_threshold: float = 0.9
+    tracing_exporter: str = "none"
+    profiling_enabled: bool = False
+    profiling_max_seconds: float = 60.0
+    loop_watchdog_enabled: bool = False
+    loop_watchdog_threshold: float = 0.25
+    loop_watchdog_interval: float = 0.1
+    llm_cache_enabled: bool = True
+    llm_cache_max_entries: int = 1024
+    llm_cache_path: str = ""
+    llm_cache_disk_max_entries: int = 100000
+    llm_cache_ttl: float = 86400.0
+    watermark_db_path: str = "data/watermarks.db"
+    workflow_store: str = "memory"
+    workflow_db_path: str = "data/workflows.db"
+    workflow_ttl: float = 3600.0
+    workflow_max_entries: int = 1000
+    workflow_sweep_interval: float = 60.0
+    agent_cache_max_entries: int = 256
+    agent_cache_idle_ttl: float = 1800.0
+    workflow_execution: str = "inline"
+    job_queue_path: str = "data/jobs.db"
+    job_lease_timeout: float = 300.0
+    worker_concurrency: int = 4
+    worker_poll_interval: float = 1.0
+    workflow_max_concurrent: int = 4
+    workflow_max_queued: int = 100
+    workflow_max_queued_per_user: int = 10
 
 def load_config() -> AppConfig:
     """Load application configuration from environment variables."""
@@ -23,8 +84,61 @@ def load_config() -> AppConfig:
             api_token=os.getenv("JIRA_API_TOKEN", ""),
             base_url=os.getenv("JIRA_BASE_URL", ""),
             project_key=os.getenv("JIRA_PROJECT_KEY", ""),
-            user_email=os.getenv("JIRA_USER_EMAIL", "")
-        )
+            user_email=os.getenv("JIRA_USER_EMAIL", ""),
+            page_size=int(os.getenv("JIRA_PAGE_SIZE", "100")),
+            fetch_concurrency=int(os.getenv("JIRA_FETCH_CONCURRENCY", "4")),
+            requests_per_second=float(os.getenv("JIRA_REQUESTS_PER_SECOND", "5")),
+            max_retries=int(os.getenv("JIRA_MAX_RETRIES", "5")),
+            expand=[item.strip() for item in os.getenv("JIRA_EXPAND", "").split(",") if item.strip()]
+        ),
+        agent_concurrency=int(os.getenv("AGENT_CONCURRENCY", "1")),
+        generation_mode=os.getenv("GENERATION_MODE", "separate"),
+        structured_model=os.getenv("STRUCTURED_MODEL", "gpt-4o-mini"),
+        pacing=os.getenv("PACING", "demo"),
+        openai_timeout=float(os.getenv("OPENAI_TIMEOUT", "60")),
+        openai_max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+        openai_max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        openai_keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30")),
+        openai_requests_per_minute=float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500")),
+        openai_tokens_per_minute=float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "200000")),
+        openai_max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "5")),
+        openai_retry_base_delay=float(os.getenv("OPENAI_RETRY_BASE_DELAY", "1")),
+        openai_retry_max_delay=float(os.getenv("OPENAI_RETRY_MAX_DELAY", "60")),
+        openai_base_url=os.getenv("OPENAI_BASE_URL", ""),
+        batch_poll_interval=float(os.getenv("BATCH_POLL_INTERVAL", "30")),
+        batch_timeout=float(os.getenv("BATCH_TIMEOUT", "86400")),
+        batch_completion_window=os.getenv("BATCH_COMPLETION_WINDOW", "24h"),
+        cluster_duplicates=env_bool("CLUSTER_DUPLICATES", False),
+        cluster_similarity_threshold=float(os.getenv("CLUSTER_SIMILARITY_THRESHOLD", "0.5")),
+        story_index_path=os.getenv("STORY_INDEX_PATH", ""),
+        story_reuse_threshold=float(os.getenv("STORY_REUSE_THRESHOLD", "0.9")),
+        tracing_exporter=os.getenv("TRACING_EXPORTER", "none"),
+        profiling_enabled=env_bool("PROFILING_ENABLED", False),
+        profiling_max_seconds=float(os.getenv("PROFILING_MAX_SECONDS", "60")),
+        loop_watchdog_enabled=env_bool("LOOP_WATCHDOG_ENABLED", False),
+        loop_watchdog_threshold=float(os.getenv("LOOP_WATCHDOG_THRESHOLD", "0.25")),
+        loop_watchdog_interval=float(os.getenv("LOOP_WATCHDOG_INTERVAL", "0.1")),
+        llm_cache_enabled=env_bool("LLM_CACHE_ENABLED", True),
+        llm_cache_max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+        llm_cache_path=os.getenv("LLM_CACHE_PATH", ""),
+        llm_cache_disk_max_entries=int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "100000")),
+        llm_cache_ttl=float(os.getenv("LLM_CACHE_TTL", "86400")),
+        watermark_db_path=os.getenv("WATERMARK_DB_PATH", "data/watermarks.db"),
+        workflow_store=os.getenv("WORKFLOW_STORE", "memory"),
+        workflow_db_path=os.getenv("WORKFLOW_DB_PATH", "data/workflows.db"),
+        workflow_ttl=float(os.getenv("WORKFLOW_TTL", "3600")),
+        workflow_max_entries=int(os.getenv("WORKFLOW_MAX_ENTRIES", "1000")),
+        workflow_sweep_interval=float(os.getenv("WORKFLOW_SWEEP_INTERVAL", "60")),
+        agent_cache_max_entries=int(os.getenv("AGENT_CACHE_MAX_ENTRIES", "256")),
+        agent_cache_idle_ttl=float(os.getenv("AGENT_CACHE_IDLE_TTL", "1800")),
+        workflow_execution=os.getenv("WORKFLOW_EXECUTION", "inline"),
+        job_queue_path=os.getenv("JOB_QUEUE_PATH", "data/jobs.db"),
+        job_lease_timeout=float(os.getenv("JOB_LEASE_TIMEOUT", "300")),
+        worker_concurrency=int(os.getenv("WORKER_CONCURRENCY", "4")),
+        worker_poll_interval=float(os.getenv("WORKER_POLL_INTERVAL", "1")),
+        workflow_max_concurrent=int(os.getenv("WORKFLOW_MAX_CONCURRENT", "4")),
+        workflow_max_queued=int(os.getenv("WORKFLOW_MAX_QUEUED", "100")),
+        workflow_max_queued_per_user=int(os.getenv("WORKFLOW_MAX_QUEUED_PER_USER", "10"))
     )
 
 # Create a global config instance
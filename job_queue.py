@@ -0,0 +1,162 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import config
+from observability import logger
+
+class SQLiteJobQueue:
+    """
+    Durable job queue shared by API and worker processes through SQLite.
+
+    Workers claim jobs with a lease. A job whose lease runs out (because its
+    worker died) goes back to the queue until it reaches ``max_attempts``.
+    """
+
+    def __init__(self, path: str, lease_timeout: float = 300.0, max_attempts: int = 3):
+        self.path = path
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Autocommit mode so claims can use an explicit BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker_id TEXT,
+                lease_expires_at REAL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, created_at);
+            """
+        )
+
+    def enqueue(self, job_id: str, kind: str, payload: Optional[Dict[str, Any]] = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, kind, payload, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(payload or {}), now, now)
+            )
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Lease the oldest queued job to a worker, or return None if there is none."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._requeue_expired(now)
+                row = self._conn.execute(
+                    "SELECT job_id, kind, payload, attempts FROM jobs WHERE status = 'queued' "
+                    "ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', worker_id = ?, attempts = attempts + 1, "
+                    "lease_expires_at = ?, updated_at = ? WHERE job_id = ?",
+                    (worker_id, now + self.lease_timeout, now, row[0])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return {"job_id": row[0], "kind": row[1], "payload": json.loads(row[2]), "attempts": row[3] + 1}
+
+    def _requeue_expired(self, now: float):
+        """Return jobs with lapsed leases to the queue, failing those out of attempts."""
+        self._conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'lease expired', updated_at = ? "
+            "WHERE status = 'running' AND lease_expires_at < ? AND attempts >= ?",
+            (now, now, self.max_attempts)
+        )
+        self._conn.execute(
+            "UPDATE jobs SET status = 'queued', worker_id = NULL, lease_expires_at = NULL, updated_at = ? "
+            "WHERE status = 'running' AND lease_expires_at < ?",
+            (now, now)
+        )
+
+    def extend_lease(self, job_id: str, worker_id: str) -> bool:
+        """Renew a running job's lease; False means the worker no longer owns it."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires_at = ?, updated_at = ? "
+                "WHERE job_id = ? AND worker_id = ? AND status = 'running'",
+                (now + self.lease_timeout, now, job_id, worker_id)
+            )
+        return cursor.rowcount > 0
+
+    def complete(self, job_id: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', lease_expires_at = NULL, updated_at = ? WHERE job_id = ?",
+                (time.time(), job_id)
+            )
+
+    def fail(self, job_id: str, error: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, lease_expires_at = NULL, updated_at = ? "
+                "WHERE job_id = ?",
+                (error, time.time(), job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, kind, status, attempts, worker_id, error FROM jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("job_id", "kind", "status", "attempts", "worker_id", "error"), row))
+
+    def purge_finished(self, older_than: float) -> int:
+        """Delete finished jobs last updated more than older_than seconds ago."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - older_than,)
+            )
+        return cursor.rowcount
+
+    def depth(self) -> int:
+        """Number of jobs waiting to be claimed."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def create_job_queue() -> Optional[SQLiteJobQueue]:
+    """Create the job queue when WORKFLOW_EXECUTION=queue, else return None."""
+    if config.workflow_execution == "inline":
+        return None
+    if config.workflow_execution != "queue":
+        raise ValueError(f"Unknown workflow execution mode: {config.workflow_execution}")
+    if config.workflow_store != "sqlite":
+        raise ValueError("WORKFLOW_EXECUTION=queue requires WORKFLOW_STORE=sqlite so workers share state")
+
+    logger.info("Initialized job queue", path=config.job_queue_path)
+    return SQLiteJobQueue(config.job_queue_path, lease_timeout=config.job_lease_timeout)
@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import config
+from observability import logger, LLM_CACHE_HITS, LLM_CACHE_MISSES
+
+# Disk-tier hits buffered before their access times are written
+ACCESS_FLUSH_SIZE = 256
+
+# Fraction of max_entries the disk tier is trimmed to, so eviction runs once per many inserts
+EVICTION_FILL = 0.9
+
+def make_cache_key(model: str, temperature: float, messages: List[Dict[str, str]],
+                   response_format: Optional[Dict[str, Any]] = None) -> str:
+    """Build a content-addressed key from everything that determines an LLM output."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "temperature": temperature,
+            "messages": messages,
+            "response_format": response_format
+        },
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class MemoryCacheTier:
+    """In-memory LRU tier with optional TTL."""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if self.ttl and time.time() - created_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, created_at: Optional[float] = None):
+        with self._lock:
+            self._entries[key] = (value, created_at or time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteCacheTier:
+    """
+    On-disk tier backed by SQLite with TTL and size-based eviction.
+
+    Reads do not write: access times are buffered and written with the next
+    insert (or after ACCESS_FLUSH_SIZE hits). Eviction is amortized. The row
+    count is tracked in memory, and once it passes ``max_entries`` expired
+    and least recently used entries are deleted down to EVICTION_FILL of it.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000, ttl: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._pending_access: Dict[str, float] = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+        self._conn.commit()
+        # Upper bound on the row count; replacing an existing key overcounts until the next eviction
+        self._count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return the cached value and its creation time, or None."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            # Expired rows are left for the next eviction to delete
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                return None
+            self._pending_access[key] = now
+            if len(self._pending_access) >= ACCESS_FLUSH_SIZE:
+                self._flush_access()
+                self._conn.commit()
+            return row[0], row[1]
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._pending_access.pop(key, None)
+            self._count += 1
+            self._flush_access()
+            if self._count > self.max_entries:
+                self._evict(now)
+            self._conn.commit()
+
+    def _flush_access(self):
+        """Write buffered access times; the caller commits."""
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+
+    def _evict(self, now: float):
+        """Drop expired entries, then the least recently used ones down to EVICTION_FILL of max_entries."""
+        if self.ttl:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        target = int(self.max_entries * EVICTION_FILL)
+        if count > target:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                (count - target,)
+            )
+            count = target
+        self._count = count
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
+
+class CompletionCache:
+    """
+    Two-tier cache for generated LLM artifacts.
+
+    Lookups check the in-memory LRU first and then the optional SQLite tier;
+    disk hits are promoted into memory.
+    """
+
+    def __init__(self, memory: Optional[MemoryCacheTier] = None, disk: Optional[SQLiteCacheTier] = None,
+                 enabled: bool = True):
+        self.memory = memory or MemoryCacheTier()
+        self.disk = disk
+        self.enabled = enabled
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss."""
+        if not self.enabled:
+            return None
+        value = self._get_memory(key)
+        if value is not None or self.disk is None:
+            return value
+        return self._promote(key, self.disk.get(key))
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """Like get, but reads the disk tier in a worker thread so the event loop never blocks on it."""
+        if not self.enabled:
+            return None
+        value = self._get_memory(key)
+        if value is not None or self.disk is None:
+            return value
+        return self._promote(key, await asyncio.to_thread(self.disk.get, key))
+
+    def _get_memory(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            LLM_CACHE_HITS.labels(tier="memory").inc()
+            return json.loads(value)
+        if self.disk is None:
+            LLM_CACHE_MISSES.inc()
+        return None
+
+    def _promote(self, key: str, entry: Optional[Tuple[str, float]]) -> Optional[Any]:
+        """Copy a disk hit into memory and return its value."""
+        if entry is None:
+            LLM_CACHE_MISSES.inc()
+            return None
+        value, created_at = entry
+        self.memory.set(key, value, created_at)
+        LLM_CACHE_HITS.labels(tier="disk").inc()
+        return json.loads(value)
+
+    def set(self, key: str, value: Any):
+        """Store a JSON-serializable value in every tier."""
+        if not self.enabled:
+            return
+        serialized = json.dumps(value)
+        self.memory.set(key, serialized)
+        if self.disk is not None:
+            self._set_disk(key, serialized)
+
+    async def aset(self, key: str, value: Any):
+        """Like set, but writes the disk tier in a worker thread."""
+        if not self.enabled:
+            return
+        serialized = json.dumps(value)
+        self.memory.set(key, serialized)
+        if self.disk is not None:
+            await asyncio.to_thread(self._set_disk, key, serialized)
+
+    def _set_disk(self, key: str, serialized: str):
+        try:
+            self.disk.set(key, serialized)
+        except sqlite3.Error as e:
+            logger.error("Error writing LLM cache entry", error=str(e))
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+def build_completion_cache() -> CompletionCache:
+    """Create the completion cache from application config."""
+    ttl = config.llm_cache_ttl or None
+    disk = None
+    if config.llm_cache_enabled and config.llm_cache_path:
+        disk = SQLiteCacheTier(config.llm_cache_path, max_entries=config.llm_cache_disk_max_entries, ttl=ttl)
+
+    logger.info("Initialized LLM cache",
+               enabled=config.llm_cache_enabled,
+               path=config.llm_cache_path or None)
+    return CompletionCache(
+        memory=MemoryCacheTier(max_entries=config.llm_cache_max_entries, ttl=ttl),
+        disk=disk,
+        enabled=config.llm_cache_enabled
+    )
+
+# Initialize a global instance of the cache
+completion_cache = build_completion_cache()
@@ -2,17 +2,29 @@ import os
 import uuid
 import time
 import json
-from typing import Dict, Any, List, Optional
+import asyncio
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Any, List, Literal, Optional
 import uvicorn
-from fastapi import FastAPI, Response, Query, BackgroundTasks, Request, HTTPException
+from fastapi import FastAPI, Response, Query, Request, HTTPException, Header
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from prometheus_client import CONTENT_TYPE_LATEST
 
-from agent import JiraFeedbackAgent, FeedbackAnalysisResult
-from observability import logger, get_metrics, health_check
+from agent import JiraFeedbackAgent, FeedbackAnalysisResult, close_openai_client
+from agent_cache import AgentCache
+from config import config
+from observability import (logger, get_metrics, health_check, STAGE_DURATION, TICKETS_PROCESSED,
+                           WORKFLOWS_IN_PROGRESS, Timer, record_error)
 from tools.jira_tools import JiraClient, jira_client, JiraTicket
+from tools.story_index import get_story_index
+from tracing import current_span, start_span
+from profiling import LoopWatchdog, profile
+from workflow_store import create_workflow_store, new_workflow_record
+from job_queue import create_job_queue
+from scheduler import WorkflowScheduler, QueueFullError
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -24,34 +36,105 @@ app = FastAPI(
 class AnalyzeFeedbackRequest(BaseModel):
     jql: str
     max_results: int = 50
+    incremental: bool = False
 
 class AnalyzeFeedbackResponse(BaseModel):
     results: List[FeedbackAnalysisResult]
 
+class AnalysisJobStatus(BaseModel):
+    job_id: str
+    is_complete: bool
+    current_status: str
+    # 1-based position while waiting for admission, None once running
+    queue_position: Optional[int] = None
+    results: List[FeedbackAnalysisResult] = []
+
 class StartWorkflowRequest(BaseModel):
     jql: str
     max_results: int = 3
     persist_thread: bool = False
     post_to_jira: bool = False
     mock_feedback_items: List[Dict[str, Any]] = []
+    # "demo" paces steps for the UI, "none" runs as fast as JIRA and the LLM allow
+    pacing: Optional[Literal["demo", "none"]] = None
+    # Workflows are queued fairly per user when the server is at capacity
+    user_id: Optional[str] = None
 
 class WorkflowStatus(BaseModel):
     workflow_id: str
     is_complete: bool
     current_status: str
+    # 1-based position while waiting for admission, None once running
+    queue_position: Optional[int] = None
+    version: int = 0
+    step_offset: int = 0
     steps: List[Dict[str, Any]] = []
-    results: List[Dict[str, Any]] = []
-    tickets: List[Dict[str, Any]] = []
+    # None means unchanged since the version the client already has
+    results: Optional[List[Dict[str, Any]]] = []
+    tickets: Optional[List[Dict[str, Any]]] = []
+
+class SimilarStoriesRequest(BaseModel):
+    summary: str
+    description: str = ""
+    k: int = Field(5, ge=1, le=50)
+
+class SimilarStory(BaseModel):
+    ticket_id: str
+    summary: str
+    score: float
+    similarity: float
+    user_story: Dict[str, Any]
+    pm_response: str
+
+class SimilarStoriesResponse(BaseModel):
+    matches: List[SimilarStory]
 
 class JiraCommentRequest(BaseModel):
     ticket_id: str
     comment: str
 
 # Agent instance cache by user_id
-agent_cache = {}
+agent_cache: AgentCache[JiraFeedbackAgent] = AgentCache(
+    max_entries=config.agent_cache_max_entries,
+    idle_ttl=config.agent_cache_idle_ttl or None
+)
 
 # Workflow storage
-workflows = {}
+workflow_store = create_workflow_store()
+
+# Runs blocking store calls off the event loop; one thread keeps writes in order
+workflow_store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="workflow-store")
+
+# Queue consumed by worker.py when WORKFLOW_EXECUTION=queue; None runs workflows in-process
+job_queue = create_job_queue()
+
+# Admission control for workflows run in this process
+workflow_scheduler = WorkflowScheduler(
+    max_concurrent=config.workflow_max_concurrent,
+    max_queued=config.workflow_max_queued,
+    max_queued_per_user=config.workflow_max_queued_per_user
+)
+
+# Retry-After sent when the shared job queue is full
+QUEUE_FULL_RETRY_AFTER = 30
+
+# Background task that evicts expired workflows
+workflow_sweeper: Optional[asyncio.Task] = None
+
+# Events used to wake up streaming subscribers when a workflow changes
+workflow_update_events: Dict[str, asyncio.Event] = {}
+
+# Seconds between keep-alive comments on idle event streams
+SSE_KEEPALIVE_INTERVAL = 15.0
+
+# Seconds between store reads on event streams for workflows run by worker processes
+SSE_STORE_POLL_INTERVAL = 1.0
+
+# Held while a profile runs so only one runs at a time
+profiling_lock = asyncio.Lock()
+
+# Logs the blocking stack when the event loop stalls; started when enabled
+loop_watchdog: Optional[LoopWatchdog] = None
 
 # Create static directory if it doesn't exist
 os.makedirs("static", exist_ok=True)
@@ -62,8 +145,7 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 @app.get("/", response_class=HTMLResponse)
 async def get_ui():
     """Serve the UI."""
-    with open("static/index.html", "r") as f:
-        html_content = f.read()
+    html_content = await asyncio.to_thread(read_text_file, "static/index.html")
     return HTMLResponse(content=html_content)
 
 @app.get("/health")
@@ -76,81 +158,241 @@ async def metrics():
     """Prometheus metrics endpoint."""
     return Response(get_metrics(), media_type=CONTENT_TYPE_LATEST)
 
-@app.post("/analyze-feedback", response_model=AnalyzeFeedbackResponse)
+@app.get("/admin/profile")
+async def profile_process(
+    seconds: float = Query(5.0, gt=0, description="How long to sample for"),
+    interval_ms: float = Query(5.0, ge=1, le=1000, description="Milliseconds between stack samples"),
+    format: Literal["json", "collapsed"] = Query("json", description="json, or collapsed stacks as plain text")
+):
+    """
+    Profile the live process with a sampling profiler.
+    
+    Every thread's stack is sampled for `seconds`, while event-loop lag is
+    measured alongside. `collapsed` output can be fed straight to
+    flamegraph.pl or speedscope. Disabled unless `PROFILING_ENABLED` is set.
+    """
+    if not config.profiling_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if seconds > config.profiling_max_seconds:
+        raise HTTPException(status_code=422,
+                            detail=f"seconds must be at most {config.profiling_max_seconds:g}")
+    if profiling_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    
+    async with profiling_lock:
+        logger.info("Starting profile", seconds=seconds, interval_ms=interval_ms)
+        report = await profile(seconds, interval_ms / 1000)
+    
+    if format == "collapsed":
+        return PlainTextResponse(report["collapsed"], headers={
+            "X-Loop-Lag-Max-Ms": str(report["loop_lag"]["max_ms"]),
+            "X-Loop-Lag-P99-Ms": str(report["loop_lag"]["p99_ms"])
+        })
+    return report
+
+@app.post("/analyze-feedback", response_model=AnalyzeFeedbackResponse,
+          responses={202: {"description": "Analysis job accepted; poll the URL in `status_url`"}})
 async def analyze_feedback(
     request: AnalyzeFeedbackRequest,
     persist_thread: bool = Query(False, description="Whether to persist the agent thread across requests"),
-    user_id: Optional[str] = Query(None, description="Optional user ID for personalization")
+    user_id: Optional[str] = Query(None, description="Optional user ID for personalization"),
+    run_async: bool = Query(False, alias="async", description="Run as a background job and return 202")
 ):
     """
     Analyze JIRA feedback tickets and convert them to user stories.
     
     - **jql**: JIRA Query Language string to filter tickets
     - **max_results**: Maximum number of tickets to process (default: 50)
+    - **incremental**: Only process tickets changed since the last incremental run of this query
     - **persist_thread**: Whether to persist the agent thread across requests
     - **user_id**: Optional user ID for personalization
+    - **async**: Submit a background job instead of waiting for the results. The response is
+      202 with a `status_url` (also in `Location`) to poll for the results.
     """
     logger.info("Received analyze feedback request", 
                jql=request.jql, 
                max_results=request.max_results,
                persist_thread=persist_thread,
-               user_id=user_id)
+               user_id=user_id,
+               run_async=run_async)
+    
+    if run_async:
+        job_id = str(uuid.uuid4())
+        job_request = {**request.model_dump(), "kind": "analysis", "persist_thread": persist_thread, "user_id": user_id}
+        await submit_job(job_id, "analysis", job_request, user_id, lambda: run_analysis(job_id))
+        status_url = f"/analyze-feedback/{job_id}"
+        return JSONResponse(
+            status_code=202,
+            content={"job_id": job_id, "status_url": status_url},
+            headers={"Location": status_url}
+        )
     
     # Get or create agent instance
-    agent_key = f"{user_id}" if user_id else "default"
-    if persist_thread and agent_key in agent_cache:
-        agent = agent_cache[agent_key]
-    else:
-        agent = JiraFeedbackAgent(persist_thread=persist_thread, user_id=user_id)
-        if persist_thread:
-            agent_cache[agent_key] = agent
+    agent = get_or_create_agent(persist_thread, user_id)
     
     # Run analysis
-    results = agent.analyze_feedback(request.jql, request.max_results)
+    results = await agent.analyze_feedback(request.jql, request.max_results, incremental=request.incremental)
     
     return AnalyzeFeedbackResponse(results=results)
 
-@app.post("/workflow/start", response_model=Dict[str, str])
-async def start_workflow(request: StartWorkflowRequest, background_tasks: BackgroundTasks):
+@app.get("/analyze-feedback/{job_id}", response_model=AnalysisJobStatus)
+async def get_analysis_job(job_id: str):
     """
-    Start a new agent workflow.
+    Get the status of an analysis job submitted with `async=true`.
+    
+    `results` is filled in once `is_complete` is true.
     """
-    workflow_id = str(uuid.uuid4())
+    job = await store_call(workflow_store.get, job_id)
+    if job is None or job["request"].get("kind") != "analysis":
+        raise HTTPException(status_code=404, detail="Analysis job not found")
     
-    # Initialize workflow data
-    workflows[workflow_id] = {
-        "is_complete": False,
-        "current_status": "Initializing agent...",
-        "steps": [],
-        "results": [],
-        "tickets": [],
-        "timestamp": time.time(),
-        "request": request.model_dump()
-    }
+    return AnalysisJobStatus(
+        job_id=job_id,
+        is_complete=job["is_complete"],
+        current_status=job["current_status"],
+        queue_position=workflow_scheduler.position(job_id),
+        results=job["results"]
+    )
+
+@app.post("/analyze-feedback/stream")
+async def analyze_feedback_stream(
+    request: AnalyzeFeedbackRequest,
+    persist_thread: bool = Query(False, description="Whether to persist the agent thread across requests"),
+    user_id: Optional[str] = Query(None, description="Optional user ID for personalization")
+):
+    """
+    Analyze JIRA feedback tickets, streaming results as newline-delimited JSON.
+    
+    Each line is a `FeedbackAnalysisResult`, written as soon as its ticket is
+    processed (in completion order, not ticket order).
+    """
+    logger.info("Received streaming analyze feedback request", 
+               jql=request.jql, 
+               max_results=request.max_results,
+               persist_thread=persist_thread,
+               user_id=user_id)
+    
+    agent = get_or_create_agent(persist_thread, user_id)
     
-    # Run the workflow in the background
-    background_tasks.add_task(run_workflow, workflow_id)
+    async def ndjson_results():
+        async for result in agent.analyze_feedback_stream(request.jql, request.max_results,
+                                                          incremental=request.incremental):
+            yield result.model_dump_json() + "\n"
     
+    return StreamingResponse(ndjson_results(), media_type="application/x-ndjson")
+
+@app.post("/workflow/start", response_model=Dict[str, str])
+async def start_workflow(request: StartWorkflowRequest):
+    """
+    Start a new agent workflow.
+    
+    When the server is at capacity the workflow waits in a per-user fair
+    queue; if that queue is full the request is rejected with 429 and a
+    Retry-After header.
+    """
+    workflow_id = str(uuid.uuid4())
+    await submit_job(workflow_id, "workflow", request.model_dump(), request.user_id,
+                     lambda: run_workflow(workflow_id))
     return {"workflow_id": workflow_id}
 
 @app.get("/workflow/{workflow_id}/status", response_model=WorkflowStatus)
-async def get_workflow_status(workflow_id: str):
+async def get_workflow_status(
+    workflow_id: str,
+    since: Optional[int] = Query(None, ge=0, description="Only return steps from this index onwards"),
+    if_none_match: Optional[str] = Header(None)
+):
     """
     Get the status of a workflow.
+    
+    Responses carry an ETag for the workflow version. Sending it back in
+    `If-None-Match` returns 304 Not Modified when nothing changed. With
+    `since`, only steps from that index onwards are returned, and `results`
+    and `tickets` are null unless they changed after the version in
+    `If-None-Match`. Steps updated in place after that version are sent
+    again, so `step_offset` can be lower than `since`.
     """
-    if workflow_id not in workflows:
+    known_version = parse_workflow_etag(workflow_id, if_none_match)
+    
+    # Only the steps after the cursor, or updated since the client's version, are loaded
+    workflow_data = await store_call(workflow_store.get, workflow_id, since=since or 0,
+                                     changed_after=known_version)
+    if workflow_data is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
     
-    workflow_data = workflows[workflow_id]
+    version = workflow_data["version"]
+    etag = workflow_etag(workflow_id, version)
+    
+    if known_version == version:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    results = workflow_data["results"]
+    tickets = workflow_data["tickets"]
+    steps = workflow_data["steps"]
+    step_offset = 0
+    
+    if since is not None:
+        step_offset = workflow_data["step_offset"]
+        if known_version is not None:
+            if workflow_data["results_version"] <= known_version:
+                results = None
+            if workflow_data["tickets_version"] <= known_version:
+                tickets = None
     
-    return WorkflowStatus(
+    status = WorkflowStatus(
         workflow_id=workflow_id,
         is_complete=workflow_data.get("is_complete", False),
         current_status=workflow_data.get("current_status", ""),
-        steps=workflow_data.get("steps", []),
-        results=workflow_data.get("results", []),
-        tickets=workflow_data.get("tickets", [])
+        queue_position=workflow_scheduler.position(workflow_id),
+        version=version,
+        step_offset=step_offset,
+        steps=steps,
+        results=results,
+        tickets=tickets
     )
+    return JSONResponse(content=status.model_dump(), headers={"ETag": etag})
+
+@app.get("/workflow/{workflow_id}/events")
+async def stream_workflow_events(
+    workflow_id: str,
+    since: int = Query(0, ge=0, description="Index of the first step to send"),
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    Stream workflow progress as Server-Sent Events.
+    
+    Each step is sent as a `step` event whose id is the step index, so clients
+    can resume with `?since=` or the standard `Last-Event-ID` header. Status
+    changes are sent as `status` events and the stream ends with a `complete`
+    event carrying the results and tickets.
+    """
+    if not await store_call(workflow_store.__contains__, workflow_id):
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    
+    # A reconnecting EventSource sends the id of the last step it received
+    if last_event_id is not None and last_event_id.isdigit():
+        since = max(since, int(last_event_id) + 1)
+    
+    return StreamingResponse(
+        workflow_event_stream(workflow_id, since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/stories/similar", response_model=SimilarStoriesResponse)
+async def find_similar_stories(request: SimilarStoriesRequest):
+    """
+    Find the past tickets most similar to a new one, with their generated stories.
+    
+    - **summary**: Summary of the new ticket
+    - **description**: Optional description of the new ticket
+    - **k**: Number of matches to return, best first (default: 5)
+    """
+    story_index = get_story_index()
+    if story_index is None:
+        raise HTTPException(status_code=503, detail="Story index is disabled; set STORY_INDEX_PATH")
+    
+    matches = await asyncio.to_thread(story_index.search, request.summary, request.description, request.k)
+    return SimilarStoriesResponse(matches=matches)
 
 @app.post("/jira/post-comment")
 async def post_jira_comment(request: JiraCommentRequest):
@@ -168,23 +410,115 @@ async def post_jira_comment(request: JiraCommentRequest):
     # Return success for mock
     return {"success": True, "message": f"Comment posted to ticket {request.ticket_id}"}
 
+def get_or_create_agent(persist_thread: bool, user_id: Optional[str]) -> JiraFeedbackAgent:
+    """Return the cached agent for a user when persisting threads, else a new agent."""
+    if not persist_thread:
+        return JiraFeedbackAgent(persist_thread=persist_thread, user_id=user_id)
+    
+    agent_key = f"{user_id}" if user_id else "default"
+    return agent_cache.get_or_create(
+        agent_key,
+        lambda: JiraFeedbackAgent(persist_thread=persist_thread, user_id=user_id)
+    )
+
+async def submit_job(job_id: str, kind: str, request: Dict[str, Any], user_id: Optional[str],
+                     run: Callable[[], Awaitable[None]]):
+    """
+    Record a new job and hand it to a worker process, or run it here once admitted.
+    
+    Raises a 429 HTTPException with Retry-After when the queue is full.
+    """
+    if job_queue is not None and await asyncio.to_thread(job_queue.depth) >= config.workflow_max_queued:
+        raise HTTPException(
+            status_code=429,
+            detail="Workflow queue is full",
+            headers={"Retry-After": str(QUEUE_FULL_RETRY_AFTER)}
+        )
+    
+    await store_call(workflow_store.create, job_id, new_workflow_record(request))
+    
+    if job_queue is not None:
+        await asyncio.to_thread(job_queue.enqueue, job_id, kind)
+        return
+    try:
+        workflow_scheduler.submit(job_id, user_id or "default", run)
+    except QueueFullError as e:
+        await store_call(workflow_store.delete, job_id)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+async def run_analysis(job_id: str):
+    """
+    Run an analysis job submitted with `async=true` and store its results.
+    
+    Errors are stored on the job and then re-raised.
+    """
+    request = (await store_call(workflow_store.get, job_id))["request"]
+    await update_workflow(job_id, current_status="Analyzing feedback...")
+    
+    try:
+        with WORKFLOWS_IN_PROGRESS.labels(kind="analysis").track_inprogress(), \
+             start_span("analysis_job", job_id=job_id):
+            # A fresh agent per job keeps its status callback private to this job
+            agent = JiraFeedbackAgent(persist_thread=request.get("persist_thread", False),
+                                      user_id=request.get("user_id"))
+            agent.set_status_callback(
+                lambda step, message, data: schedule_workflow_update(job_id, current_status=message)
+            )
+            
+            results = await agent.analyze_feedback(request["jql"], request["max_results"],
+                                                   incremental=request.get("incremental", False))
+        
+        await update_workflow(
+            job_id,
+            results=[result.model_dump() for result in results],
+            is_complete=True,
+            current_status="Analysis complete"
+        )
+    except Exception as e:
+        record_error("analysis", e)
+        logger.error("Error in analysis job", job_id=job_id, error=str(e))
+        await update_workflow(job_id, is_complete=True, current_status=f"Error: {str(e)}")
+        # Let the caller see the failure; a queue worker marks the job failed
+        raise
+
+def read_text_file(path: str) -> str:
+    with open(path, "r") as f:
+        return f.read()
+
 # Helper functions for the workflow
 async def run_workflow(workflow_id: str):
     """
     Run the agent workflow and update its status.
     """
-    workflow_data = workflows[workflow_id]
+    with Timer(STAGE_DURATION.labels(stage="workflow_total")), \
+         WORKFLOWS_IN_PROGRESS.labels(kind="workflow").track_inprogress(), \
+         start_span("workflow", workflow_id=workflow_id):
+        await execute_workflow(workflow_id)
+
+async def execute_workflow(workflow_id: str):
+    """
+    Process the workflow's tickets step by step, recording each step for the UI.
+    
+    Errors are stored on the workflow and then re-raised.
+    """
+    workflow_data = await store_call(workflow_store.get, workflow_id)
     request = workflow_data["request"]
     
+    # A job retried after its worker died starts over instead of appending to the old steps
+    if workflow_data["step_count"]:
+        await store_call(workflow_store.clear_steps, workflow_id)
+        await update_workflow(workflow_id, is_complete=False, results=[], tickets=[], current_status="Restarting...")
+    
     try:
         # Create agent for this workflow
         agent = JiraFeedbackAgent(
             persist_thread=request.get("persist_thread", False),
-            user_id=workflow_id
+            user_id=workflow_id,
+            pacing=request.get("pacing")
         )
         
         # Update status
-        add_workflow_step(
+        await add_workflow_step(
             workflow_id,
             title="Starting Workflow",
             content=f"Starting analysis with JQL: {request['jql']}",
@@ -192,14 +526,14 @@ async def run_workflow(workflow_id: str):
         )
         
         # Allow UI to update - pause for a moment
-        await asyncio.sleep(3)
+        await agent._pause(3)
         
         # Get tickets - either from mock items or from JIRA
         tickets = []
         mock_items = request.get("mock_feedback_items", [])
         
         if mock_items:
-            add_workflow_step(
+            await add_workflow_step(
                 workflow_id,
                 title="Using Mock Feedback Items",
                 content=f"Using {len(mock_items)} mock feedback items instead of fetching from JIRA",
@@ -207,7 +541,7 @@ async def run_workflow(workflow_id: str):
             )
             
             # Allow UI to update
-            await asyncio.sleep(3)
+            await agent._pause(3)
             
             # Convert mock items to JiraTicket objects
             for idx, item in enumerate(mock_items):
@@ -223,7 +557,7 @@ async def run_workflow(workflow_id: str):
                 tickets.append(ticket)
             
             # Add the mock items as a tool call for visualization
-            add_workflow_step(
+            await add_workflow_step(
                 workflow_id,
                 title="Tool Call: create_mock_feedback",
                 content="Creating mock feedback items",
@@ -234,11 +568,11 @@ async def run_workflow(workflow_id: str):
             )
             
             # Allow UI to update
-            await asyncio.sleep(3)
+            await agent._pause(3)
             
         else:
             # Get JIRA tickets
-            add_workflow_step(
+            await add_workflow_step(
                 workflow_id,
                 title="Fetching JIRA Tickets",
                 content=f"Fetching tickets using JQL: {request['jql']}",
@@ -246,15 +580,16 @@ async def run_workflow(workflow_id: str):
             )
             
             # Allow UI to update
-            await asyncio.sleep(3)
+            await agent._pause(3)
             
-            workflow_data["current_status"] = "Fetching JIRA tickets..."
+            await update_workflow(workflow_id, current_status="Fetching JIRA tickets...")
             
             # Get tickets using the JIRA client
-            tickets = jira_client.get_feedback_tickets(request["jql"], request["max_results"])
+            # The JIRA client is synchronous, so fetch off the event loop
+            tickets = await asyncio.to_thread(jira_client.get_feedback_tickets, request["jql"], request["max_results"])
             
             # Add the tool call step
-            add_workflow_step(
+            await add_workflow_step(
                 workflow_id,
                 title="Tool Call: get_jira_feedback",
                 content="Called get_jira_feedback to fetch tickets",
@@ -265,189 +600,227 @@ async def run_workflow(workflow_id: str):
             )
             
             # Allow UI to update
-            await asyncio.sleep(3)
+            await agent._pause(3)
         
         # Store tickets for display
-        workflow_data["tickets"] = [ticket.model_dump() for ticket in tickets]
+        await update_workflow(workflow_id, tickets=[ticket.model_dump() for ticket in tickets])
         
         # Process each ticket using real OpenAI API
         results = []
+        new_stories = []
+        failed_tickets = []
         
-        for i, ticket in enumerate(tickets):
-            # Update status
-            workflow_data["current_status"] = f"Processing ticket {i+1}/{len(tickets)}: {ticket.key}"
-            
-            # Add step for processing this ticket
-            add_workflow_step(
-                workflow_id,
-                title=f"Processing Ticket {ticket.key}",
-                content=f"Summary: {ticket.summary}",
-                type="info"
-            )
-            
-            # Allow UI to update
-            await asyncio.sleep(3)
-            
-            # Add thinking step to show reasoning process
-            add_workflow_step(
-                workflow_id,
-                title="AI Thinking",
-                content=f"Analyzing feedback: '{ticket.summary}' to identify user needs and pain points...",
-                type="thinking"
-            )
-            
-            # Allow UI to update for thinking step
-            await asyncio.sleep(3)
-            
-            # Create user story using OpenAI
-            add_workflow_step(
+        async def record_ticket_failure(ticket: JiraTicket, error: Exception):
+            """Mark a ticket as failed and let the workflow continue with the next one."""
+            record_error("ticket", error)
+            current_span().status = "error"
+            logger.error("Error processing workflow ticket", workflow_id=workflow_id,
+                         ticket_id=ticket.key, error=str(error))
+            failed_tickets.append(ticket.key)
+            await update_last_workflow_step(workflow_id, result=f"Failed: {error}")
+            await add_workflow_step(
                 workflow_id,
-                title="Tool Call: create_user_story",
-                content="Converting feedback to user story",
-                type="tool_call",
-                tool_name="create_user_story",
-                args={"summary": ticket.summary, "description": ticket.description or ""},
-                result="Processing with OpenAI..."
-            )
-            
-            # Allow UI to update
-            await asyncio.sleep(3)
-            
-            # Simulate processing with OpenAI and add 2.5 second pause
-            await asyncio.sleep(2.5)
-            
-            # Use agent to create user story
-            user_story = await agent._create_user_story(
-                summary=ticket.summary,
-                description=ticket.description or ""
-            )
-            
-            # Update the tool call step with the result
-            workflow_data["steps"][-1]["result"] = "User story created successfully"
-            
-            # Add a success step to show the user story content
-            add_workflow_step(
-                workflow_id,
-                title="User Story Created",
-                content=f"Title: {user_story['title']}\n\nDescription: {user_story['description']}\n\nAcceptance Criteria:\n" + 
-                        "\n".join([f"- {criterion}" for criterion in user_story['acceptance_criteria']]),
-                type="success"
-            )
-            
-            # Allow time for the user to review the user story
-            await asyncio.sleep(3)
-            
-            # Add thinking step for PM response
-            add_workflow_step(
-                workflow_id,
-                title="AI Thinking",
-                content=f"Crafting an empathetic product manager response for ticket {ticket.key}...",
-                type="thinking"
-            )
-            
-            # Allow UI to update for thinking step
-            await asyncio.sleep(3)
-            
-            # Generate PM response with OpenAI
-            add_workflow_step(
-                workflow_id,
-                title="Tool Call: suggest_pm_response",
-                content="Generating PM response",
-                type="tool_call",
-                tool_name="suggest_pm_response",
-                args={"ticket_id": ticket.key, "summary": ticket.summary, "description": ticket.description or ""},
-                result="Processing with OpenAI..."
-            )
-            
-            # Allow UI to update
-            await asyncio.sleep(3)
-            
-            # Simulate processing with OpenAI and add 2.5 second pause
-            await asyncio.sleep(2.5)
-            
-            # Use agent to generate PM response
-            pm_response = await agent._suggest_pm_response(
-                ticket_id=ticket.key,
-                summary=ticket.summary,
-                description=ticket.description or ""
-            )
-            
-            # Update the tool call step with the result
-            workflow_data["steps"][-1]["result"] = "PM response generated successfully"
-            
-            # Add a success step to show the PM response content
-            add_workflow_step(
-                workflow_id,
-                title="PM Response Created",
-                content=pm_response,
-                type="success"
-            )
-            
-            # Allow time for the user to review the PM response
-            await asyncio.sleep(3)
-            
-            # Add result
-            result = {
-                "ticket_id": ticket.key,
-                "user_story": user_story,
-                "pm_response": pm_response
-            }
-            
-            results.append(result)
-            
-            # Add a completion step for this ticket
-            add_workflow_step(
-                workflow_id,
-                title=f"Completed Processing Ticket {ticket.key}",
-                content=f"Successfully created user story and PM response for '{ticket.summary}'",
-                type="info"
+                title=f"Skipped Ticket {ticket.key}",
+                content=f"Could not process '{ticket.summary}': {error}",
+                type="error"
             )
-            
-            # Allow UI to update
-            await asyncio.sleep(3)
-            
-            # Simulate posting to JIRA if requested
-            if request["post_to_jira"]:
-                add_workflow_step(
+        
+        for i, ticket in enumerate(tickets):
+            with start_span("ticket", ticket_id=ticket.key, index=i):
+                # Update status
+                await update_workflow(workflow_id, current_status=f"Processing ticket {i+1}/{len(tickets)}: {ticket.key}")
+                
+                # Add step for processing this ticket
+                await add_workflow_step(
                     workflow_id,
-                    title="Posting to JIRA",
-                    content=f"Posting response to ticket {ticket.key}",
+                    title=f"Processing Ticket {ticket.key}",
+                    content=f"Summary: {ticket.summary}",
                     type="info"
                 )
                 
-                # Simulate a delay
-                await asyncio.sleep(3)
+                # Allow UI to update
+                await agent._pause(3)
+                
+                # Add thinking step to show reasoning process
+                await add_workflow_step(
+                    workflow_id,
+                    title="AI Thinking",
+                    content=f"Analyzing feedback: '{ticket.summary}' to identify user needs and pain points...",
+                    type="thinking"
+                )
+                
+                # Allow UI to update for thinking step
+                await agent._pause(3)
                 
-                add_workflow_step(
+                # Create user story using OpenAI
+                await add_workflow_step(
                     workflow_id,
-                    title="Posted to JIRA",
-                    content=f"Successfully posted response to {ticket.key}",
+                    title="Tool Call: create_user_story",
+                    content="Converting feedback to user story",
+                    type="tool_call",
+                    tool_name="create_user_story",
+                    args={"summary": ticket.summary, "description": ticket.description or ""},
+                    result="Processing with OpenAI..."
+                )
+                
+                # Allow UI to update
+                await agent._pause(3)
+                
+                # Simulate processing with OpenAI and add 2.5 second pause
+                await agent._pause(2.5)
+                
+                # Use agent to create user story
+                try:
+                    user_story = await agent._create_user_story(
+                        summary=ticket.summary,
+                        description=ticket.description or ""
+                    )
+                except Exception as e:
+                    await record_ticket_failure(ticket, e)
+                    continue
+                
+                # Update the tool call step with the result
+                await update_last_workflow_step(workflow_id, result="User story created successfully")
+                
+                # Add a success step to show the user story content
+                await add_workflow_step(
+                    workflow_id,
+                    title="User Story Created",
+                    content=f"Title: {user_story['title']}\n\nDescription: {user_story['description']}\n\nAcceptance Criteria:\n" + 
+                            "\n".join([f"- {criterion}" for criterion in user_story['acceptance_criteria']]),
                     type="success"
                 )
                 
+                # Allow time for the user to review the user story
+                await agent._pause(3)
+                
+                # Add thinking step for PM response
+                await add_workflow_step(
+                    workflow_id,
+                    title="AI Thinking",
+                    content=f"Crafting an empathetic product manager response for ticket {ticket.key}...",
+                    type="thinking"
+                )
+                
+                # Allow UI to update for thinking step
+                await agent._pause(3)
+                
+                # Generate PM response with OpenAI
+                await add_workflow_step(
+                    workflow_id,
+                    title="Tool Call: suggest_pm_response",
+                    content="Generating PM response",
+                    type="tool_call",
+                    tool_name="suggest_pm_response",
+                    args={"ticket_id": ticket.key, "summary": ticket.summary, "description": ticket.description or ""},
+                    result="Processing with OpenAI..."
+                )
+                
+                # Allow UI to update
+                await agent._pause(3)
+                
+                # Simulate processing with OpenAI and add 2.5 second pause
+                await agent._pause(2.5)
+                
+                # Use agent to generate PM response
+                try:
+                    pm_response = await agent._suggest_pm_response(
+                        ticket_id=ticket.key,
+                        summary=ticket.summary,
+                        description=ticket.description or ""
+                    )
+                except Exception as e:
+                    await record_ticket_failure(ticket, e)
+                    continue
+                
+                # Update the tool call step with the result
+                await update_last_workflow_step(workflow_id, result="PM response generated successfully")
+                
+                # Add a success step to show the PM response content
+                await add_workflow_step(
+                    workflow_id,
+                    title="PM Response Created",
+                    content=pm_response,
+                    type="success"
+                )
+                
+                # Allow time for the user to review the PM response
+                await agent._pause(3)
+                
+                # Add result
+                result = {
+                    "ticket_id": ticket.key,
+                    "user_story": user_story,
+                    "pm_response": pm_response
+                }
+                
+                results.append(result)
+                TICKETS_PROCESSED.inc()
+                new_stories.append((ticket.model_dump(), result))
+                
+                # Add a completion step for this ticket
+                await add_workflow_step(
+                    workflow_id,
+                    title=f"Completed Processing Ticket {ticket.key}",
+                    content=f"Successfully created user story and PM response for '{ticket.summary}'",
+                    type="info"
+                )
+                
                 # Allow UI to update
-                await asyncio.sleep(3)
+                await agent._pause(3)
+                
+                # Simulate posting to JIRA if requested
+                if request["post_to_jira"]:
+                    await add_workflow_step(
+                        workflow_id,
+                        title="Posting to JIRA",
+                        content=f"Posting response to ticket {ticket.key}",
+                        type="info"
+                    )
+                    
+                    # Simulate a delay
+                    await agent._pause(3)
+                    
+                    await add_workflow_step(
+                        workflow_id,
+                        title="Posted to JIRA",
+                        content=f"Successfully posted response to {ticket.key}",
+                        type="success"
+                    )
+                    
+                    # Allow UI to update
+                    await agent._pause(3)
+            
+        # Index the new stories in one transaction, off the event loop
+        story_index = get_story_index()
+        if story_index is not None:
+            await asyncio.to_thread(story_index.add_many, new_stories)
         
         # Update status
-        add_workflow_step(
+        summary = f"Processed {len(results)} of {len(tickets)} tickets successfully"
+        if failed_tickets:
+            summary += f"; failed: {', '.join(failed_tickets)}"
+        await add_workflow_step(
             workflow_id,
             title="Analysis Complete",
-            content=f"Processed {len(tickets)} tickets successfully",
-            type="success"
+            content=summary,
+            type="success" if not failed_tickets else "info"
         )
         
-        # Set results
-        workflow_data["results"] = results
-        
-        # Mark as complete
-        workflow_data["is_complete"] = True
-        workflow_data["current_status"] = "Analysis complete"
+        # Set results and mark as complete
+        await update_workflow(
+            workflow_id,
+            results=results,
+            is_complete=True,
+            current_status="Analysis complete"
+        )
         
     except Exception as e:
+        record_error("workflow", e)
         logger.error("Error in workflow", workflow_id=workflow_id, error=str(e))
         
         # Add error step
-        add_workflow_step(
+        await add_workflow_step(
             workflow_id,
             title="Error",
             content=f"An error occurred: {str(e)}",
@@ -455,13 +828,135 @@ async def run_workflow(workflow_id: str):
         )
         
         # Mark as complete with error
-        workflow_data["is_complete"] = True
-        workflow_data["current_status"] = f"Error: {str(e)}"
+        await update_workflow(workflow_id, is_complete=True, current_status=f"Error: {str(e)}")
+        raise
 
-def add_workflow_step(workflow_id, title, content, type, tool_name=None, args=None, result=None):
-    """Add a step to the workflow."""
-    workflow = workflows[workflow_id]
+def workflow_etag(workflow_id: str, version: int) -> str:
+    """Build the ETag for a workflow version."""
+    return f'"{workflow_id}:{version}"'
+
+def parse_workflow_etag(workflow_id: str, if_none_match: Optional[str]) -> Optional[int]:
+    """Return the workflow version from an If-None-Match header, if it is ours."""
+    if not if_none_match:
+        return None
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        prefix = f'"{workflow_id}:'
+        if tag.startswith(prefix) and tag.endswith('"') and tag[len(prefix):-1].isdigit():
+            return int(tag[len(prefix):-1])
+    return None
+
+def format_sse(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    """Format a single Server-Sent Event."""
+    message = f"event: {event}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(data)}\n\n"
+
+async def workflow_event_stream(workflow_id: str, since: int):
+    """Yield SSE messages for a workflow until it completes."""
+    cursor = since
+    last_version = None
+    last_status = None
+    last_sent = time.monotonic()
+    # Updates made by worker processes don't signal this process, so poll the store
+    wait_timeout = SSE_KEEPALIVE_INTERVAL if job_queue is None else SSE_STORE_POLL_INTERVAL
     
+    while True:
+        # Grab the event before reading state so no update can slip in between
+        update_event = workflow_update_events.setdefault(workflow_id, asyncio.Event())
+        # Steps updated in place since the last read are sent again under their index
+        workflow_data = await store_call(workflow_store.get, workflow_id, since=cursor, changed_after=last_version)
+        if workflow_data is None:
+            return
+        
+        for offset, step in enumerate(workflow_data["steps"], start=workflow_data["step_offset"]):
+            yield format_sse("step", {"index": offset, **step}, event_id=offset)
+            last_sent = time.monotonic()
+        cursor = max(cursor, workflow_data["step_count"])
+        last_version = workflow_data["version"]
+        
+        if workflow_data["current_status"] != last_status:
+            last_status = workflow_data["current_status"]
+            yield format_sse("status", {"current_status": last_status})
+            last_sent = time.monotonic()
+        
+        if workflow_data["is_complete"]:
+            yield format_sse("complete", {
+                "current_status": workflow_data["current_status"],
+                "results": workflow_data["results"],
+                "tickets": workflow_data["tickets"]
+            })
+            return
+        
+        try:
+            await asyncio.wait_for(update_event.wait(), timeout=wait_timeout)
+        except asyncio.TimeoutError:
+            if time.monotonic() - last_sent >= SSE_KEEPALIVE_INTERVAL:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+
+def notify_workflow_update(workflow_id: str):
+    """Wake up any event streams waiting on this workflow."""
+    update_event = workflow_update_events.pop(workflow_id, None)
+    if update_event is not None:
+        update_event.set()
+
+def refresh_queue_positions(positions: Dict[str, int]):
+    """Show each queued workflow's new position in its status."""
+    for workflow_id, position in positions.items():
+        schedule_workflow_update(workflow_id, current_status=f"Waiting in queue (position {position})")
+
+workflow_scheduler.on_queue_change = refresh_queue_positions
+
+async def store_call(method: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Call a workflow store method without blocking the event loop.
+    
+    Blocking backends run on the single store thread, so calls apply in the
+    order they were made; in-memory calls run inline.
+    """
+    if not workflow_store.blocking:
+        return method(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(workflow_store_executor, functools.partial(method, *args, **kwargs))
+
+def schedule_workflow_update(workflow_id: str, **fields):
+    """
+    Update workflow fields from a synchronous callback without waiting for the write.
+    
+    Subscribers are notified once the write lands.
+    """
+    if not workflow_store.blocking:
+        workflow_store.update(workflow_id, **fields)
+        notify_workflow_update(workflow_id)
+        return
+    
+    loop = asyncio.get_running_loop()
+    
+    def finish(future: Future):
+        if future.exception() is not None:
+            logger.error("Error updating workflow", workflow_id=workflow_id, error=str(future.exception()))
+            return
+        notify_workflow_update(workflow_id)
+    
+    future = workflow_store_executor.submit(workflow_store.update, workflow_id, **fields)
+    future.add_done_callback(lambda done: loop.call_soon_threadsafe(finish, done))
+
+async def update_workflow(workflow_id: str, **fields):
+    """Update workflow fields and notify event stream subscribers."""
+    await store_call(workflow_store.update, workflow_id, **fields)
+    notify_workflow_update(workflow_id)
+
+async def update_last_workflow_step(workflow_id: str, **fields):
+    """Update fields of the most recent workflow step."""
+    await store_call(workflow_store.update_last_step, workflow_id, **fields)
+    notify_workflow_update(workflow_id)
+
+async def add_workflow_step(workflow_id, title, content, type, tool_name=None, args=None, result=None):
+    """Add a step to the workflow."""
     step = {
         "title": title,
         "content": content,
@@ -474,38 +969,61 @@ def add_workflow_step(workflow_id, title, content, type, tool_name=None, args=No
         step["args"] = args
         step["result"] = result
     
-    workflow["steps"].append(step)
+    await store_call(workflow_store.append_step, workflow_id, step)
+    notify_workflow_update(workflow_id)
     
     # For debug purposes
     logger.info(f"Workflow step: {title}", workflow_id=workflow_id)
 
-# Import asyncio for async operations
-import asyncio
+async def sweep_workflows():
+    """Periodically evict expired workflows and idle persistent-thread agents."""
+    while True:
+        await asyncio.sleep(config.workflow_sweep_interval)
+        try:
+            evicted = await asyncio.to_thread(workflow_store.evict_expired)
+        except Exception as e:
+            logger.error("Error evicting workflows", error=str(e))
+            continue
+        
+        for workflow_id in evicted:
+            workflow_update_events.pop(workflow_id, None)
+        if evicted:
+            logger.info("Evicted expired workflows", count=len(evicted))
+        
+        if job_queue is not None:
+            await asyncio.to_thread(job_queue.purge_finished, config.workflow_ttl)
+        
+        idle_agents = agent_cache.evict_idle()
+        if idle_agents:
+            logger.info("Evicted idle agents", count=len(idle_agents))
 
 @app.on_event("startup")
 async def startup_event():
     """Run when the application starts up."""
+    global workflow_sweeper, loop_watchdog
     logger.info("Starting JIRA Feedback Analyzer API")
+    
+    workflow_sweeper = asyncio.create_task(sweep_workflows())
+    
+    if config.loop_watchdog_enabled:
+        loop_watchdog = LoopWatchdog(config.loop_watchdog_threshold, config.loop_watchdog_interval)
+        loop_watchdog.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Run when the application shuts down."""
     logger.info("Shutting down JIRA Feedback Analyzer API")
     
-    # Clean up old workflows
-    current_time = time.time()
-    to_delete = []
+    if workflow_sweeper is not None:
+        workflow_sweeper.cancel()
     
-    for workflow_id, data in workflows.items():
-        # Delete workflows older than 1 hour
-        if current_time - data.get("timestamp", 0) > 3600:
-            to_delete.append(workflow_id)
+    if loop_watchdog is not None:
+        await loop_watchdog.stop()
     
-    for workflow_id in to_delete:
-        try:
-            del workflows[workflow_id]
-        except:
-            pass
+    await workflow_scheduler.shutdown()
+    
+    # Release pooled OpenAI connections
+    await close_openai_client()
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
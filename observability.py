@@ -1,6 +1,6 @@
 import time
 import structlog
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 
 # Configure structlog
 structlog.configure(
@@ -17,7 +17,12 @@ logger = structlog.get_logger()
 # Prometheus metrics
 TICKETS_PROCESSED = Counter(
     "jira_agent_tickets_processed_total",
-    "Total number of JIRA tickets processed"
+    "Total number of JIRA tickets analyzed"
+)
+
+JIRA_ISSUES_FETCHED = Counter(
+    "jira_agent_jira_issues_fetched_total",
+    "Total number of issues returned by JIRA searches"
 )
 
 RUN_DURATION = Histogram(
@@ -26,6 +31,98 @@ RUN_DURATION = Histogram(
     buckets=[0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0]
 )
 
+# Stages: jira_fetch_page, llm_user_story, llm_pm_response, llm_combined, llm_repair,
+# parse, pacing, workflow_total
+STAGE_DURATION = Histogram(
+    "jira_agent_stage_duration_seconds",
+    "Duration of each processing stage in seconds",
+    ["stage"],
+    buckets=[0.005, 0.025, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0]
+)
+
+LLM_TOKENS = Counter(
+    "jira_agent_llm_tokens_total",
+    "Total number of LLM tokens used",
+    ["model", "type"]
+)
+
+LLM_REQUESTS_IN_PROGRESS = Gauge(
+    "jira_agent_llm_requests_in_progress",
+    "Number of LLM calls currently in flight, including retries",
+    ["model"]
+)
+
+WORKFLOWS_IN_PROGRESS = Gauge(
+    "jira_agent_workflows_in_progress",
+    "Number of workflows and analysis jobs currently executing",
+    ["kind"]
+)
+
+ERRORS = Counter(
+    "jira_agent_errors_total",
+    "Total number of errors",
+    ["stage", "type"]
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "jira_agent_event_loop_lag_seconds",
+    "How late the event loop ran a scheduled heartbeat",
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+)
+
+EVENT_LOOP_BLOCKS = Counter(
+    "jira_agent_event_loop_blocked_total",
+    "Total number of times the event loop was blocked past the watchdog threshold"
+)
+
+LLM_CACHE_HITS = Counter(
+    "jira_agent_llm_cache_hits_total",
+    "Total number of LLM cache hits",
+    ["tier"]
+)
+
+LLM_CACHE_MISSES = Counter(
+    "jira_agent_llm_cache_misses_total",
+    "Total number of LLM cache misses"
+)
+
+AGENT_CACHE_SIZE = Gauge(
+    "jira_agent_agent_cache_size",
+    "Number of persistent-thread agents currently cached"
+)
+
+AGENT_CACHE_HITS = Counter(
+    "jira_agent_agent_cache_hits_total",
+    "Total number of persistent-thread agent cache hits"
+)
+
+AGENT_CACHE_MISSES = Counter(
+    "jira_agent_agent_cache_misses_total",
+    "Total number of persistent-thread agent cache misses"
+)
+
+AGENT_CACHE_EVICTIONS = Counter(
+    "jira_agent_agent_cache_evictions_total",
+    "Total number of persistent-thread agents evicted",
+    ["reason"]
+)
+
+WORKFLOWS_RUNNING = Gauge(
+    "jira_agent_workflows_running",
+    "Number of workflows currently running in this process"
+)
+
+WORKFLOWS_QUEUED = Gauge(
+    "jira_agent_workflows_queued",
+    "Number of workflows waiting for admission"
+)
+
+WORKFLOWS_REJECTED = Counter(
+    "jira_agent_workflows_rejected_total",
+    "Total number of workflows rejected because the queue was full",
+    ["reason"]
+)
+
 class Timer:
     """Context manager for timing operations and recording to Prometheus."""
     
@@ -43,6 +140,10 @@ class Timer:
             self.metric.observe(duration)
         return False  # Don't suppress exceptions
             
+def record_error(stage: str, error: BaseException):
+    """Count an error by the stage it happened in and its exception type."""
+    ERRORS.labels(stage=stage, type=type(error).__name__).inc()
+
 def get_metrics():
     """Generate latest Prometheus metrics."""
     return generate_latest()
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from observability import logger, EVENT_LOOP_LAG, EVENT_LOOP_BLOCKS
+
+def frame_label(frame) -> str:
+    """Name a stack frame as ``file:function``."""
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+
+def collapse_stack(frame) -> List[str]:
+    """Return the frame's stack, outermost call first."""
+    stack = []
+    while frame is not None:
+        stack.append(frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+def sample_stacks(duration: float, interval: float = 0.005) -> Counter:
+    """
+    Sample every thread's stack for ``duration`` seconds.
+
+    Runs on the calling thread, which is left out of the samples. Returns
+    how often each collapsed stack (``thread;outer;...;inner``) was seen.
+    """
+    own_thread = threading.get_ident()
+    counts: Counter = Counter()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            thread_name = names.get(thread_id, str(thread_id)).replace(";", "_").replace(" ", "_")
+            counts[";".join([thread_name] + collapse_stack(frame))] += 1
+        time.sleep(interval)
+    return counts
+
+def format_collapsed(counts: Counter) -> str:
+    """Render stack counts in the collapsed format read by flamegraph.pl and speedscope."""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+async def measure_loop_lag(duration: float, interval: float = 0.01) -> Dict[str, Any]:
+    """
+    Measure how late the event loop wakes up from short sleeps.
+
+    Lag well above zero means something is blocking the loop.
+    """
+    lags = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - started - interval))
+
+    lags.sort()
+    if not lags:
+        return {"samples": 0, "mean_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    return {
+        "samples": len(lags),
+        "mean_ms": round(1000 * sum(lags) / len(lags), 3),
+        "p99_ms": round(1000 * lags[min(len(lags) - 1, int(len(lags) * 0.99))], 3),
+        "max_ms": round(1000 * lags[-1], 3)
+    }
+
+async def profile(duration: float, interval: float = 0.005) -> Dict[str, Any]:
+    """
+    Profile the running process for ``duration`` seconds.
+
+    Stacks are sampled from a separate thread while the event loop's lag is
+    measured on the loop itself, so a blocked loop shows up in both.
+    """
+    counts, loop_lag = await asyncio.gather(
+        asyncio.to_thread(sample_stacks, duration, interval),
+        measure_loop_lag(duration)
+    )
+    return {
+        "duration": duration,
+        "samples": sum(counts.values()),
+        "loop_lag": loop_lag,
+        "collapsed": format_collapsed(counts)
+    }
+
+class LoopWatchdog:
+    """
+    Detect when the event loop is blocked.
+
+    A heartbeat task on the loop wakes up every ``interval`` seconds and records
+    how late it ran as event-loop lag. A watchdog thread checks the heartbeat.
+    If the loop has not run it for ``threshold`` seconds past its due time,
+    the thread logs the loop thread's current stack, which is the blocking
+    call, once per blocked stretch.
+    """
+
+    def __init__(self, threshold: float = 0.25, interval: float = 0.1):
+        self.threshold = threshold
+        self.interval = interval
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Start watching the running event loop."""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._heartbeat = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info("Started event loop watchdog", threshold=self.threshold, interval=self.interval)
+
+    async def stop(self):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+
+    async def _beat(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - started - self.interval))
+            self._last_beat = time.monotonic()
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.interval / 2):
+            last_beat = self._last_beat
+            blocked_for = time.monotonic() - last_beat - self.interval
+            if blocked_for < self.threshold or last_beat == reported_beat:
+                continue
+            reported_beat = last_beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            EVENT_LOOP_BLOCKS.inc()
+            logger.warning("Event loop blocked", blocked_for=round(blocked_for, 3),
+                           stack=collapse_stack(frame) if frame is not None else [])
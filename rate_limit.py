@@ -0,0 +1,168 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Mapping, Optional
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``.
+    ``acquire`` blocks until enough tokens are available. ``pause`` stops
+    all callers until a deadline, e.g. when a server sends Retry-After.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated_at
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if possible; otherwise return the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0):
+        """Block until tokens are available."""
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for the given number of seconds."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def refund(self, tokens: float):
+        """Return tokens, or take more when negative, e.g. once actual usage is known."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def set_rate(self, rate: float, capacity: float):
+        """Change the refill rate and capacity, keeping the tokens already available."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.capacity = capacity
+            self._tokens = min(self._tokens, capacity)
+
+    def limit_to(self, tokens: float):
+        """Cap the available tokens, e.g. at the remaining quota a server reports."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, tokens)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI reset durations such as "1s", "6m0s" or "20ms" into seconds."""
+    if not value:
+        return None
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    scale = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+def estimate_tokens(messages: List[Dict[str, str]], completion_tokens: int = 512) -> int:
+    """
+    Roughly estimate the tokens a chat request will use.
+
+    Uses about four characters per token plus per-message overhead, and
+    reserves a budget for the completion.
+    """
+    prompt_chars = sum(len(message.get("content") or "") for message in messages)
+    return prompt_chars // 4 + 4 * len(messages) + completion_tokens
+
+class AsyncRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limiter for async callers.
+
+    Requests wait until both buckets can cover them. Limits adapt to the
+    ``x-ratelimit-*`` headers a provider returns, and ``pause`` backs every
+    caller off after a 429.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute / 60.0, capacity=requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute / 60.0, capacity=tokens_per_minute)
+        self._lock = threading.Lock()
+
+    async def acquire(self, tokens: float):
+        """Wait until one request and ``tokens`` tokens are available, then take them."""
+        while True:
+            with self._lock:
+                # Requests larger than a whole minute's budget still go through eventually
+                tokens = min(tokens, self.tokens.capacity)
+                wait = self.requests.try_acquire()
+                if wait <= 0:
+                    wait = self.tokens.try_acquire(tokens)
+                    if wait > 0:
+                        self.requests.refund(1)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def record_usage(self, estimated: float, actual: float):
+        """Correct the token bucket once the real usage of a request is known."""
+        self.tokens.refund(estimated - actual)
+
+    def pause(self, seconds: float):
+        self.requests.pause(seconds)
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """Adapt limits and remaining quota to the provider's rate-limit headers."""
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            try:
+                if limit is not None:
+                    limit_value = float(limit)
+                    if limit_value > 0 and limit_value != bucket.capacity:
+                        bucket.set_rate(limit_value / 60.0, limit_value)
+                if remaining is not None:
+                    bucket.limit_to(float(remaining))
+                    # Quota exhausted: hold off until the provider says it resets
+                    reset = parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                    if float(remaining) <= 0 and reset:
+                        bucket.pause(reset)
+            except ValueError:
+                continue
+
+def retry_delay(attempt: int, base: float, maximum: float, retry_after: Optional[float] = None) -> float:
+    """Delay before retry number ``attempt`` (0-based): the server's hint, else full-jitter backoff."""
+    if retry_after is not None:
+        return min(retry_after, maximum)
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
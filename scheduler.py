@@ -0,0 +1,144 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from observability import logger, WORKFLOWS_RUNNING, WORKFLOWS_QUEUED, WORKFLOWS_REJECTED
+
+class QueueFullError(Exception):
+    """Raised when a workflow cannot be queued; ``retry_after`` is in seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class WorkflowScheduler:
+    """
+    Admission control for workflows run in this process.
+
+    At most ``max_concurrent`` workflows run at once. Waiting workflows are
+    queued per user and dispatched round-robin across users, so one user's
+    burst cannot starve everyone else. Submissions beyond ``max_queued`` in
+    total or ``max_queued_per_user`` for one user are rejected.
+
+    ``on_queue_change`` is called with the workflows whose queue position
+    changed, so their status can be refreshed.
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_queued: int = 100, max_queued_per_user: int = 10,
+                 on_queue_change: Optional[Callable[[Dict[str, int]], None]] = None):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self.on_queue_change = on_queue_change
+        # Users in round-robin order, each with their waiting workflows
+        self._queues: "OrderedDict[str, Deque[Tuple[str, Callable[[], Awaitable[None]]]]]" = OrderedDict()
+        self._running: Dict[str, asyncio.Task] = {}
+        self._last_positions: Dict[str, int] = {}
+        # Moving average of run time, used to estimate Retry-After
+        self._avg_duration = 30.0
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def submit(self, workflow_id: str, user_id: str, run: Callable[[], Awaitable[None]]) -> int:
+        """
+        Admit a workflow and return its queue position (0 if it started immediately).
+
+        Raises QueueFullError when the global or per-user queue is full.
+        """
+        user_queue = self._queues.get(user_id)
+        if len(self._running) < self.max_concurrent and not self._queues:
+            self._start(workflow_id, run)
+            return 0
+
+        if self.queued >= self.max_queued:
+            WORKFLOWS_REJECTED.labels(reason="global").inc()
+            raise QueueFullError("Workflow queue is full", self.retry_after())
+        if user_queue is not None and len(user_queue) >= self.max_queued_per_user:
+            WORKFLOWS_REJECTED.labels(reason="user").inc()
+            raise QueueFullError("Too many queued workflows for this user", self.retry_after())
+
+        self._queues.setdefault(user_id, deque()).append((workflow_id, run))
+        WORKFLOWS_QUEUED.set(self.queued)
+        position = self.position(workflow_id)
+        logger.info("Queued workflow", workflow_id=workflow_id, user_id=user_id, position=position)
+        self._notify()
+        return position
+
+    def position(self, workflow_id: str) -> Optional[int]:
+        """1-based position in dispatch order, or None if the workflow is not queued."""
+        return self.positions().get(workflow_id)
+
+    def positions(self) -> Dict[str, int]:
+        """Queue positions of all waiting workflows, following round-robin dispatch order."""
+        queues = [list(queue) for queue in self._queues.values()]
+        order = []
+        for depth in range(max((len(queue) for queue in queues), default=0)):
+            order.extend(queue[depth][0] for queue in queues if depth < len(queue))
+        return {workflow_id: index + 1 for index, workflow_id in enumerate(order)}
+
+    def retry_after(self) -> int:
+        """Estimate how many seconds until a queue slot frees up."""
+        waves = (self.queued + 1) / max(1, self.max_concurrent)
+        return max(1, math.ceil(waves * self._avg_duration))
+
+    def _start(self, workflow_id: str, run: Callable[[], Awaitable[None]]):
+        task = asyncio.create_task(self._run(workflow_id, run))
+        self._running[workflow_id] = task
+        WORKFLOWS_RUNNING.set(len(self._running))
+
+    async def _run(self, workflow_id: str, run: Callable[[], Awaitable[None]]):
+        started_at = time.monotonic()
+        try:
+            await run()
+        except Exception as e:
+            logger.error("Scheduled workflow failed", workflow_id=workflow_id, error=str(e))
+        finally:
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.monotonic() - started_at)
+            self._running.pop(workflow_id, None)
+            WORKFLOWS_RUNNING.set(len(self._running))
+            self._dispatch()
+
+    def _dispatch(self):
+        """Start queued workflows, taking one per user in turn, while slots are free."""
+        started = False
+        while self._queues and len(self._running) < self.max_concurrent:
+            user_id, user_queue = next(iter(self._queues.items()))
+            workflow_id, run = user_queue.popleft()
+            # Move the user to the back of the rotation, or drop them once empty
+            del self._queues[user_id]
+            if user_queue:
+                self._queues[user_id] = user_queue
+            self._start(workflow_id, run)
+            started = True
+
+        if started:
+            WORKFLOWS_QUEUED.set(self.queued)
+            self._notify()
+
+    def _notify(self):
+        """Report queued workflows whose position changed since the last call."""
+        positions = self.positions()
+        changed = {
+            workflow_id: position for workflow_id, position in positions.items()
+            if self._last_positions.get(workflow_id) != position
+        }
+        self._last_positions = positions
+        if changed and self.on_queue_change is not None:
+            self.on_queue_change(changed)
+
+    async def shutdown(self):
+        """Drop queued workflows and cancel running ones."""
+        self._queues.clear()
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        WORKFLOWS_QUEUED.set(0)
@@ -199,6 +199,10 @@ async function handleFormSubmit(e) {
             }),
         });
         
+        if (workflowResponse.status === 429) {
+            const retryAfter = workflowResponse.headers.get('Retry-After') || 'a few';
+            throw new Error(`Server is busy, try again in ${retryAfter} seconds`);
+        }
         if (!workflowResponse.ok) {
             throw new Error(`Server returned ${workflowResponse.status}`);
         }
@@ -209,8 +213,12 @@ async function handleFormSubmit(e) {
         // Show workflow card
         workflowCard.classList.remove('d-none');
         
-        // Start polling for updates
-        await pollWorkflowUpdates();
+        // Stream updates, falling back to polling if SSE is unavailable
+        if (window.EventSource) {
+            await streamWorkflowUpdates();
+        } else {
+            await pollWorkflowUpdates();
+        }
         
     } catch (error) {
         console.error('Error:', error);
@@ -219,37 +227,108 @@ async function handleFormSubmit(e) {
     }
 }
 
+function streamWorkflowUpdates() {
+    if (!currentWorkflowId) return Promise.resolve();
+    
+    return new Promise((resolve) => {
+        // EventSource resends the last step id on reconnect, so steps are never duplicated
+        const source = new EventSource(`/workflow/${currentWorkflowId}/events`);
+        
+        source.addEventListener('step', (event) => {
+            appendWorkflowStep(JSON.parse(event.data));
+        });
+        
+        source.addEventListener('status', (event) => {
+            const data = JSON.parse(event.data);
+            showLoading(data.current_status || 'Processing...');
+        });
+        
+        source.addEventListener('complete', (event) => {
+            const data = JSON.parse(event.data);
+            source.close();
+            hideLoading();
+            
+            // Show results
+            if (data.results && data.results.length > 0) {
+                displayResults(data.results, data.tickets);
+            }
+            resolve();
+        });
+        
+        source.onerror = () => {
+            // The browser retries on its own unless the stream was closed for good
+            if (source.readyState === EventSource.CLOSED) {
+                console.error('Workflow event stream closed');
+                hideLoading();
+                resolve();
+            }
+        };
+    });
+}
+
+function appendWorkflowStep(step) {
+    const stepElement = createWorkflowStepElement(step, step.index + 1);
+    
+    // Steps already displayed are sent again when they are updated in place
+    const existingSteps = workflowSteps.querySelectorAll('.workflow-step');
+    if (step.index < existingSteps.length) {
+        existingSteps[step.index].replaceWith(stepElement);
+        return;
+    }
+    
+    workflowSteps.appendChild(stepElement);
+    stepElement.scrollIntoView({ behavior: 'smooth', block: 'end' });
+}
+
 async function pollWorkflowUpdates() {
     if (!currentWorkflowId) return;
     
     try {
         let isComplete = false;
+        let etag = null;
+        let nextStep = 0;
+        let tickets = [];
         
         while (!isComplete) {
-            // Poll for updates
-            const response = await fetch(`/workflow/${currentWorkflowId}/status`);
-            if (!response.ok) {
-                throw new Error(`Server returned ${response.status}`);
-            }
-            
-            const data = await response.json();
+            // Poll for changes since the last version we saw
+            const headers = etag ? { 'If-None-Match': etag } : {};
+            const response = await fetch(`/workflow/${currentWorkflowId}/status?since=${nextStep}`, { headers });
             
-            // Update UI with new steps
-            updateWorkflowSteps(data.steps);
-            
-            // Update loading message
-            showLoading(data.current_status || 'Processing...');
-            
-            // Check if workflow is complete
-            if (data.is_complete) {
-                isComplete = true;
-                hideLoading();
+            if (response.status !== 304) {
+                if (!response.ok) {
+                    throw new Error(`Server returned ${response.status}`);
+                }
                 
-                // Show results
-                if (data.results && data.results.length > 0) {
-                    displayResults(data.results, data.tickets);
+                etag = response.headers.get('ETag');
+                const data = await response.json();
+                
+                // Update UI with new steps
+                data.steps.forEach((step, index) => {
+                    appendWorkflowStep({ ...step, index: data.step_offset + index });
+                });
+                nextStep = data.step_offset + data.steps.length;
+                
+                // Tickets are null when unchanged
+                if (data.tickets) {
+                    tickets = data.tickets;
                 }
-            } else {
+                
+                // Update loading message
+                showLoading(data.current_status || 'Processing...');
+                
+                // Check if workflow is complete
+                if (data.is_complete) {
+                    isComplete = true;
+                    hideLoading();
+                    
+                    // Show results
+                    if (data.results && data.results.length > 0) {
+                        displayResults(data.results, tickets);
+                    }
+                }
+            }
+            
+            if (!isComplete) {
                 // Wait before polling again
                 await new Promise(resolve => setTimeout(resolve, 1000));
             }
@@ -261,19 +340,6 @@ async function pollWorkflowUpdates() {
     }
 }
 
-function updateWorkflowSteps(steps) {
-    // Get only new steps
-    const existingStepCount = workflowSteps.querySelectorAll('.workflow-step').length;
-    const newSteps = steps.slice(existingStepCount);
-    
-    // Add new steps to the UI
-    newSteps.forEach((step, index) => {
-        const stepElement = createWorkflowStepElement(step, existingStepCount + index + 1);
-        workflowSteps.appendChild(stepElement);
-        stepElement.scrollIntoView({ behavior: 'smooth', block: 'end' });
-    });
-}
-
 function createWorkflowStepElement(step, number) {
     const template = workflowStepTemplate.content.cloneNode(true);
     const stepElement = template.querySelector('.workflow-step');
@@ -1,8 +1,14 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
+import asyncio
 import json
 
+import httpx
+import openai
+from prometheus_client import REGISTRY
+
 from agent import JiraFeedbackAgent, FeedbackAnalysisResult
+from llm_cache import completion_cache
 from tools.jira_tools import JiraTicket
 
 class TestJiraFeedbackAgent(unittest.TestCase):
@@ -51,5 +57,328 @@ class TestJiraFeedbackAgent(unittest.TestCase):
         self.assertEqual(len(results[0].user_story["acceptance_criteria"]), 3)
         self.assertTrue("Thank you for your feedback" in results[0].pm_response)
 
+class TestConcurrentAnalysis(unittest.TestCase):
+    """Test bounded parallel processing in analyze_feedback."""
+    
+    def setUp(self):
+        self.tickets = [
+            {"key": f"UX-{i}", "summary": f"Feedback {i}", "description": ""}
+            for i in range(6)
+        ]
+    
+    @patch('agent.get_jira_feedback')
+    def test_results_keep_input_order_and_isolate_failures(self, mock_get_feedback):
+        """Tickets run in parallel up to the limit; a failure only drops that ticket."""
+        mock_get_feedback.return_value = self.tickets
+        agent = JiraFeedbackAgent(concurrency=3)
+        in_flight = 0
+        peak = 0
+        
+        async def fake_story(summary, description):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            # Later tickets finish first to prove ordering is restored
+            await asyncio.sleep(0.01 * (10 - int(summary.split()[-1])))
+            in_flight -= 1
+            if summary == "Feedback 2":
+                raise RuntimeError("boom")
+            return {"title": summary, "description": "", "acceptance_criteria": []}
+        
+        async def fake_response(ticket_id, summary, description=""):
+            return f"Thanks for {ticket_id}"
+        
+        with patch.object(agent, "_create_user_story", side_effect=fake_story), \
+             patch.object(agent, "_suggest_pm_response", side_effect=fake_response):
+            results = asyncio.run(agent.analyze_feedback("project = TEST"))
+        
+        self.assertEqual([r.ticket_id for r in results], ["UX-0", "UX-1", "UX-3", "UX-4", "UX-5"])
+        self.assertEqual(peak, 3)
+
+def make_completion(content):
+    """Build a minimal chat completion response object."""
+    return MagicMock(choices=[MagicMock(message=MagicMock(content=content))])
+
+class TestStreamingAnalysis(unittest.TestCase):
+    """Test the async generator variant of analyze_feedback."""
+    
+    @patch('agent.get_jira_feedback')
+    def test_results_stream_in_completion_order(self, mock_get_feedback):
+        mock_get_feedback.return_value = [
+            {"key": f"UX-{i}", "summary": f"Feedback {i}", "description": ""} for i in range(4)
+        ]
+        agent = JiraFeedbackAgent(concurrency=2)
+        started = []
+        
+        async def fake_process(index, total, ticket):
+            started.append(ticket["key"])
+            # Distinct finish times: UX-1 @ .02, UX-0 @ .06, UX-3 @ .07, UX-2 @ .08
+            await asyncio.sleep({0: 0.06, 1: 0.02, 2: 0.06, 3: 0.01}[index])
+            return FeedbackAnalysisResult(ticket_id=ticket["key"], user_story={}, pm_response="")
+        
+        async def consume():
+            received = []
+            async for result in agent.analyze_feedback_stream("project = TEST"):
+                # Never more than the concurrency limit ahead of the consumer
+                self.assertLessEqual(len(started) - len(received), 2)
+                received.append(result.ticket_id)
+            return received
+        
+        with patch.object(agent, "_process_ticket", side_effect=fake_process):
+            received = asyncio.run(consume())
+        
+        self.assertEqual(received, ["UX-1", "UX-0", "UX-3", "UX-2"])
+
+class TestAsyncOpenAIClient(unittest.TestCase):
+    """Test that LLM calls go through the shared async client."""
+    
+    def setUp(self):
+        completion_cache.clear()
+    
+    @patch('agent.asyncio.sleep', new_callable=AsyncMock)
+    @patch('agent.get_openai_client')
+    def test_pm_response_awaits_async_client(self, mock_get_client, mock_sleep):
+        """PM responses are awaited on the async client instead of blocking the loop."""
+        create = AsyncMock(return_value=make_completion("  Thanks for the feedback!  "))
+        mock_get_client.return_value.chat.completions.create = create
+        
+        agent = JiraFeedbackAgent()
+        response = asyncio.run(agent._suggest_pm_response("UX-101", "Export button hidden"))
+        
+        self.assertEqual(response, "Thanks for the feedback!")
+        create.assert_awaited_once()
+        self.assertEqual(create.await_args.kwargs["model"], "gpt-3.5-turbo")
+
+class TestStructuredUserStory(unittest.TestCase):
+    """Test schema-validated user stories and the single repair retry."""
+    
+    STORY = {
+        "title": "As a user, I want to find the export button quickly",
+        "description": "Exporting is a frequent task.",
+        "acceptance_criteria": ["Export is in the toolbar", "Export has a label"]
+    }
+    
+    def setUp(self):
+        completion_cache.clear()
+    
+    @patch('agent.asyncio.sleep', new_callable=AsyncMock)
+    @patch('agent.get_openai_client')
+    def test_story_is_validated_against_schema(self, mock_get_client, mock_sleep):
+        create = AsyncMock(return_value=make_completion(json.dumps(self.STORY)))
+        mock_get_client.return_value.chat.completions.create = create
+        
+        story = asyncio.run(JiraFeedbackAgent()._create_user_story("Export hidden", "Hard to find"))
+        
+        self.assertEqual(story, self.STORY)
+        self.assertEqual(create.await_args.kwargs["response_format"]["json_schema"]["name"], "user_story")
+    
+    @patch('agent.asyncio.sleep', new_callable=AsyncMock)
+    @patch('agent.get_openai_client')
+    def test_invalid_story_gets_one_repair(self, mock_get_client, mock_sleep):
+        invalid = json.dumps({"title": "As a user, I want exports"})
+        create = AsyncMock(side_effect=[make_completion(invalid), make_completion(json.dumps(self.STORY))])
+        mock_get_client.return_value.chat.completions.create = create
+        
+        story = asyncio.run(JiraFeedbackAgent()._create_user_story("Export hidden", "Hard to find"))
+        
+        self.assertEqual(story, self.STORY)
+        repair_messages = create.await_args_list[1].kwargs["messages"]
+        self.assertEqual(repair_messages[-2], {"role": "assistant", "content": invalid})
+        self.assertIn("acceptance_criteria", repair_messages[-1]["content"])
+    
+    @patch('agent.asyncio.sleep', new_callable=AsyncMock)
+    @patch('agent.get_openai_client')
+    def test_story_still_invalid_after_repair_fails_the_ticket(self, mock_get_client, mock_sleep):
+        create = AsyncMock(return_value=make_completion("As a user, I want exports\n- criteria"))
+        mock_get_client.return_value.chat.completions.create = create
+        
+        agent = JiraFeedbackAgent()
+        result = asyncio.run(agent._process_ticket(0, 1, {"key": "UX-1", "summary": "Export", "description": ""}))
+        
+        self.assertIsNone(result)
+        self.assertEqual(create.await_count, 2)
+
+def make_status_error(error_class, status_code, headers=None):
+    """Build an OpenAI API error as raised for an HTTP response."""
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(status_code, headers=headers or {}, request=request)
+    return error_class("error", response=response, body=None)
+
+class TestOpenAIRetry(unittest.TestCase):
+    """Test retry and backoff around OpenAI calls."""
+    
+    def setUp(self):
+        completion_cache.clear()
+    
+    @patch('agent.openai_rate_limiter.pause')
+    @patch('agent.asyncio.sleep', new_callable=AsyncMock)
+    @patch('agent.get_openai_client')
+    def test_rate_limit_is_retried_after_retry_after(self, mock_get_client, mock_sleep, mock_pause):
+        create = AsyncMock(side_effect=[
+            make_status_error(openai.RateLimitError, 429, {"retry-after": "2"}),
+            make_status_error(openai.InternalServerError, 503),
+            make_completion("Thanks!")
+        ])
+        mock_get_client.return_value.chat.completions.create = create
+        
+        agent = JiraFeedbackAgent()
+        response = asyncio.run(agent._suggest_pm_response("UX-101", "Export button hidden"))
+        
+        self.assertEqual(response, "Thanks!")
+        self.assertEqual(create.await_count, 3)
+        # The 429 pauses every caller for the server's Retry-After
+        mock_pause.assert_called_once_with(2.0)
+        self.assertEqual(mock_sleep.await_args_list[0].args[0], 2.0)
+    
+    @patch('agent.config.openai_max_retries', 1)
+    @patch('agent.asyncio.sleep', new_callable=AsyncMock)
+    @patch('agent.get_openai_client')
+    def test_client_errors_are_not_retried(self, mock_get_client, mock_sleep):
+        create = AsyncMock(side_effect=make_status_error(openai.BadRequestError, 400))
+        mock_get_client.return_value.chat.completions.create = create
+        
+        agent = JiraFeedbackAgent()
+        with self.assertRaises(openai.BadRequestError):
+            asyncio.run(agent._chat_completion([{"role": "user", "content": "Hi"}]))
+        create.assert_awaited_once()
+
+class TestCombinedGeneration(unittest.TestCase):
+    """Test the single-call combined generation mode."""
+    
+    def setUp(self):
+        completion_cache.clear()
+    
+    @patch('agent.asyncio.sleep', new_callable=AsyncMock)
+    @patch('agent.get_jira_feedback')
+    @patch('agent.get_openai_client')
+    def test_combined_mode_uses_one_call_per_ticket(self, mock_get_client, mock_get_feedback, mock_sleep):
+        """Both artifacts come from one structured completion."""
+        mock_get_feedback.return_value = [
+            {"key": "UX-101", "summary": "Export button hidden", "description": "Hard to find"}
+        ]
+        payload = {
+            "user_story": {
+                "title": "As a user, I want to find the export button easily",
+                "description": "Exporting should be one click away.",
+                "acceptance_criteria": ["Button is in the toolbar", "Button has a label"]
+            },
+            "pm_response": "Thanks for the feedback! We'll move the export button."
+        }
+        create = AsyncMock(return_value=make_completion(json.dumps(payload)))
+        mock_get_client.return_value.chat.completions.create = create
+        
+        agent = JiraFeedbackAgent(generation_mode="combined")
+        results = asyncio.run(agent.analyze_feedback("project = TEST"))
+        
+        create.assert_awaited_once()
+        self.assertEqual(create.await_args.kwargs["response_format"]["type"], "json_schema")
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].user_story, payload["user_story"])
+        self.assertEqual(results[0].pm_response, payload["pm_response"])
+    
+    @patch('agent.asyncio.sleep', new_callable=AsyncMock)
+    @patch('agent.get_jira_feedback')
+    @patch('agent.get_openai_client')
+    def test_combined_mode_drops_invalid_output(self, mock_get_client, mock_get_feedback, mock_sleep):
+        """Output that fails schema validation marks only that ticket as failed."""
+        mock_get_feedback.return_value = [{"key": "UX-101", "summary": "Export", "description": ""}]
+        mock_get_client.return_value.chat.completions.create = AsyncMock(
+            return_value=make_completion('{"pm_response": "Thanks"}')
+        )
+        
+        agent = JiraFeedbackAgent(generation_mode="combined")
+        results = asyncio.run(agent.analyze_feedback("project = TEST"))
+        
+        self.assertEqual(results, [])
+    
+    def test_unknown_generation_mode_rejected(self):
+        with self.assertRaises(ValueError):
+            JiraFeedbackAgent(generation_mode="triple")
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+class TestMetrics(unittest.TestCase):
+    """Test per-stage timings, token usage and ticket counts."""
+    
+    def setUp(self):
+        completion_cache.clear()
+    
+    @patch('agent.asyncio.sleep', new_callable=AsyncMock)
+    @patch('agent.get_openai_client')
+    def test_llm_call_records_stage_and_tokens(self, mock_get_client, mock_sleep):
+        completion = make_completion("Thanks!")
+        completion.usage = MagicMock(prompt_tokens=120, completion_tokens=30, total_tokens=150)
+        mock_get_client.return_value.chat.completions.create = AsyncMock(return_value=completion)
+        stage_count = sample("jira_agent_stage_duration_seconds_count", stage="llm_pm_response")
+        prompt_tokens = sample("jira_agent_llm_tokens_total", model="gpt-3.5-turbo", type="prompt")
+        completion_tokens = sample("jira_agent_llm_tokens_total", model="gpt-3.5-turbo", type="completion")
+        
+        asyncio.run(JiraFeedbackAgent()._suggest_pm_response("UX-1", "Export button hidden"))
+        
+        self.assertEqual(sample("jira_agent_stage_duration_seconds_count", stage="llm_pm_response"), stage_count + 1)
+        self.assertEqual(sample("jira_agent_llm_tokens_total", model="gpt-3.5-turbo", type="prompt"),
+                         prompt_tokens + 120)
+        self.assertEqual(sample("jira_agent_llm_tokens_total", model="gpt-3.5-turbo", type="completion"),
+                         completion_tokens + 30)
+        self.assertEqual(sample("jira_agent_llm_requests_in_progress", model="gpt-3.5-turbo"), 0)
+    
+    @patch('agent.asyncio.sleep', new_callable=AsyncMock)
+    @patch('agent.get_openai_client')
+    def test_failed_call_counts_error(self, mock_get_client, mock_sleep):
+        mock_get_client.return_value.chat.completions.create = AsyncMock(side_effect=ValueError("bad request"))
+        errors = sample("jira_agent_errors_total", stage="llm_pm_response", type="ValueError")
+        
+        with self.assertRaises(ValueError):
+            asyncio.run(JiraFeedbackAgent()._suggest_pm_response("UX-1", "Export button hidden"))
+        
+        self.assertEqual(sample("jira_agent_errors_total", stage="llm_pm_response", type="ValueError"), errors + 1)
+    
+    @patch('agent.get_jira_feedback')
+    def test_tickets_processed_counts_analyzed_tickets(self, mock_get_feedback):
+        mock_get_feedback.return_value = [
+            {"key": f"UX-{i}", "summary": f"Feedback {i}", "description": ""} for i in range(3)
+        ]
+        agent = JiraFeedbackAgent()
+        processed = sample("jira_agent_tickets_processed_total")
+        
+        async def fake_process(index, total, ticket):
+            if index == 1:
+                return None
+            return FeedbackAnalysisResult(ticket_id=ticket["key"], user_story={}, pm_response="")
+        
+        with patch.object(agent, "_process_ticket", side_effect=fake_process):
+            asyncio.run(agent.analyze_feedback("project = TEST"))
+        
+        self.assertEqual(sample("jira_agent_tickets_processed_total"), processed + 2)
+
+class TestDuplicateClustering(unittest.TestCase):
+    """Test that near-duplicate tickets share one generation."""
+    
+    @patch('agent.get_jira_feedback')
+    def test_duplicates_reuse_leader_result(self, mock_get_feedback):
+        mock_get_feedback.return_value = [
+            {"key": "UX-1", "summary": "Export to CSV is broken", "description": "CSV export fails"},
+            {"key": "UX-2", "summary": "Dark mode for dashboard", "description": "Dashboard too bright"},
+            {"key": "UX-3", "summary": "CSV export broken", "description": "Export to CSV fails"}
+        ]
+        agent = JiraFeedbackAgent(concurrency=2, cluster_duplicates=True)
+        story = AsyncMock(side_effect=lambda summary, description: {"title": summary})
+        response = AsyncMock(side_effect=lambda ticket_id, summary, description="": f"Thanks for {ticket_id}")
+        
+        with patch.object(agent, "_create_user_story", story), \
+             patch.object(agent, "_suggest_pm_response", response):
+            results = asyncio.run(agent.analyze_feedback("project = TEST"))
+        
+        self.assertEqual(story.await_count, 2)
+        self.assertEqual(response.await_count, 2)
+        by_key = {result.ticket_id: result for result in results}
+        self.assertEqual(set(by_key), {"UX-1", "UX-2", "UX-3"})
+        self.assertEqual(by_key["UX-3"].duplicate_of, "UX-1")
+        self.assertEqual(by_key["UX-3"].user_story, by_key["UX-1"].user_story)
+        self.assertEqual(by_key["UX-3"].pm_response, "Thanks for UX-3")
+        self.assertEqual(by_key["UX-1"].related_ticket_ids, ["UX-3"])
+        self.assertIsNone(by_key["UX-2"].duplicate_of)
+
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,60 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+import threading
+import time
+
+from agent_cache import AgentCache
+
+class TestAgentCache(unittest.TestCase):
+    """Test the bounded persistent-thread agent cache."""
+    
+    def test_reuses_agent_per_key(self):
+        cache = AgentCache(max_entries=2)
+        first = cache.get_or_create("alice", object)
+        self.assertIs(cache.get_or_create("alice", object), first)
+        self.assertIsNot(cache.get_or_create("bob", object), first)
+    
+    def test_evicts_least_recently_used(self):
+        cache = AgentCache(max_entries=2)
+        cache.get_or_create("alice", object)
+        cache.get_or_create("bob", object)
+        cache.get_or_create("alice", object)
+        cache.get_or_create("carol", object)
+        
+        self.assertIn("alice", cache)
+        self.assertNotIn("bob", cache)
+        self.assertEqual(len(cache), 2)
+    
+    def test_evicts_idle_agents(self):
+        cache = AgentCache(idle_ttl=60)
+        with patch("agent_cache.time.monotonic", return_value=1000.0):
+            cache.get_or_create("alice", object)
+        with patch("agent_cache.time.monotonic", return_value=1030.0):
+            cache.get_or_create("bob", object)
+        with patch("agent_cache.time.monotonic", return_value=1070.0):
+            self.assertEqual(cache.evict_idle(), ["alice"])
+        self.assertIn("bob", cache)
+    
+    def test_concurrent_requests_build_one_agent(self):
+        cache = AgentCache()
+        built = []
+        barrier = threading.Barrier(8)
+        
+        def factory():
+            built.append(1)
+            time.sleep(0.01)
+            return object()
+        
+        def request(_):
+            barrier.wait()
+            return cache.get_or_create("alice", factory)
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            agents = list(pool.map(request, range(8)))
+        
+        self.assertEqual(len(built), 1)
+        self.assertTrue(all(agent is agents[0] for agent in agents))
+
+if __name__ == "__main__":
+    unittest.main()
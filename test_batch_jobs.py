@@ -0,0 +1,139 @@
+import unittest
+from unittest.mock import patch, AsyncMock
+from types import SimpleNamespace
+import asyncio
+import json
+
+from agent import JiraFeedbackAgent
+from batch_jobs import BatchJobError, parse_batch_output, run_batch, build_batch_request
+from llm_cache import completion_cache
+
+STORY_TEXT = json.dumps({
+    "title": "As a user, I want to find the export button quickly",
+    "description": "Exporting is a frequent task.",
+    "acceptance_criteria": ["Export is in the toolbar"]
+})
+
+class FakeBatchAPI:
+    """Local stand-in for the OpenAI files and batches endpoints."""
+    
+    def __init__(self, respond, polls_until_done=2, final_status="completed"):
+        self.respond = respond
+        self.polls_until_done = polls_until_done
+        self.final_status = final_status
+        self.uploads = {}
+        self.batches = SimpleNamespace(create=self.create_batch, retrieve=self.retrieve_batch)
+        self.files = SimpleNamespace(create=self.create_file, content=self.file_content)
+        self.polls = 0
+    
+    async def create_file(self, file, purpose):
+        file_id = f"file-{len(self.uploads)}"
+        self.uploads[file_id] = file[1].decode("utf-8")
+        return SimpleNamespace(id=file_id)
+    
+    async def create_batch(self, input_file_id, endpoint, completion_window):
+        self.input_file_id = input_file_id
+        return SimpleNamespace(id="batch-1")
+    
+    async def retrieve_batch(self, batch_id):
+        self.polls += 1
+        if self.polls < self.polls_until_done:
+            return SimpleNamespace(status="in_progress")
+        if self.final_status != "completed":
+            return SimpleNamespace(status=self.final_status)
+        
+        lines = []
+        for line in self.uploads[self.input_file_id].splitlines():
+            request = json.loads(line)
+            content = self.respond(request)
+            if content is None:
+                lines.append({"custom_id": request["custom_id"], "response": None,
+                              "error": {"code": "server_error", "message": "failed"}})
+            else:
+                lines.append({"custom_id": request["custom_id"], "response": {
+                    "status_code": 200,
+                    "body": {"choices": [{"message": {"content": content}}]}
+                }, "error": None})
+        self.uploads["file-out"] = "\n".join(json.dumps(line) for line in lines)
+        return SimpleNamespace(status="completed", output_file_id="file-out", error_file_id=None)
+    
+    async def file_content(self, file_id):
+        return SimpleNamespace(text=self.uploads[file_id])
+
+def respond_to_prompt(request):
+    """Answer user story prompts with a story and PM prompts with a reply."""
+    if "Ticket ID" in request["body"]["messages"][-1]["content"]:
+        return "  Thanks for the feedback!  "
+    return STORY_TEXT
+
+class TestBatchJobs(unittest.TestCase):
+    """Test batch submission, polling and output parsing."""
+    
+    @patch('batch_jobs.asyncio.sleep', new_callable=AsyncMock)
+    def test_run_batch_polls_until_complete(self, mock_sleep):
+        api = FakeBatchAPI(lambda request: "ok", polls_until_done=3)
+        requests = [build_batch_request("0:pm_response", "gpt-3.5-turbo", [{"role": "user", "content": "Hi"}], 0.7)]
+        
+        outputs = asyncio.run(run_batch(api, requests, poll_interval=5))
+        
+        self.assertEqual(outputs, {"0:pm_response": "ok"})
+        self.assertEqual(mock_sleep.await_count, 2)
+        self.assertEqual(json.loads(api.uploads["file-0"])["url"], "/v1/chat/completions")
+    
+    @patch('batch_jobs.asyncio.sleep', new_callable=AsyncMock)
+    def test_failed_batch_raises(self, mock_sleep):
+        api = FakeBatchAPI(lambda request: "ok", final_status="expired")
+        with self.assertRaises(BatchJobError):
+            asyncio.run(run_batch(api, [build_batch_request("0:x", "m", [], 0.7)]))
+    
+    def test_parse_output_marks_errors(self):
+        text = "\n".join([
+            json.dumps({"custom_id": "0:a", "response": {"status_code": 200,
+                        "body": {"choices": [{"message": {"content": "hi"}}]}}}),
+            json.dumps({"custom_id": "1:a", "response": {"status_code": 500, "body": {}}}),
+        ])
+        self.assertEqual(parse_batch_output(text), {"0:a": "hi", "1:a": None})
+
+class TestAgentBatchMode(unittest.TestCase):
+    """Test mapping batch outputs back to tickets."""
+    
+    def setUp(self):
+        completion_cache.clear()
+    
+    @patch('batch_jobs.asyncio.sleep', new_callable=AsyncMock)
+    @patch('agent.get_jira_feedback')
+    @patch('agent.get_openai_client')
+    def test_batch_results_map_back_to_tickets(self, mock_get_client, mock_get_feedback, mock_sleep):
+        mock_get_feedback.return_value = [
+            {"key": "UX-1", "summary": "Export hidden", "description": ""},
+            {"key": "UX-2", "summary": "Slow dashboard", "description": ""},
+            {"key": "UX-3", "summary": "Broken link", "description": ""}
+        ]
+        
+        def respond(request):
+            # The PM response for UX-2 fails
+            if "UX-2" in request["body"]["messages"][-1]["content"]:
+                return None
+            return respond_to_prompt(request)
+        
+        api = FakeBatchAPI(respond)
+        mock_get_client.return_value = api
+        
+        results = asyncio.run(JiraFeedbackAgent(pacing="none").analyze_feedback_batch("project = UX"))
+        
+        self.assertEqual([r.ticket_id for r in results], ["UX-1", "UX-3"])
+        self.assertEqual(results[0].pm_response, "Thanks for the feedback!")
+        self.assertEqual(results[0].user_story["title"], "As a user, I want to find the export button quickly")
+        self.assertEqual(len(api.uploads["file-0"].splitlines()), 6)
+        
+        # A second sweep only resubmits what failed
+        api = FakeBatchAPI(respond_to_prompt)
+        mock_get_client.return_value = api
+        results = asyncio.run(JiraFeedbackAgent(pacing="none").analyze_feedback_batch("project = UX"))
+        
+        self.assertEqual([r.ticket_id for r in results], ["UX-1", "UX-2", "UX-3"])
+        self.assertEqual([json.loads(line)["custom_id"] for line in api.uploads["file-0"].splitlines()],
+                         ["1:pm_response"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from tools.clustering import cluster_tickets, personalize_response, tokenize
+
+class TestClustering(unittest.TestCase):
+    """Test near-duplicate ticket clustering."""
+    
+    def test_tokenize_drops_stop_words(self):
+        self.assertEqual(tokenize("The export is NOT working, a 404!"), ["export", "working", "404"])
+    
+    def test_similar_tickets_share_a_cluster(self):
+        tickets = [
+            {"key": "UX-1", "summary": "Dashboard loads slowly", "description": "The dashboard takes ages to load"},
+            {"key": "UX-2", "summary": "Dashboard is slow to load", "description": "Dashboard load takes ages"},
+            {"key": "UX-3", "summary": "Add CSV export", "description": "Please allow exporting reports"},
+            {"key": "UX-4", "summary": "Slow dashboard loading", "description": "Dashboard loads slowly"},
+            {"key": "UX-5", "summary": "CSV export for reports", "description": "Export reports as CSV"}
+        ]
+        self.assertEqual(cluster_tickets(tickets), [[0, 1, 3], [2, 4]])
+    
+    def test_paraphrased_tickets_share_a_cluster(self):
+        tickets = [
+            {"key": "UX-1", "summary": "dashboard slow", "description": ""},
+            {"key": "UX-2", "summary": "dashboard takes forever to load", "description": ""}
+        ]
+        self.assertEqual(cluster_tickets(tickets), [[0, 1]])
+    
+    def test_different_problems_in_the_same_area_stay_apart(self):
+        tickets = [
+            {"key": "UX-1", "summary": "Login page slow", "description": "The login page takes long to load"},
+            {"key": "UX-2", "summary": "Login page broken", "description": "The login page does not load"}
+        ]
+        self.assertEqual(cluster_tickets(tickets), [[0], [1]])
+    
+    def test_different_formats_stay_apart(self):
+        description = "Clicking export shows an error and no file is downloaded"
+        tickets = [
+            {"key": "UX-1", "summary": "Cannot export PDF", "description": description},
+            {"key": "UX-2", "summary": "Cannot export CSV", "description": description},
+            {"key": "UX-3", "summary": "Cannot export to PDF", "description": description}
+        ]
+        self.assertEqual(cluster_tickets(tickets), [[0, 2], [1]])
+    
+    def test_high_threshold_keeps_tickets_apart(self):
+        tickets = [
+            {"key": "UX-1", "summary": "Dashboard loads slowly", "description": ""},
+            {"key": "UX-2", "summary": "Dashboard is slow", "description": ""}
+        ]
+        self.assertEqual(cluster_tickets(tickets, threshold=0.99), [[0], [1]])
+    
+    def test_empty_input(self):
+        self.assertEqual(cluster_tickets([]), [])
+    
+    def test_personalize_response_swaps_ticket_key(self):
+        response = personalize_response("Thanks for reporting UX-1!", {"key": "UX-1"}, {"key": "UX-7"})
+        self.assertEqual(response, "Thanks for reporting UX-7!")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import unittest
+from unittest.mock import patch, AsyncMock, MagicMock
+import asyncio
+import os
+import tempfile
+from datetime import timezone
+from zoneinfo import ZoneInfo
+
+from jira import JIRAError
+
+from agent import JiraFeedbackAgent
+from tools.jira_tools import JiraClient, build_updated_since_jql
+from tools.watermark_store import INITIAL_WATERMARK, WatermarkStore
+
+class TestUpdatedSinceJql(unittest.TestCase):
+    """Test JQL rewriting for incremental fetches."""
+    
+    def test_filter_and_order_are_added(self):
+        jql = build_updated_since_jql("project = UX ORDER BY created DESC", "2023-11-02T14:15:30.000+0000",
+                                      timezone.utc)
+        self.assertEqual(jql, '(project = UX) AND updated >= "2023/11/02 14:15" ORDER BY updated ASC')
+    
+    def test_timestamp_is_written_in_the_user_timezone(self):
+        jql = build_updated_since_jql("project = UX", "2023-11-02T16:15:00.000+0200", ZoneInfo("America/New_York"))
+        self.assertIn('updated >= "2023/11/02 10:15"', jql)
+    
+    def test_unknown_timezone_widens_the_filter(self):
+        jql = build_updated_since_jql("project = UX", "2023-11-02T16:15:00.000+0200")
+        self.assertIn('updated >= "2023/11/02 00:15"', jql)
+    
+    def test_client_uses_the_profile_timezone(self):
+        client = JiraClient()
+        client.use_mock = False
+        client.client = MagicMock()
+        client.client.myself.return_value = {"timeZone": "America/Chicago"}
+        client.client.search_issues.return_value = {"issues": [], "total": 0, "maxResults": 50}
+        
+        client.get_feedback_tickets("project = UX", updated_since="2023-11-02T14:15:00.000+0000")
+        client.get_feedback_tickets("project = UX", updated_since="2023-11-02T14:15:00.000+0000")
+        
+        jql = client.client.search_issues.call_args.args[0]
+        self.assertIn('updated >= "2023/11/02 09:15"', jql)
+        client.client.myself.assert_called_once()
+    
+    def test_mock_client_filters_by_updated(self):
+        client = JiraClient()
+        client.use_mock = True
+        tickets = client.get_feedback_tickets("project = UX", updated_since="2023-11-04T00:00:00.000+0000")
+        self.assertEqual([t.key for t in tickets], ["UX-104", "UX-105"])
+
+    def test_errors_are_raised_instead_of_mock_tickets_when_incremental(self):
+        client = JiraClient()
+        client.use_mock = False
+        client.client = MagicMock()
+        client.client.search_issues.side_effect = JIRAError(status_code=400, text="Bad JQL")
+        
+        with self.assertRaises(JIRAError):
+            client.get_feedback_tickets("project = UX", updated_since="2023-11-04T00:00:00.000+0000")
+        # Full fetches still fall back to mock tickets
+        self.assertEqual(len(client.get_feedback_tickets("project = UX")), 3)
+
+class TestIncrementalAnalysis(unittest.TestCase):
+    """Test that incremental runs only process changed tickets."""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = WatermarkStore(os.path.join(self.tmpdir.name, "watermarks.db"))
+        self.tickets = [
+            {"key": "UX-1", "summary": "Slow dashboard", "description": "", "updated": "2023-11-01T10:00:00.000+0000"},
+            {"key": "UX-2", "summary": "Hidden export", "description": "", "updated": "2023-11-02T10:00:00.000+0000"},
+        ]
+    
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+    
+    def run_analysis(self, agent, story):
+        async def fake_response(ticket_id, summary, description=""):
+            return f"Thanks for {ticket_id}"
+        
+        with patch.object(agent, "_create_user_story", side_effect=story), \
+             patch.object(agent, "_suggest_pm_response", side_effect=fake_response):
+            return asyncio.run(agent.analyze_feedback("project = UX", incremental=True))
+    
+    @patch('agent.get_jira_feedback')
+    def test_unchanged_tickets_are_reused(self, mock_get_feedback):
+        mock_get_feedback.return_value = self.tickets
+        story = AsyncMock(side_effect=lambda summary, description: {
+            "title": summary, "description": "", "acceptance_criteria": []
+        })
+        agent = JiraFeedbackAgent()
+        
+        with patch('agent.get_watermark_store', return_value=self.store):
+            first = self.run_analysis(agent, story)
+            self.assertEqual(mock_get_feedback.call_args.kwargs["updated_since"], INITIAL_WATERMARK)
+            self.assertEqual(self.store.get_watermark("project = UX"), "2023-11-02T10:00:00.000+0000")
+            
+            # The boundary ticket comes back unchanged and a new ticket appears
+            mock_get_feedback.return_value = [
+                self.tickets[1],
+                {"key": "UX-3", "summary": "Dark mode", "description": "", "updated": "2023-11-03T10:00:00.000+0000"},
+            ]
+            second = self.run_analysis(agent, story)
+        
+        self.assertEqual([r.ticket_id for r in first], ["UX-1", "UX-2"])
+        self.assertEqual([r.ticket_id for r in second], ["UX-2", "UX-3"])
+        self.assertEqual(mock_get_feedback.call_args.kwargs["updated_since"], "2023-11-02T10:00:00.000+0000")
+        self.assertEqual(story.await_count, 3)
+        self.assertEqual(self.store.get_watermark("project = UX"), "2023-11-03T10:00:00.000+0000")
+    
+    @patch('agent.get_jira_feedback')
+    def test_more_boundary_tickets_than_max_results_do_not_stall(self, mock_get_feedback):
+        # A bulk edit left three tickets in the same minute
+        tickets = [
+            {"key": f"UX-{n}", "summary": f"Ticket {n}", "description": "", "updated": "2023-11-01T10:00:00.000+0000"}
+            for n in range(1, 4)
+        ] + [{"key": "UX-4", "summary": "Ticket 4", "description": "", "updated": "2023-11-02T10:00:00.000+0000"}]
+        mock_get_feedback.side_effect = lambda jql, max_results, updated_since=None: tickets[:max_results]
+        story = AsyncMock(side_effect=lambda summary, description: {
+            "title": summary, "description": "", "acceptance_criteria": []
+        })
+        agent = JiraFeedbackAgent()
+        
+        async def fake_response(ticket_id, summary, description=""):
+            return f"Thanks for {ticket_id}"
+        
+        runs = []
+        with patch('agent.get_watermark_store', return_value=self.store), \
+             patch.object(agent, "_create_user_story", side_effect=story), \
+             patch.object(agent, "_suggest_pm_response", side_effect=fake_response):
+            for _ in range(2):
+                runs.append(asyncio.run(agent.analyze_feedback("project = UX", max_results=2, incremental=True)))
+        
+        self.assertEqual([r.ticket_id for r in runs[0]], ["UX-1", "UX-2"])
+        self.assertEqual([r.ticket_id for r in runs[1]], ["UX-1", "UX-2", "UX-3", "UX-4"])
+        self.assertEqual(story.await_count, 4)
+        self.assertEqual(self.store.get_watermark("project = UX"), "2023-11-02T10:00:00.000+0000")
+    
+    @patch('agent.get_jira_feedback')
+    def test_watermark_stops_at_failed_ticket(self, mock_get_feedback):
+        mock_get_feedback.return_value = self.tickets
+        
+        async def story(summary, description):
+            if summary == "Slow dashboard":
+                raise RuntimeError("LLM unavailable")
+            return {"title": summary, "description": "", "acceptance_criteria": []}
+        
+        with patch('agent.get_watermark_store', return_value=self.store):
+            results = self.run_analysis(JiraFeedbackAgent(), story)
+        
+        self.assertEqual([r.ticket_id for r in results], ["UX-2"])
+        self.assertEqual(self.store.get_watermark("project = UX"), "2023-11-01T10:00:00.000+0000")
+
+if __name__ == "__main__":
+    unittest.main()
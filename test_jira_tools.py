@@ -0,0 +1,165 @@
+import unittest
+from unittest.mock import MagicMock
+import threading
+import time
+
+from jira import JIRAError
+
+from rate_limit import TokenBucket, parse_retry_after
+from tools.jira_tools import JiraClient, TICKET_FIELDS, ticket_from_issue_json
+
+def make_issue(number):
+    """Build a raw search result issue as returned with json_result=True."""
+    return {
+        "id": str(10000 + number),
+        "key": f"UX-{number}",
+        "fields": {
+            "summary": f"Feedback {number}",
+            "description": None,
+            "reporter": {"displayName": "Jane Smith"} if number % 2 else None,
+            "created": "2023-11-01T10:30:00.000+0000",
+            "updated": "2023-11-01T10:30:00.000+0000",
+            "labels": ["feedback"]
+        }
+    }
+
+class FakeJira:
+    """JIRA stand-in with a server-side page size cap."""
+    
+    def __init__(self, total, server_max=50, failures=None):
+        self.total = total
+        self.server_max = server_max
+        self.failures = failures or {}
+        self.calls = []
+        self.requests = []
+        self.lock = threading.Lock()
+    
+    def search_issues(self, jql, startAt=0, maxResults=50, fields="*all", expand=None, json_result=False):
+        with self.lock:
+            self.calls.append((startAt, maxResults))
+            self.requests.append({"fields": fields, "expand": expand, "json_result": json_result})
+            error = self.failures.pop(startAt, None)
+        if error is not None:
+            raise error
+        size = min(maxResults, self.server_max)
+        issues = [make_issue(n) for n in range(startAt, min(startAt + size, self.total))]
+        return {"startAt": startAt, "maxResults": size, "total": self.total, "issues": issues}
+
+class FakeCloudJira(FakeJira):
+    """Jira Cloud stand-in: enhanced search pages by token and reports no total."""
+    
+    def search_issues(self, jql, startAt=0, maxResults=50, fields="*all", expand=None, json_result=False):
+        if startAt:
+            raise JIRAError("The `search` API is deprecated in Jira Cloud. Use `enhanced_search_issues` method instead.")
+        return self.enhanced_search_issues(jql, None, maxResults, fields, expand, json_result=json_result)
+    
+    def enhanced_search_issues(self, jql, nextPageToken=None, maxResults=50, fields="*all", expand=None,
+                               json_result=False):
+        start = int(nextPageToken or 0)
+        with self.lock:
+            self.calls.append((nextPageToken, maxResults))
+        size = min(maxResults, self.server_max)
+        end = min(start + size, self.total)
+        page = {"issues": [make_issue(n) for n in range(start, end)], "isLast": end >= self.total}
+        if end < self.total:
+            page["nextPageToken"] = str(end)
+        return page
+
+class TestJiraPagination(unittest.TestCase):
+    """Test concurrent, rate-limited JIRA pagination."""
+    
+    def make_client(self, fake):
+        client = JiraClient()
+        client.use_mock = False
+        client.client = fake
+        client.config = client.config.model_copy(update={"page_size": 100, "fetch_concurrency": 4})
+        client.rate_limiter = TokenBucket(rate=1000)
+        return client
+    
+    def test_pages_follow_server_page_size_and_keep_order(self):
+        fake = FakeJira(total=230)
+        tickets = self.make_client(fake).get_feedback_tickets("project = UX", max_results=500)
+        
+        self.assertEqual([t.key for t in tickets], [f"UX-{n}" for n in range(230)])
+        self.assertEqual(fake.calls[0], (0, 100))
+        self.assertEqual(sorted(start for start, _ in fake.calls[1:]), [50, 100, 150, 200])
+    
+    def test_max_results_limits_pages(self):
+        fake = FakeJira(total=1000)
+        tickets = self.make_client(fake).get_feedback_tickets("project = UX", max_results=120)
+        
+        self.assertEqual(len(tickets), 120)
+        self.assertEqual(sorted(fake.calls), [(0, 100), (50, 50), (100, 20)])
+    
+    def test_rate_limited_page_is_retried_after_delay(self):
+        response = MagicMock(headers={"Retry-After": "0.2"})
+        fake = FakeJira(total=100, failures={50: JIRAError(status_code=429, response=response)})
+        
+        started = time.monotonic()
+        tickets = self.make_client(fake).get_feedback_tickets("project = UX", max_results=100)
+        
+        self.assertEqual(len(tickets), 100)
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual([start for start, _ in fake.calls].count(50), 2)
+
+    def test_cloud_search_follows_page_tokens(self):
+        fake = FakeCloudJira(total=130)
+        tickets = self.make_client(fake).get_feedback_tickets("project = UX", max_results=500)
+        
+        self.assertEqual([t.key for t in tickets], [f"UX-{n}" for n in range(130)])
+        self.assertEqual(fake.calls, [(None, 100), ("50", 50), ("100", 50)])
+    
+    def test_cloud_search_stops_at_max_results(self):
+        fake = FakeCloudJira(total=1000)
+        tickets = self.make_client(fake).get_feedback_tickets("project = UX", max_results=120)
+        
+        self.assertEqual(len(tickets), 120)
+        self.assertEqual(fake.calls, [(None, 100), ("50", 50), ("100", 20)])
+
+class TestFieldProjection(unittest.TestCase):
+    """Test that searches request only the fields JiraTicket needs."""
+    
+    def make_client(self, fake):
+        client = JiraClient()
+        client.use_mock = False
+        client.client = fake
+        client.rate_limiter = TokenBucket(rate=1000)
+        return client
+    
+    def test_search_requests_projected_fields_as_raw_json(self):
+        fake = FakeJira(total=2)
+        self.make_client(fake).get_feedback_tickets("project = UX", expand=["names"])
+        
+        request = fake.requests[0]
+        self.assertEqual(request["fields"], TICKET_FIELDS)
+        self.assertIsNot(request["fields"], TICKET_FIELDS)
+        self.assertEqual(request["expand"], "names")
+        self.assertTrue(request["json_result"])
+    
+    def test_raw_issue_maps_to_ticket(self):
+        ticket = ticket_from_issue_json(make_issue(1))
+        
+        self.assertEqual(ticket.id, "10001")
+        self.assertEqual(ticket.key, "UX-1")
+        self.assertEqual(ticket.description, "")
+        self.assertEqual(ticket.reporter, "Jane Smith")
+        self.assertEqual(ticket.updated, "2023-11-01T10:30:00.000+0000")
+        self.assertIsNone(ticket_from_issue_json(make_issue(2)).reporter)
+
+class TestTokenBucket(unittest.TestCase):
+    """Test the token bucket rate limiter."""
+    
+    def test_bucket_limits_rate(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        started = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.19)
+    
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+from unittest.mock import patch, AsyncMock
+import asyncio
+import os
+import tempfile
+
+from job_queue import SQLiteJobQueue, create_job_queue
+
+class TestSQLiteJobQueue(unittest.TestCase):
+    """Test the SQLite-backed workflow job queue."""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "jobs.db")
+        self.queue = SQLiteJobQueue(self.path, lease_timeout=60, max_attempts=2)
+    
+    def tearDown(self):
+        self.queue.close()
+        self.tmpdir.cleanup()
+    
+    def test_jobs_are_claimed_once_in_order(self):
+        self.queue.enqueue("wf-1", "workflow")
+        self.queue.enqueue("wf-2", "workflow")
+        
+        # A second connection stands in for another worker process
+        other = SQLiteJobQueue(self.path)
+        self.assertEqual(self.queue.claim("worker-a")["job_id"], "wf-1")
+        self.assertEqual(other.claim("worker-b")["job_id"], "wf-2")
+        self.assertIsNone(self.queue.claim("worker-a"))
+        other.close()
+        
+        self.queue.complete("wf-1")
+        self.assertEqual(self.queue.get("wf-1")["status"], "done")
+        self.assertEqual(self.queue.get("wf-2")["worker_id"], "worker-b")
+    
+    def test_expired_lease_is_requeued_until_attempts_run_out(self):
+        self.queue.enqueue("wf-1", "workflow", {"jql": "project = UX"})
+        with patch("job_queue.time.time", return_value=1000.0):
+            job = self.queue.claim("worker-a")
+        self.assertEqual(job["payload"], {"jql": "project = UX"})
+        
+        with patch("job_queue.time.time", return_value=1030.0):
+            self.assertTrue(self.queue.extend_lease("wf-1", "worker-a"))
+            self.assertIsNone(self.queue.claim("worker-b"))
+        
+        with patch("job_queue.time.time", return_value=1100.0):
+            job = self.queue.claim("worker-b")
+        self.assertEqual(job["attempts"], 2)
+        self.assertFalse(self.queue.extend_lease("wf-1", "worker-a"))
+        
+        with patch("job_queue.time.time", return_value=1200.0):
+            self.assertIsNone(self.queue.claim("worker-c"))
+        self.assertEqual(self.queue.get("wf-1")["status"], "failed")
+    
+    def test_queue_mode_requires_shared_store(self):
+        with patch("job_queue.config") as mock_config:
+            mock_config.workflow_execution = "queue"
+            mock_config.workflow_store = "memory"
+            with self.assertRaises(ValueError):
+                create_job_queue()
+            
+            mock_config.workflow_execution = "inline"
+            self.assertIsNone(create_job_queue())
+
+class TestWorkflowWorker(unittest.TestCase):
+    """Test that workers run claimed workflows and record the outcome."""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.queue = SQLiteJobQueue(os.path.join(self.tmpdir.name, "jobs.db"))
+    
+    def tearDown(self):
+        self.queue.close()
+        self.tmpdir.cleanup()
+    
+    @patch("main.run_workflow", new_callable=AsyncMock)
+    def test_worker_runs_queued_workflows(self, mock_run_workflow):
+        from worker import WorkflowWorker
+        
+        self.queue.enqueue("wf-1", "workflow")
+        self.queue.enqueue("wf-2", "workflow")
+        worker = WorkflowWorker(self.queue, concurrency=2, poll_interval=0.01)
+        
+        async def run():
+            stop = asyncio.Event()
+            task = asyncio.create_task(worker.run(stop))
+            while self.queue.depth() or mock_run_workflow.await_count < 2:
+                await asyncio.sleep(0.01)
+            stop.set()
+            await task
+        
+        asyncio.run(run())
+        
+        self.assertEqual(sorted(call.args[0] for call in mock_run_workflow.await_args_list), ["wf-1", "wf-2"])
+        self.assertEqual(self.queue.get("wf-1")["status"], "done")
+        self.assertEqual(self.queue.get("wf-2")["status"], "done")
+    
+    def run_worker_until_idle(self, worker):
+        async def run():
+            stop = asyncio.Event()
+            task = asyncio.create_task(worker.run(stop))
+            while self.queue.depth():
+                await asyncio.sleep(0.01)
+            stop.set()
+            await task
+        
+        asyncio.run(run())
+    
+    def test_failed_workflow_fails_the_job_and_retries_start_clean(self):
+        import main
+        from worker import WorkflowWorker
+        from workflow_store import new_workflow_record
+        
+        request = {"jql": "project = UX", "max_results": 5, "post_to_jira": False, "pacing": "none"}
+        main.workflow_store.create("wf-retry", new_workflow_record(request))
+        self.addCleanup(main.workflow_store.delete, "wf-retry")
+        # Left over from an earlier attempt whose worker died
+        asyncio.run(main.add_workflow_step("wf-retry", title="Starting Workflow", content="", type="info"))
+        asyncio.run(main.add_workflow_step("wf-retry", title="Fetching JIRA Tickets", content="", type="info"))
+        self.queue.enqueue("wf-retry", "workflow")
+        
+        worker = WorkflowWorker(self.queue, poll_interval=0.01)
+        with patch.object(main.jira_client, "get_feedback_tickets", side_effect=RuntimeError("JIRA is down")):
+            self.run_worker_until_idle(worker)
+        
+        job = self.queue.get("wf-retry")
+        self.assertEqual(job["status"], "failed")
+        self.assertEqual(job["error"], "JIRA is down")
+        workflow = main.workflow_store.get("wf-retry")
+        self.assertEqual(workflow["current_status"], "Error: JIRA is down")
+        self.assertEqual([step["title"] for step in workflow["steps"]],
+                         ["Starting Workflow", "Fetching JIRA Tickets", "Error"])
+    
+    def test_stop_is_noticed_without_waiting_for_the_poll(self):
+        from worker import WorkflowWorker
+        
+        worker = WorkflowWorker(self.queue, poll_interval=60)
+        
+        async def run():
+            stop = asyncio.Event()
+            task = asyncio.create_task(worker.run(stop))
+            await asyncio.sleep(0.05)
+            stop.set()
+            await asyncio.wait_for(task, timeout=5)
+            # Only this test's task is left; the poll wait was not left behind
+            return len(asyncio.all_tasks())
+        
+        self.assertEqual(asyncio.run(run()), 1)
+
+if __name__ == "__main__":
+    unittest.main()
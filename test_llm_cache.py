@@ -0,0 +1,117 @@
+import unittest
+from unittest.mock import patch, AsyncMock, MagicMock
+import asyncio
+import os
+import tempfile
+import time
+
+from llm_cache import CompletionCache, MemoryCacheTier, SQLiteCacheTier, make_cache_key
+
+class TestCacheKey(unittest.TestCase):
+    """Test content-addressed cache keys."""
+    
+    def test_key_depends_on_prompt_model_and_temperature(self):
+        messages = [{"role": "user", "content": "Dashboard is slow"}]
+        key = make_cache_key("gpt-3.5-turbo", 0.7, messages)
+        
+        self.assertEqual(key, make_cache_key("gpt-3.5-turbo", 0.7, [dict(m) for m in messages]))
+        self.assertNotEqual(key, make_cache_key("gpt-4o-mini", 0.7, messages))
+        self.assertNotEqual(key, make_cache_key("gpt-3.5-turbo", 0.2, messages))
+        self.assertNotEqual(key, make_cache_key("gpt-3.5-turbo", 0.7, [{"role": "user", "content": "Other"}]))
+
+class TestCompletionCache(unittest.TestCase):
+    """Test the memory and SQLite cache tiers."""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.db")
+    
+    def tearDown(self):
+        self.tmpdir.cleanup()
+    
+    def test_memory_tier_evicts_least_recently_used(self):
+        tier = MemoryCacheTier(max_entries=2)
+        tier.set("a", "1")
+        tier.set("b", "2")
+        tier.get("a")
+        tier.set("c", "3")
+        
+        self.assertEqual(tier.get("a"), "1")
+        self.assertIsNone(tier.get("b"))
+        self.assertEqual(tier.get("c"), "3")
+    
+    def test_memory_tier_expires_entries(self):
+        tier = MemoryCacheTier(ttl=60)
+        tier.set("a", "1", created_at=time.time() - 120)
+        
+        self.assertIsNone(tier.get("a"))
+    
+    def test_disk_tier_survives_restart_and_promotes_to_memory(self):
+        disk = SQLiteCacheTier(self.path)
+        CompletionCache(disk=disk).set("key", {"title": "As a user"})
+        disk.close()
+        
+        cache = CompletionCache(disk=SQLiteCacheTier(self.path))
+        self.assertEqual(cache.get("key"), {"title": "As a user"})
+        self.assertEqual(cache.memory.get("key"), '{"title": "As a user"}')
+        cache.disk.close()
+    
+    def test_disk_tier_evicts_by_size(self):
+        disk = SQLiteCacheTier(self.path, max_entries=2)
+        for key in ("a", "b", "c"):
+            disk.set(key, key)
+        
+        self.assertIsNone(disk.get("a"))
+        self.assertIsNotNone(disk.get("c"))
+        disk.close()
+    
+    def test_disk_hits_count_for_eviction_once_flushed(self):
+        disk = SQLiteCacheTier(self.path, max_entries=3)
+        for key in ("a", "b", "c"):
+            disk.set(key, key)
+        disk.get("a")
+        # Over capacity: trimmed to 90% of max_entries, least recently used first
+        disk.set("d", "d")
+        
+        self.assertEqual([key for key in "abcd" if disk.get(key) is not None], ["a", "d"])
+        disk.close()
+    
+    def test_async_access_reads_and_writes_the_disk_tier(self):
+        cache = CompletionCache(disk=SQLiteCacheTier(self.path))
+        asyncio.run(cache.aset("key", {"title": "As a user"}))
+        cache.memory.clear()
+        
+        self.assertEqual(asyncio.run(cache.aget("key")), {"title": "As a user"})
+        self.assertEqual(cache.memory.get("key"), '{"title": "As a user"}')
+        self.assertIsNone(asyncio.run(cache.aget("missing")))
+        cache.disk.close()
+    
+    def test_disabled_cache_always_misses(self):
+        cache = CompletionCache(enabled=False)
+        cache.set("key", "value")
+        
+        self.assertIsNone(cache.get("key"))
+
+class TestAgentCaching(unittest.TestCase):
+    """Test that the agent reuses cached generations."""
+    
+    @patch('agent.asyncio.sleep', new_callable=AsyncMock)
+    @patch('agent.get_openai_client')
+    def test_identical_prompt_calls_llm_once(self, mock_get_client, mock_sleep):
+        from agent import JiraFeedbackAgent
+        
+        create = AsyncMock(return_value=MagicMock(
+            choices=[MagicMock(message=MagicMock(content="Thanks, we're on it."))]
+        ))
+        mock_get_client.return_value.chat.completions.create = create
+        
+        with patch('agent.completion_cache', CompletionCache()):
+            agent = JiraFeedbackAgent()
+            first = asyncio.run(agent._suggest_pm_response("UX-7", "Search is broken"))
+            second = asyncio.run(agent._suggest_pm_response("UX-7", "Search is broken"))
+        
+        self.assertEqual(first, second)
+        create.assert_awaited_once()
+
+if __name__ == "__main__":
+    unittest.main()
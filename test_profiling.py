@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import patch
+from collections import Counter
+import asyncio
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from prometheus_client import REGISTRY
+
+from main import app
+from profiling import LoopWatchdog, format_collapsed, measure_loop_lag, sample_stacks
+
+def busy_wait(stop):
+    while not stop.is_set():
+        time.sleep(0.001)
+
+class TestSampler(unittest.TestCase):
+    """Test stack sampling and loop lag measurement."""
+    
+    def test_samples_other_threads_stacks(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=busy_wait, args=(stop,), name="busy worker")
+        thread.start()
+        try:
+            counts = sample_stacks(0.05, interval=0.002)
+        finally:
+            stop.set()
+            thread.join()
+        
+        busy = [stack for stack in counts if stack.startswith("busy_worker;")]
+        self.assertTrue(busy)
+        self.assertTrue(busy[0].endswith("test_profiling.py:busy_wait"))
+        self.assertFalse(any("sample_stacks" in stack for stack in counts))
+    
+    def test_format_collapsed_orders_by_count(self):
+        output = format_collapsed(Counter({"main;a;b": 2, "main;a;c": 5}))
+        self.assertEqual(output, "main;a;c 5\nmain;a;b 2\n")
+    
+    def test_blocking_call_shows_up_as_loop_lag(self):
+        async def run():
+            measuring = asyncio.create_task(measure_loop_lag(0.15, interval=0.01))
+            await asyncio.sleep(0.03)
+            time.sleep(0.08)  # Blocks the loop
+            return await measuring
+        
+        lag = asyncio.run(run())
+        self.assertGreater(lag["samples"], 0)
+        self.assertGreaterEqual(lag["max_ms"], 50)
+
+def block_the_loop(seconds):
+    time.sleep(seconds)
+
+class TestLoopWatchdog(unittest.TestCase):
+    """Test detection of calls that block the event loop."""
+    
+    def test_blocking_call_is_logged_once_with_its_stack(self):
+        blocked = REGISTRY.get_sample_value("jira_agent_event_loop_blocked_total")
+        
+        async def run():
+            watchdog = LoopWatchdog(threshold=0.05, interval=0.01)
+            watchdog.start()
+            await asyncio.sleep(0.03)
+            block_the_loop(0.2)
+            await asyncio.sleep(0.03)
+            await watchdog.stop()
+        
+        with patch('profiling.logger') as mock_logger:
+            asyncio.run(run())
+        
+        mock_logger.warning.assert_called_once()
+        stack = mock_logger.warning.call_args.kwargs["stack"]
+        self.assertEqual(stack[-1], "test_profiling.py:block_the_loop")
+        self.assertEqual(REGISTRY.get_sample_value("jira_agent_event_loop_blocked_total"), blocked + 1)
+    
+    def test_idle_loop_is_not_reported(self):
+        async def run():
+            watchdog = LoopWatchdog(threshold=0.05, interval=0.01)
+            watchdog.start()
+            await asyncio.sleep(0.1)
+            await watchdog.stop()
+        
+        with patch('profiling.logger') as mock_logger:
+            asyncio.run(run())
+        
+        mock_logger.warning.assert_not_called()
+
+class TestProfileEndpoint(unittest.TestCase):
+    """Test the config-guarded profiling endpoint."""
+    
+    def setUp(self):
+        self.client = TestClient(app)
+    
+    def test_disabled_by_default(self):
+        self.assertEqual(self.client.get("/admin/profile?seconds=0.01").status_code, 404)
+    
+    @patch('main.config.profiling_enabled', True)
+    def test_returns_stacks_and_loop_lag(self):
+        response = self.client.get("/admin/profile?seconds=0.05&interval_ms=2")
+        
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertGreater(report["samples"], 0)
+        self.assertIn("max_ms", report["loop_lag"])
+        self.assertTrue(report["collapsed"].strip())
+    
+    @patch('main.config.profiling_enabled', True)
+    def test_collapsed_format_and_duration_cap(self):
+        response = self.client.get("/admin/profile?seconds=0.02&format=collapsed")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertIn("X-Loop-Lag-Max-Ms", response.headers)
+        
+        with patch('main.config.profiling_max_seconds', 1.0):
+            self.assertEqual(self.client.get("/admin/profile?seconds=5").status_code, 422)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import patch
+import asyncio
+import time
+
+from rate_limit import AsyncRateLimiter, estimate_tokens, parse_reset_duration, retry_delay
+
+class TestAsyncRateLimiter(unittest.TestCase):
+    """Test the requests- and tokens-per-minute limiter used for OpenAI calls."""
+    
+    def test_token_budget_limits_throughput(self):
+        # 1200 tokens per minute refills 20 tokens per second
+        limiter = AsyncRateLimiter(requests_per_minute=6000, tokens_per_minute=1200)
+        limiter.tokens.limit_to(0)
+        
+        async def run():
+            started = time.monotonic()
+            await limiter.acquire(4)
+            return time.monotonic() - started
+        
+        self.assertGreaterEqual(asyncio.run(run()), 0.19)
+    
+    def test_adapts_to_rate_limit_headers(self):
+        limiter = AsyncRateLimiter(requests_per_minute=500, tokens_per_minute=200000)
+        limiter.update_from_headers({
+            "x-ratelimit-limit-requests": "60",
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "1s",
+            "x-ratelimit-limit-tokens": "40000",
+            "x-ratelimit-remaining-tokens": "100"
+        })
+        
+        self.assertEqual(limiter.requests.capacity, 60)
+        self.assertEqual(limiter.tokens.capacity, 40000)
+        self.assertGreater(limiter.requests.try_acquire(), 0.5)
+        self.assertGreater(limiter.tokens.try_acquire(200), 0)
+    
+    def test_usage_correction_refunds_overestimate(self):
+        limiter = AsyncRateLimiter(requests_per_minute=60, tokens_per_minute=1000)
+        asyncio.run(limiter.acquire(1000))
+        limiter.record_usage(estimated=1000, actual=200)
+        self.assertEqual(limiter.tokens.try_acquire(700), 0.0)
+
+class TestRetryHelpers(unittest.TestCase):
+    """Test token estimation and backoff helpers."""
+    
+    def test_estimate_tokens_scales_with_prompt(self):
+        short = estimate_tokens([{"role": "user", "content": "Hi"}], completion_tokens=0)
+        long = estimate_tokens([{"role": "user", "content": "word " * 400}], completion_tokens=0)
+        self.assertLess(short, 10)
+        self.assertEqual(long, 504)
+    
+    def test_parse_reset_duration(self):
+        self.assertEqual(parse_reset_duration("1s"), 1.0)
+        self.assertEqual(parse_reset_duration("6m0s"), 360.0)
+        self.assertAlmostEqual(parse_reset_duration("20ms"), 0.02)
+        self.assertIsNone(parse_reset_duration(""))
+    
+    def test_retry_delay_prefers_server_hint_and_caps_backoff(self):
+        self.assertEqual(retry_delay(0, 1.0, 60.0, retry_after=5.0), 5.0)
+        self.assertEqual(retry_delay(0, 1.0, 60.0, retry_after=300.0), 60.0)
+        with patch("rate_limit.random.uniform", side_effect=lambda low, high: high):
+            self.assertEqual(retry_delay(3, 1.0, 60.0), 8.0)
+            self.assertEqual(retry_delay(10, 1.0, 60.0), 60.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import asyncio
+
+from scheduler import WorkflowScheduler, QueueFullError
+
+class TestWorkflowScheduler(unittest.TestCase):
+    """Test workflow admission, fair queuing and backpressure."""
+    
+    def test_dispatches_round_robin_across_users(self):
+        started = []
+        changes = []
+        
+        async def scenario():
+            release = asyncio.Event()
+            scheduler = WorkflowScheduler(max_concurrent=1, on_queue_change=changes.append)
+            
+            def job(workflow_id):
+                async def run():
+                    started.append(workflow_id)
+                    await release.wait()
+                return run
+            
+            self.assertEqual(scheduler.submit("a1", "alice", job("a1")), 0)
+            for workflow_id, user_id in [("a2", "alice"), ("a3", "alice"), ("b1", "bob")]:
+                scheduler.submit(workflow_id, user_id, job(workflow_id))
+            
+            self.assertEqual(scheduler.positions(), {"a2": 1, "b1": 2, "a3": 3})
+            release.set()
+            while scheduler.running or scheduler.queued:
+                await asyncio.sleep(0)
+        
+        asyncio.run(scenario())
+        
+        self.assertEqual(started, ["a1", "a2", "b1", "a3"])
+        # After a2 is dispatched, b1 and a3 each move up one place
+        self.assertIn({"b1": 1, "a3": 2}, changes)
+    
+    def test_rejects_when_queues_are_full(self):
+        async def scenario():
+            blocker = asyncio.Event()
+            scheduler = WorkflowScheduler(max_concurrent=1, max_queued=3, max_queued_per_user=2)
+            scheduler.submit("running", "alice", blocker.wait)
+            scheduler.submit("a1", "alice", blocker.wait)
+            scheduler.submit("a2", "alice", blocker.wait)
+            
+            with self.assertRaises(QueueFullError) as ctx:
+                scheduler.submit("a3", "alice", blocker.wait)
+            self.assertGreaterEqual(ctx.exception.retry_after, 1)
+            
+            scheduler.submit("b1", "bob", blocker.wait)
+            with self.assertRaises(QueueFullError):
+                scheduler.submit("c1", "carol", blocker.wait)
+            
+            await scheduler.shutdown()
+        
+        asyncio.run(scenario())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+from unittest.mock import patch
+import asyncio
+import os
+import tempfile
+
+from tools.story_index import StoryIndex
+
+def story(title, response="Thanks for the feedback!"):
+    return {"user_story": {"title": title}, "pm_response": response}
+
+class TestStoryIndex(unittest.TestCase):
+    """Test the persistent index of past stories."""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "stories.db")
+        self.index = StoryIndex(self.path)
+        self.index.add({"key": "UX-1", "summary": "CSV export fails", "description": "Export to CSV errors out"},
+                       story("Reliable CSV export", "Thanks for reporting UX-1"))
+        self.index.add({"key": "UX-2", "summary": "Dashboard loads slowly", "description": "Charts take ages"},
+                       story("Faster dashboard"))
+        self.index.add({"key": "UX-3", "summary": "Dark mode", "description": "Dashboard too bright at night"},
+                       story("Dark mode"))
+    
+    def tearDown(self):
+        self.index.close()
+        self.tmpdir.cleanup()
+    
+    def test_search_ranks_most_similar_first(self):
+        matches = self.index.search("Dashboard is slow", "Charts load slowly", k=2)
+        
+        self.assertEqual([match["ticket_id"] for match in matches], ["UX-2", "UX-3"])
+        self.assertEqual(matches[0]["user_story"], {"title": "Faster dashboard"})
+        self.assertGreater(matches[0]["score"], matches[1]["score"])
+    
+    def test_search_without_terms_returns_nothing(self):
+        self.assertEqual(self.index.search("the", "and it"), [])
+    
+    def test_add_replaces_existing_ticket(self):
+        self.index.add({"key": "UX-2", "summary": "Login times out", "description": ""}, story("Longer sessions"))
+        
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.search("dashboard charts", k=5)[0]["ticket_id"], "UX-3")
+        self.assertEqual(self.index.search("login")[0]["user_story"], {"title": "Longer sessions"})
+    
+    def test_add_many_indexes_every_entry(self):
+        self.index.add_many([
+            ({"key": "UX-2", "summary": "Login times out", "description": ""}, story("Longer sessions")),
+            ({"key": "UX-4", "summary": "Invoice PDF is blank", "description": ""}, story("Fix invoice PDFs"))
+        ])
+        self.index.add_many([])
+        
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.index.search("login")[0]["ticket_id"], "UX-2")
+        self.assertEqual(self.index.search("invoice pdf")[0]["user_story"], {"title": "Fix invoice PDFs"})
+    
+    def test_index_persists_across_connections(self):
+        self.index.close()
+        self.index = StoryIndex(self.path)
+        
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.search("csv")[0]["ticket_id"], "UX-1")
+    
+    def test_find_reusable_exact_and_near_matches(self):
+        exact = self.index.find_reusable(
+            {"key": "UX-9", "summary": "CSV export fails", "description": "Export to CSV errors out"}
+        )
+        near = self.index.find_reusable(
+            {"key": "UX-9", "summary": "CSV export fails", "description": "Export to CSV errors out!!"}, threshold=0.9
+        )
+        different = self.index.find_reusable(
+            {"key": "UX-9", "summary": "CSV export fails", "description": "Only on Safari"}, threshold=0.9
+        )
+        exact_only = self.index.find_reusable(
+            {"key": "UX-9", "summary": "csv export fails", "description": "Export to CSV errors out"}, threshold=1.1
+        )
+        
+        self.assertEqual(exact["ticket_id"], "UX-1")
+        self.assertEqual(exact["similarity"], 1.0)
+        self.assertEqual(near["ticket_id"], "UX-1")
+        self.assertIsNone(different)
+        self.assertIsNone(exact_only)
+
+class TestStoryReuse(unittest.TestCase):
+    """Test that the agent reuses indexed stories instead of calling the LLM."""
+    
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index = StoryIndex(os.path.join(self.tmpdir.name, "stories.db"))
+    
+    def tearDown(self):
+        self.index.close()
+        self.tmpdir.cleanup()
+    
+    @patch('agent.get_jira_feedback')
+    def test_indexed_story_is_reused_and_new_ones_indexed(self, mock_get_feedback):
+        from agent import JiraFeedbackAgent
+        
+        self.index.add({"key": "UX-1", "summary": "CSV export fails", "description": ""},
+                       story("Reliable CSV export", "Thanks for reporting UX-1"))
+        mock_get_feedback.return_value = [
+            {"key": "UX-7", "summary": "CSV export fails", "description": ""},
+            {"key": "UX-8", "summary": "Dark mode please", "description": ""}
+        ]
+        agent = JiraFeedbackAgent()
+        
+        async def fake_story(summary, description):
+            return {"title": summary}
+        
+        async def fake_response(ticket_id, summary, description=""):
+            return f"Thanks for {ticket_id}"
+        
+        with patch('agent.get_story_index', return_value=self.index), \
+             patch.object(agent, "_create_user_story", side_effect=fake_story) as create_story, \
+             patch.object(agent, "_suggest_pm_response", side_effect=fake_response):
+            results = asyncio.run(agent.analyze_feedback("project = TEST"))
+        
+        self.assertEqual(create_story.await_count, 1)
+        self.assertEqual(results[0].user_story, {"title": "Reliable CSV export"})
+        self.assertEqual(results[0].pm_response, "Thanks for reporting UX-7")
+        self.assertEqual(results[0].duplicate_of, "UX-1")
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.search("dark mode")[0]["ticket_id"], "UX-8")
+
+if __name__ == "__main__":
+    unittest.main()
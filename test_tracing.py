@@ -0,0 +1,166 @@
+import unittest
+from unittest.mock import patch, MagicMock, AsyncMock
+import asyncio
+import io
+import json
+from contextlib import redirect_stdout
+
+from structlog.contextvars import get_contextvars
+
+import tracing
+from tracing import InMemorySpanExporter, NOOP_SPAN, current_span, start_span
+from llm_cache import completion_cache
+from rate_limit import TokenBucket
+from tools.jira_tools import JiraClient
+from test_jira_tools import FakeJira
+
+class TracingTestCase(unittest.TestCase):
+    """Install an in-memory exporter for the duration of each test."""
+    
+    def setUp(self):
+        self.exporter = InMemorySpanExporter()
+        tracing.set_exporter(self.exporter)
+    
+    def tearDown(self):
+        tracing.set_exporter(None)
+
+class TestSpans(TracingTestCase):
+    """Test span nesting, log context and error status."""
+    
+    def test_nested_spans_share_trace_and_bind_log_context(self):
+        with start_span("outer", workflow_id="wf-1") as outer:
+            with start_span("inner") as inner:
+                self.assertIs(current_span(), inner)
+                self.assertEqual(get_contextvars()["span_id"], inner.span_id)
+            self.assertEqual(get_contextvars()["span_id"], outer.span_id)
+        
+        self.assertNotIn("trace_id", get_contextvars())
+        self.assertEqual([span.name for span in self.exporter.spans], ["inner", "outer"])
+        self.assertEqual(inner.trace_id, outer.trace_id)
+        self.assertEqual(inner.parent_id, outer.span_id)
+        self.assertIsNone(outer.parent_id)
+        self.assertEqual(outer.attributes, {"workflow_id": "wf-1"})
+        self.assertGreaterEqual(outer.duration, inner.duration)
+    
+    def test_exception_marks_span_failed(self):
+        with self.assertRaises(ValueError):
+            with start_span("failing"):
+                raise ValueError("boom")
+        
+        span = self.exporter.find("failing")[0]
+        self.assertEqual(span.status, "error")
+        self.assertEqual(span.attributes["error.type"], "ValueError")
+    
+    def test_tasks_inherit_the_active_span(self):
+        async def child():
+            with start_span("child") as span:
+                return span
+        
+        async def run():
+            with start_span("parent") as parent:
+                children = await asyncio.gather(child(), child())
+            return parent, children
+        
+        parent, children = asyncio.run(run())
+        self.assertEqual({span.parent_id for span in children}, {parent.span_id})
+    
+    def test_log_exporter_writes_each_span_own_ids(self):
+        tracing.set_exporter(tracing.LogSpanExporter())
+        output = io.StringIO()
+        with redirect_stdout(output):
+            with start_span("workflow") as root:
+                with start_span("ticket") as child:
+                    pass
+        
+        lines = {line["span"]: line for line in map(json.loads, output.getvalue().splitlines())}
+        self.assertEqual(lines["ticket"]["span_id"], child.span_id)
+        self.assertEqual(lines["ticket"]["parent_id"], root.span_id)
+        self.assertEqual(lines["workflow"]["span_id"], root.span_id)
+        self.assertEqual(lines["workflow"]["trace_id"], root.trace_id)
+        self.assertEqual(lines["ticket"]["trace_id"], root.trace_id)
+    
+    def test_disabled_tracing_is_a_no_op(self):
+        tracing.set_exporter(None)
+        with start_span("ignored") as span:
+            span.set_attribute("key", "value")
+            self.assertNotIn("trace_id", get_contextvars())
+        
+        self.assertIs(span, NOOP_SPAN)
+        self.assertEqual(self.exporter.spans, [])
+
+class TestInstrumentation(TracingTestCase):
+    """Test the spans emitted by the agent and the JIRA client."""
+    
+    def setUp(self):
+        super().setUp()
+        completion_cache.clear()
+    
+    @patch('agent.asyncio.sleep', new_callable=AsyncMock)
+    @patch('agent.get_jira_feedback')
+    @patch('agent.get_openai_client')
+    def test_analysis_trace_nests_tickets_and_llm_calls(self, mock_get_client, mock_get_feedback, mock_sleep):
+        from agent import JiraFeedbackAgent
+        
+        mock_get_feedback.return_value = [{"key": "UX-1", "summary": "Export hidden", "description": ""}]
+        story = MagicMock(choices=[MagicMock(message=MagicMock(
+            content='{"title": "Find export", "description": "d", "acceptance_criteria": ["a"]}'
+        ))], usage=MagicMock(prompt_tokens=80, completion_tokens=20, total_tokens=100))
+        response = MagicMock(choices=[MagicMock(message=MagicMock(content="Thanks!"))], usage=None)
+        mock_get_client.return_value.chat.completions.create = AsyncMock(side_effect=[story, response])
+        
+        asyncio.run(JiraFeedbackAgent().analyze_feedback("project = UX"))
+        
+        root = self.exporter.find("analyze_feedback")[0]
+        ticket = self.exporter.find("ticket")[0]
+        llm_spans = self.exporter.find("llm.chat_completion")
+        self.assertEqual(ticket.parent_id, root.span_id)
+        self.assertEqual(ticket.attributes["ticket_id"], "UX-1")
+        self.assertFalse(ticket.attributes["user_story.cache_hit"])
+        self.assertEqual([span.attributes["stage"] for span in llm_spans], ["llm_user_story", "llm_pm_response"])
+        self.assertEqual({span.parent_id for span in llm_spans}, {ticket.span_id})
+        self.assertEqual({span.trace_id for span in self.exporter.spans}, {root.trace_id})
+        self.assertEqual(llm_spans[0].attributes["prompt_tokens"], 80)
+        self.assertEqual(llm_spans[0].attributes["completion_tokens"], 20)
+    
+    @patch('agent.asyncio.sleep', new_callable=AsyncMock)
+    @patch('agent.get_jira_feedback')
+    @patch('agent.get_openai_client')
+    def test_stream_trace_nests_tickets(self, mock_get_client, mock_get_feedback, mock_sleep):
+        from agent import JiraFeedbackAgent
+        
+        mock_get_feedback.return_value = [{"key": "UX-1", "summary": "Export hidden", "description": ""}]
+        story = MagicMock(choices=[MagicMock(message=MagicMock(
+            content='{"title": "Find export", "description": "d", "acceptance_criteria": ["a"]}'
+        ))], usage=None)
+        response = MagicMock(choices=[MagicMock(message=MagicMock(content="Thanks!"))], usage=None)
+        mock_get_client.return_value.chat.completions.create = AsyncMock(side_effect=[story, response])
+        
+        async def consume():
+            return [result async for result in JiraFeedbackAgent().analyze_feedback_stream("project = UX")]
+        
+        self.assertEqual(len(asyncio.run(consume())), 1)
+        
+        root = self.exporter.find("analyze_feedback_stream")[0]
+        ticket = self.exporter.find("ticket")[0]
+        self.assertIsNone(root.parent_id)
+        self.assertEqual(root.attributes["result_count"], 1)
+        self.assertEqual(ticket.parent_id, root.span_id)
+        self.assertEqual({span.trace_id for span in self.exporter.spans}, {root.trace_id})
+    
+    def test_page_spans_from_worker_threads_join_the_trace(self):
+        client = JiraClient()
+        client.use_mock = False
+        client.client = FakeJira(total=120)
+        client.config = client.config.model_copy(update={"page_size": 50, "fetch_concurrency": 3})
+        client.rate_limiter = TokenBucket(rate=1000)
+        
+        client.get_feedback_tickets("project = UX", max_results=120)
+        
+        search = self.exporter.find("jira.search")[0]
+        pages = self.exporter.find("jira.search_page")
+        self.assertEqual(search.attributes["issue_count"], 120)
+        self.assertEqual(len(pages), 3)
+        self.assertEqual({span.parent_id for span in pages}, {search.span_id})
+
+if __name__ == "__main__":
+    unittest.main()
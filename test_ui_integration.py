@@ -1,9 +1,18 @@
+import asyncio
 import unittest
+from unittest.mock import patch, AsyncMock, MagicMock
 from fastapi.testclient import TestClient
 import json
+import os
+import tempfile
+import threading
 import time
 
+import main
 from main import app
+from workflow_store import SQLiteWorkflowStore, new_workflow_record
+from scheduler import QueueFullError
+from tools.story_index import StoryIndex
 
 class TestUIIntegration(unittest.TestCase):
     """Test the integration of the UI with the backend workflow."""
@@ -80,5 +89,365 @@ class TestUIIntegration(unittest.TestCase):
         self.assertIn("acceptance_criteria", user_story)
         self.assertTrue(len(user_story["acceptance_criteria"]) > 0)
 
+class TestHeadlessWorkflow(unittest.TestCase):
+    """Test that pacing="none" removes the artificial UI delays."""
+    
+    STORY_TEXT = json.dumps({
+        "title": "As a user, I want to find the export button quickly",
+        "description": "Exporting is a frequent task.",
+        "acceptance_criteria": ["Export is in the toolbar", "Export has a label"]
+    })
+    
+    def setUp(self):
+        # Entering the client keeps its event loop alive for scheduled workflows
+        self.client = TestClient(app).__enter__()
+    
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+    
+    @patch('agent.get_openai_client')
+    def test_headless_workflow_completes_without_pacing(self, mock_get_client):
+        mock_get_client.return_value.chat.completions.create = AsyncMock(return_value=MagicMock(
+            choices=[MagicMock(message=MagicMock(content=self.STORY_TEXT))]
+        ))
+        
+        started = time.time()
+        response = self.client.post(
+            "/workflow/start",
+            json={
+                "jql": "project = TEST",
+                "pacing": "none",
+                "mock_feedback_items": [
+                    {"key": "UX-901", "summary": "Export button is hidden", "description": "Took minutes to find"},
+                    {"key": "UX-902", "summary": "Dashboard is slow", "description": "Loads in 10 seconds"}
+                ]
+            }
+        )
+        workflow_id = response.json()["workflow_id"]
+        status = self.client.get(f"/workflow/{workflow_id}/status").json()
+        while not status["is_complete"] and time.time() - started < 2:
+            time.sleep(0.01)
+            status = self.client.get(f"/workflow/{workflow_id}/status").json()
+        
+        self.assertTrue(status["is_complete"])
+        self.assertEqual([r["ticket_id"] for r in status["results"]], ["UX-901", "UX-902"])
+        self.assertLess(time.time() - started, 2)
+    
+    def test_unknown_pacing_is_rejected(self):
+        response = self.client.post("/workflow/start", json={"jql": "project = TEST", "pacing": "slow"})
+        self.assertEqual(response.status_code, 422)
+
+class TestAnalyzeFeedbackStream(unittest.TestCase):
+    """Test the NDJSON streaming analysis endpoint."""
+    
+    def setUp(self):
+        self.client = TestClient(app)
+    
+    @patch('agent.get_jira_feedback')
+    def test_results_are_streamed_as_ndjson(self, mock_get_feedback):
+        from agent import JiraFeedbackAgent, FeedbackAnalysisResult
+        
+        mock_get_feedback.return_value = [
+            {"key": "UX-1", "summary": "Slow dashboard", "description": ""},
+            {"key": "UX-2", "summary": "Hidden export", "description": ""}
+        ]
+        
+        async def fake_process(self, index, total, ticket):
+            return FeedbackAnalysisResult(ticket_id=ticket["key"], user_story={"title": ticket["summary"]},
+                                          pm_response="Thanks!")
+        
+        with patch.object(JiraFeedbackAgent, "_process_ticket", fake_process):
+            response = self.client.post("/analyze-feedback/stream", json={"jql": "project = UX"})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("application/x-ndjson"))
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(sorted(line["ticket_id"] for line in lines), ["UX-1", "UX-2"])
+        self.assertEqual(lines[0]["pm_response"], "Thanks!")
+
+class TestWorkflowEvents(unittest.TestCase):
+    """Test the Server-Sent Events workflow stream."""
+    
+    def setUp(self):
+        self.client = TestClient(app)
+        self.workflow_id = "test-events"
+        main.workflow_store.create(self.workflow_id, new_workflow_record({}))
+        for i in range(3):
+            main.workflow_store.append_step(
+                self.workflow_id,
+                {"title": f"Step {i}", "content": "", "type": "info", "timestamp": time.time()}
+            )
+        main.workflow_store.update(
+            self.workflow_id,
+            is_complete=True,
+            current_status="Analysis complete",
+            results=[{"ticket_id": "UX-101"}],
+            tickets=[{"key": "UX-101"}]
+        )
+    
+    def tearDown(self):
+        main.workflow_store.delete(self.workflow_id)
+    
+    def read_events(self, url, headers=None):
+        """Return (event, id, data) tuples from an event stream."""
+        events = []
+        with self.client.stream("GET", url, headers=headers or {}) as response:
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+            for block in response.read().decode().split("\n\n"):
+                fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+                if fields:
+                    events.append((fields["event"], fields.get("id"), json.loads(fields["data"])))
+        return events
+    
+    def test_stream_sends_steps_status_and_completion(self):
+        events = self.read_events(f"/workflow/{self.workflow_id}/events")
+        
+        self.assertEqual([e[0] for e in events], ["step", "step", "step", "status", "complete"])
+        self.assertEqual([e[1] for e in events[:3]], ["0", "1", "2"])
+        self.assertEqual(events[1][2]["title"], "Step 1")
+        self.assertEqual(events[-1][2]["results"], [{"ticket_id": "UX-101"}])
+    
+    def test_stream_resumes_from_cursor(self):
+        events = self.read_events(f"/workflow/{self.workflow_id}/events?since=1")
+        self.assertEqual([e[1] for e in events if e[0] == "step"], ["1", "2"])
+        
+        events = self.read_events(f"/workflow/{self.workflow_id}/events", headers={"Last-Event-ID": "1"})
+        self.assertEqual([e[1] for e in events if e[0] == "step"], ["2"])
+    
+    def test_stream_resends_step_updated_in_place(self):
+        workflow_id = "test-events-live"
+        main.workflow_store.create(workflow_id, new_workflow_record({}, current_status="Processing"))
+        asyncio.run(main.add_workflow_step(workflow_id, title="Tool", content="Running...", type="info"))
+        self.addCleanup(main.workflow_store.delete, workflow_id)
+        
+        async def read_stream():
+            stream = main.workflow_event_stream(workflow_id, 0)
+            messages = [await anext(stream), await anext(stream)]
+            await main.update_last_workflow_step(workflow_id, content="Done")
+            messages.append(await asyncio.wait_for(anext(stream), timeout=5))
+            await stream.aclose()
+            return messages
+        
+        step, status, resent = asyncio.run(read_stream())
+        self.assertIn("event: status", status)
+        self.assertIn("id: 0\n", resent)
+        self.assertEqual(json.loads(resent.split("data: ", 1)[1])["content"], "Done")
+    
+    def test_unknown_workflow_returns_404(self):
+        response = self.client.get("/workflow/missing/events")
+        self.assertEqual(response.status_code, 404)
+
+class TestWorkflowStatusDelta(unittest.TestCase):
+    """Test step cursors and conditional requests on the status endpoint."""
+    
+    def setUp(self):
+        self.client = TestClient(app)
+        self.workflow_id = "test-delta"
+        main.workflow_store.create(self.workflow_id, new_workflow_record({}, current_status="Processing"))
+        self.url = f"/workflow/{self.workflow_id}/status"
+    
+    def tearDown(self):
+        main.workflow_store.delete(self.workflow_id)
+    
+    def test_unchanged_poll_returns_304(self):
+        asyncio.run(main.add_workflow_step(self.workflow_id, title="Start", content="", type="info"))
+        first = self.client.get(self.url)
+        etag = first.headers["ETag"]
+        
+        unchanged = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(unchanged.status_code, 304)
+        
+        asyncio.run(main.add_workflow_step(self.workflow_id, title="Next", content="", type="info"))
+        changed = self.client.get(self.url, headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers["ETag"], etag)
+    
+    def test_since_returns_only_new_steps_and_changed_collections(self):
+        asyncio.run(main.update_workflow(self.workflow_id, tickets=[{"key": "UX-101"}]))
+        asyncio.run(main.add_workflow_step(self.workflow_id, title="Step 0", content="", type="info"))
+        first = self.client.get(self.url, params={"since": 0})
+        self.assertEqual(first.json()["tickets"], [{"key": "UX-101"}])
+        
+        asyncio.run(main.add_workflow_step(self.workflow_id, title="Step 1", content="", type="info"))
+        asyncio.run(main.update_workflow(self.workflow_id, results=[{"ticket_id": "UX-101"}], is_complete=True))
+        delta = self.client.get(self.url, params={"since": 1}, headers={"If-None-Match": first.headers["ETag"]})
+        data = delta.json()
+        
+        self.assertEqual(data["step_offset"], 1)
+        self.assertEqual([step["title"] for step in data["steps"]], ["Step 1"])
+        self.assertIsNone(data["tickets"])
+        self.assertEqual(data["results"], [{"ticket_id": "UX-101"}])
+        self.assertTrue(data["is_complete"])
+    
+    def test_since_resends_step_updated_in_place(self):
+        asyncio.run(main.add_workflow_step(self.workflow_id, title="Step 0", content="", type="info"))
+        asyncio.run(main.add_workflow_step(self.workflow_id, title="Step 1", content="Working...", type="info"))
+        first = self.client.get(self.url, params={"since": 0})
+        
+        asyncio.run(main.update_last_workflow_step(self.workflow_id, content="Done"))
+        delta = self.client.get(self.url, params={"since": 2}, headers={"If-None-Match": first.headers["ETag"]})
+        data = delta.json()
+        
+        self.assertEqual(delta.status_code, 200)
+        self.assertEqual(data["step_offset"], 1)
+        self.assertEqual([step["content"] for step in data["steps"]], ["Done"])
+        
+        unchanged = self.client.get(self.url, params={"since": 2}, headers={"If-None-Match": delta.headers["ETag"]})
+        self.assertEqual(unchanged.status_code, 304)
+        
+        asyncio.run(main.add_workflow_step(self.workflow_id, title="Step 2", content="", type="info"))
+        later = self.client.get(self.url, params={"since": 2}, headers={"If-None-Match": delta.headers["ETag"]})
+        self.assertEqual(later.json()["step_offset"], 2)
+    
+    def test_full_status_without_cursor(self):
+        asyncio.run(main.add_workflow_step(self.workflow_id, title="Step 0", content="", type="info"))
+        data = self.client.get(self.url).json()
+        
+        self.assertEqual(data["step_offset"], 0)
+        self.assertEqual(len(data["steps"]), 1)
+        self.assertEqual(data["results"], [])
+        self.assertEqual(data["tickets"], [])
+
+class TestSQLiteWorkflowStoreAccess(unittest.TestCase):
+    """Test that SQLite workflow store calls stay off the event loop."""
+    
+    def setUp(self):
+        self.client = TestClient(app)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = SQLiteWorkflowStore(os.path.join(self.tmpdir.name, "workflows.db"))
+        patcher = patch.object(main, "workflow_store", self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+    
+    def test_updates_run_on_the_store_thread_in_order(self):
+        threads = []
+        append_step = self.store.append_step
+        
+        def recording_append_step(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return append_step(*args, **kwargs)
+        
+        async def run():
+            await main.store_call(self.store.create, "wf-sqlite", new_workflow_record({}))
+            await main.add_workflow_step("wf-sqlite", title="Start", content="", type="info")
+            # A status callback's write lands before the next awaited one
+            main.schedule_workflow_update("wf-sqlite", current_status="Analyzing feedback...")
+            await main.update_workflow("wf-sqlite", is_complete=True, current_status="Analysis complete")
+            return threading.current_thread()
+        
+        with patch.object(self.store, "append_step", side_effect=recording_append_step):
+            loop_thread = asyncio.run(run())
+        
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], loop_thread)
+        data = self.client.get("/workflow/wf-sqlite/status").json()
+        self.assertEqual(data["current_status"], "Analysis complete")
+        self.assertEqual([step["title"] for step in data["steps"]], ["Start"])
+
+class TestAnalyzeFeedback(unittest.TestCase):
+    """Test the synchronous and job-based analysis endpoint."""
+    
+    TICKETS = [
+        {"key": "UX-1", "summary": "Slow dashboard", "description": ""},
+        {"key": "UX-2", "summary": "Hidden export", "description": ""}
+    ]
+    
+    def setUp(self):
+        # Entering the client keeps its event loop alive for scheduled jobs
+        self.client = TestClient(app).__enter__()
+    
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+    
+    @staticmethod
+    async def fake_process(agent, index, total, ticket):
+        from agent import FeedbackAnalysisResult
+        return FeedbackAnalysisResult(ticket_id=ticket["key"], user_story={"title": ticket["summary"]},
+                                      pm_response="Thanks!")
+    
+    @patch('agent.get_jira_feedback')
+    def test_sync_request_returns_results(self, mock_get_feedback):
+        from agent import JiraFeedbackAgent
+        
+        mock_get_feedback.return_value = self.TICKETS
+        with patch.object(JiraFeedbackAgent, "_process_ticket", self.fake_process):
+            response = self.client.post("/analyze-feedback", json={"jql": "project = UX"})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["ticket_id"] for r in response.json()["results"]], ["UX-1", "UX-2"])
+    
+    @patch('agent.get_jira_feedback')
+    def test_async_request_returns_job_url(self, mock_get_feedback):
+        from agent import JiraFeedbackAgent
+        
+        mock_get_feedback.return_value = self.TICKETS
+        with patch.object(JiraFeedbackAgent, "_process_ticket", self.fake_process):
+            response = self.client.post("/analyze-feedback?async=true", json={"jql": "project = UX"})
+            self.assertEqual(response.status_code, 202)
+            status_url = response.json()["status_url"]
+            self.assertEqual(response.headers["Location"], status_url)
+            
+            started = time.time()
+            status = self.client.get(status_url).json()
+            while not status["is_complete"] and time.time() - started < 2:
+                time.sleep(0.01)
+                status = self.client.get(status_url).json()
+        
+        self.assertEqual(status["current_status"], "Analysis complete")
+        self.assertEqual([r["ticket_id"] for r in status["results"]], ["UX-1", "UX-2"])
+    
+    def test_unknown_job_returns_404(self):
+        self.assertEqual(self.client.get("/analyze-feedback/missing").status_code, 404)
+
+class TestWorkflowAdmission(unittest.TestCase):
+    """Test backpressure on /workflow/start."""
+    
+    def setUp(self):
+        self.client = TestClient(app)
+    
+    def test_full_queue_returns_429_with_retry_after(self):
+        with patch.object(main.workflow_scheduler, "submit", side_effect=QueueFullError("Workflow queue is full", 42)):
+            response = self.client.post("/workflow/start", json={"jql": "project = TEST", "user_id": "alice"})
+        
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "42")
+
+class TestSimilarStories(unittest.TestCase):
+    """Test the similar past stories endpoint."""
+    
+    def setUp(self):
+        self.client = TestClient(app)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index = StoryIndex(os.path.join(self.tmpdir.name, "stories.db"))
+    
+    def tearDown(self):
+        self.index.close()
+        self.tmpdir.cleanup()
+    
+    def test_returns_top_matches(self):
+        self.index.add({"key": "UX-1", "summary": "CSV export fails", "description": ""},
+                       {"user_story": {"title": "Reliable CSV export"}, "pm_response": "Thanks!"})
+        self.index.add({"key": "UX-2", "summary": "Dark mode", "description": ""},
+                       {"user_story": {"title": "Dark mode"}, "pm_response": "Thanks!"})
+        
+        with patch('main.get_story_index', return_value=self.index):
+            response = self.client.post("/stories/similar", json={"summary": "Export to CSV broken", "k": 3})
+        
+        self.assertEqual(response.status_code, 200)
+        matches = response.json()["matches"]
+        self.assertEqual([match["ticket_id"] for match in matches], ["UX-1"])
+        self.assertEqual(matches[0]["user_story"], {"title": "Reliable CSV export"})
+    
+    def test_disabled_index_is_unavailable(self):
+        with patch('main.get_story_index', return_value=None):
+            response = self.client.post("/stories/similar", json={"summary": "Export"})
+        
+        self.assertEqual(response.status_code, 503)
+
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,151 @@
+import unittest
+import os
+import tempfile
+import time
+
+from workflow_store import InMemoryWorkflowStore, SQLiteWorkflowStore, WorkflowStore, new_workflow_record
+
+class WorkflowStoreTests:
+    """
+    Behaviour shared by every workflow store backend.
+
+    Not a TestCase itself; each backend's TestCase mixes it in and defines
+    ``make_store(ttl, max_entries)``.
+    """
+
+    def setUp(self):
+        self.store = self.make_store()
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_steps_are_returned_from_cursor(self):
+        self.store.create("wf", new_workflow_record({"jql": "project = UX"}))
+        for i in range(3):
+            self.store.append_step("wf", {"title": f"Step {i}"})
+        self.store.update_last_step("wf", content="done")
+
+        workflow = self.store.get("wf", since=1)
+        self.assertEqual(workflow["step_count"], 3)
+        self.assertEqual([step["title"] for step in workflow["steps"]], ["Step 1", "Step 2"])
+        self.assertEqual(workflow["steps"][-1]["content"], "done")
+        self.assertEqual(workflow["request"], {"jql": "project = UX"})
+        self.assertEqual(workflow["version"], 4)
+
+    def test_steps_updated_after_version_are_returned_again(self):
+        self.store.create("wf", new_workflow_record({}))
+        for i in range(3):
+            seen_version = self.store.append_step("wf", {"title": f"Step {i}"})
+        self.store.update_last_step("wf", content="done")
+        self.store.append_step("wf", {"title": "Step 3"})
+
+        workflow = self.store.get("wf", since=3, changed_after=seen_version)
+        self.assertEqual(workflow["step_offset"], 2)
+        self.assertEqual([step["title"] for step in workflow["steps"]], ["Step 2", "Step 3"])
+        self.assertEqual(workflow["steps"][0]["content"], "done")
+
+        unchanged = self.store.get("wf", since=4, changed_after=workflow["version"])
+        self.assertEqual(unchanged["step_offset"], 4)
+        self.assertEqual(unchanged["steps"], [])
+
+    def test_clear_steps(self):
+        self.store.create("wf", new_workflow_record({}))
+        self.store.append_step("wf", {"title": "Step 0"})
+        version = self.store.clear_steps("wf")
+        self.store.append_step("wf", {"title": "Step 0 again"})
+
+        workflow = self.store.get("wf")
+        self.assertEqual(version, 2)
+        self.assertEqual(workflow["step_count"], 1)
+        self.assertEqual([step["title"] for step in workflow["steps"]], ["Step 0 again"])
+
+    def test_update_records_collection_versions(self):
+        self.store.create("wf", new_workflow_record({}))
+        self.store.update("wf", tickets=[{"key": "UX-1"}])
+        version = self.store.update("wf", results=[{"ticket_id": "UX-1"}], is_complete=True)
+
+        workflow = self.store.get("wf")
+        self.assertEqual(workflow["version"], version)
+        self.assertEqual(workflow["tickets_version"], 1)
+        self.assertEqual(workflow["results_version"], version)
+        self.assertEqual(workflow["results"], [{"ticket_id": "UX-1"}])
+        self.assertTrue(workflow["is_complete"])
+
+    def test_unknown_workflow(self):
+        self.assertIsNone(self.store.get("missing"))
+        self.assertNotIn("missing", self.store)
+        with self.assertRaises(KeyError):
+            self.store.append_step("missing", {"title": "Step"})
+
+    def test_evicts_only_expired_completed_workflows(self):
+        store = self.make_store(ttl=0.01)
+        store.create("done", new_workflow_record({}))
+        store.update("done", is_complete=True)
+        store.create("running", new_workflow_record({}))
+        time.sleep(0.02)
+
+        self.assertEqual(store.evict_expired(), ["done"])
+        self.assertNotIn("done", store)
+        self.assertIn("running", store)
+        store.close()
+
+    def test_capacity_evicts_completed_workflows_first(self):
+        store = self.make_store(max_entries=2)
+        store.create("running", new_workflow_record({}))
+        store.create("done", new_workflow_record({}))
+        store.update("done", is_complete=True)
+        store.create("new", new_workflow_record({}))
+
+        self.assertIn("running", store)
+        self.assertNotIn("done", store)
+        self.assertIn("new", store)
+        store.close()
+
+class TestWorkflowStoreInterface(unittest.TestCase):
+    """Test the abstract workflow store interface."""
+
+    def test_backends_must_implement_every_operation(self):
+        class PartialStore(WorkflowStore):
+            def get(self, workflow_id, since=0, changed_after=None):
+                return None
+
+        with self.assertRaises(TypeError):
+            PartialStore()
+
+class TestInMemoryWorkflowStore(WorkflowStoreTests, unittest.TestCase):
+    """Test the process-local workflow store."""
+
+    def make_store(self, ttl=3600.0, max_entries=1000):
+        return InMemoryWorkflowStore(ttl=ttl, max_entries=max_entries)
+
+class TestSQLiteWorkflowStore(WorkflowStoreTests, unittest.TestCase):
+    """Test the SQLite workflow store."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.paths = 0
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        self.tmpdir.cleanup()
+
+    def make_store(self, ttl=3600.0, max_entries=1000):
+        self.paths += 1
+        path = os.path.join(self.tmpdir.name, f"workflows-{self.paths}.db")
+        return SQLiteWorkflowStore(path, ttl=ttl, max_entries=max_entries)
+
+    def test_state_survives_reopen(self):
+        path = os.path.join(self.tmpdir.name, "shared.db")
+        store = SQLiteWorkflowStore(path)
+        store.create("wf", new_workflow_record({}))
+        store.append_step("wf", {"title": "Start"})
+        store.close()
+
+        reopened = SQLiteWorkflowStore(path)
+        workflow = reopened.get("wf")
+        self.assertEqual([step["title"] for step in workflow["steps"]], ["Start"])
+        reopened.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, List
+
+# Words too common in feedback to say anything about the topic
+STOP_WORDS = frozenset("""
+a about after again all also am an and any are as at be been before being but by can could did do does
+doing for from get gets had has have having how i if in into is it its just me more my no not of on
+once only or other our out over really so some still than that the their them then there these they
+this to too very was we were what when where which while who why will with would you your
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stop words and one-letter tokens removed."""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+def ticket_text(ticket: Dict[str, Any]) -> str:
+    # The summary carries most of the signal, so it counts twice
+    summary = ticket.get("summary") or ""
+    return f"{summary} {summary} {ticket.get('description') or ''}"
+
+def tfidf_vectors(documents: List[List[str]]) -> List[Dict[str, float]]:
+    """Build L2-normalized sparse TF-IDF vectors for tokenized documents."""
+    document_frequency = Counter(token for tokens in documents for token in set(tokens))
+    count = len(documents)
+    vectors = []
+    for tokens in documents:
+        weights = {
+            token: (1 + math.log(frequency)) * (math.log((1 + count) / (1 + document_frequency[token])) + 1)
+            for token, frequency in Counter(tokens).items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        vectors.append({token: weight / norm for token, weight in weights.items()})
+    return vectors
+
+def cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(token, 0.0) for token, weight in a.items())
+
+# Feedback wording that means the same thing, mapped to one term for clustering
+SYNONYMS = {
+    "slowly": "slow", "slower": "slow", "slowness": "slow", "sluggish": "slow", "laggy": "slow",
+    "lag": "slow", "lags": "slow", "lagging": "slow", "forever": "slow", "ages": "slow",
+    "loads": "load", "loading": "load", "loaded": "load",
+    "broke": "broken", "breaks": "broken", "crash": "crashes", "crashed": "crashes", "crashing": "crashes",
+    "errors": "error", "fail": "fails", "failed": "fails", "failing": "fails", "failure": "fails",
+    "exporting": "export", "exports": "export", "exported": "export",
+}
+
+# Terms naming mutually exclusive options of one kind. Summaries that pick
+# different options of a kind ("export PDF" and "export CSV") describe
+# different problems however similar the rest of the text is. Each option is a
+# set of terms after SYNONYMS.
+CONTRASTING_TERMS = [
+    # What goes wrong
+    [{"slow", "timeout", "timeouts"}, {"broken", "crashes", "error", "fails"}],
+    # File formats
+    [{"pdf"}, {"csv"}, {"xlsx", "xls", "excel"}, {"json"}, {"xml"}, {"png"}, {"jpg", "jpeg"}, {"docx", "word"}],
+    # Platforms and browsers
+    [{"ios", "iphone", "ipad"}, {"android"}, {"windows"}, {"mac", "macos"}, {"linux"}],
+    [{"chrome"}, {"firefox"}, {"safari"}, {"edge"}],
+]
+
+def concept_tokens(text: str) -> List[str]:
+    """Tokens with SYNONYMS mapped to their shared term."""
+    return [SYNONYMS.get(token, token) for token in tokenize(text)]
+
+def summaries_conflict(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """
+    Whether two tickets' summaries name different options of one kind.
+
+    "Login page slow" and "Login page broken" conflict; "Dashboard slow" and
+    "Dashboard takes forever to load" do not, and neither do summaries that
+    only differ in wording.
+    """
+    a_tokens = set(concept_tokens(a.get("summary") or ""))
+    b_tokens = set(concept_tokens(b.get("summary") or ""))
+    for options in CONTRASTING_TERMS:
+        a_options = {i for i, terms in enumerate(options) if terms & a_tokens}
+        b_options = {i for i, terms in enumerate(options) if terms & b_tokens}
+        if a_options and b_options and not a_options & b_options:
+            return True
+    return False
+
+def cluster_tickets(tickets: List[Dict[str, Any]], threshold: float = 0.5) -> List[List[int]]:
+    """
+    Group near-duplicate tickets by TF-IDF cosine similarity.
+
+    Tickets are assigned in order to the cluster whose leader (its first
+    ticket) is most similar, if that is at least ``threshold`` and their
+    summaries do not conflict (see summaries_conflict); otherwise they start
+    a new cluster. Synonyms count as the same word.
+    An inverted index limits comparisons to leaders sharing a token.
+    Returns clusters as lists of ticket indices, leader first.
+    """
+    vectors = tfidf_vectors([concept_tokens(ticket_text(ticket)) for ticket in tickets])
+    clusters: List[List[int]] = []
+    leaders_by_token: Dict[str, List[int]] = defaultdict(list)
+
+    for index, vector in enumerate(vectors):
+        candidates = {cluster for token in vector for cluster in leaders_by_token.get(token, ())}
+        best_cluster, best_score = None, threshold
+        for cluster in sorted(candidates):
+            leader = clusters[cluster][0]
+            score = cosine(vector, vectors[leader])
+            if score >= best_score and not summaries_conflict(tickets[index], tickets[leader]):
+                best_cluster, best_score = cluster, score
+
+        if best_cluster is None:
+            for token in vector:
+                leaders_by_token[token].append(len(clusters))
+            clusters.append([index])
+        else:
+            clusters[best_cluster].append(index)
+
+    return clusters
+
+def personalize_response(response: str, leader: Dict[str, Any], member: Dict[str, Any]) -> str:
+    """Adapt the leader ticket's PM response to a duplicate ticket without another LLM call."""
+    return response.replace(leader["key"], member["key"])
@@ -1,11 +1,23 @@
-import time
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone, tzinfo
 from typing import List, Dict, Any, Optional
 import os
-from jira import JIRA
+from zoneinfo import ZoneInfo
+from jira import JIRA, JIRAError
 from pydantic import BaseModel
 
 from config import config
-from observability import logger, TICKETS_PROCESSED
+from observability import logger, JIRA_ISSUES_FETCHED, STAGE_DURATION, Timer, record_error
+from rate_limit import TokenBucket, parse_retry_after
+from tracing import start_span
+
+# Status codes that mean "slow down and try again"
+RETRYABLE_STATUS_CODES = (429, 503)
+
+# Only the fields copied into JiraTicket are requested from JIRA
+TICKET_FIELDS = ["summary", "description", "reporter", "created", "updated", "labels"]
 
 class JiraTicket(BaseModel):
     id: str
@@ -14,8 +26,58 @@ class JiraTicket(BaseModel):
     description: Optional[str] = None
     reporter: Optional[str] = None
     created: Optional[str] = None
+    updated: Optional[str] = None
     labels: List[str] = []
 
+# JIRA timestamps look like 2023-11-01T10:30:00.000+0000
+JIRA_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
+
+# The furthest any timezone is behind UTC plus DST slack; covers every profile timezone
+UNKNOWN_TIMEZONE_MARGIN = timedelta(hours=14)
+
+def ticket_from_issue_json(issue: Dict[str, Any]) -> JiraTicket:
+    """Map a raw JIRA search result issue straight into a JiraTicket."""
+    fields = issue.get("fields") or {}
+    reporter = fields.get("reporter") or {}
+    return JiraTicket(
+        id=str(issue["id"]),
+        key=issue["key"],
+        summary=fields.get("summary") or "",
+        description=fields.get("description") or "",
+        reporter=reporter.get("displayName"),
+        created=fields.get("created"),
+        updated=fields.get("updated"),
+        labels=fields.get("labels") or []
+    )
+
+def parse_jira_timestamp(value: str) -> datetime:
+    """Parse a JIRA timestamp into an aware datetime."""
+    return datetime.strptime(value, JIRA_TIMESTAMP_FORMAT)
+
+def build_updated_since_jql(jql: str, updated_since: str, user_timezone: Optional[tzinfo] = None) -> str:
+    """
+    Restrict a JQL query to issues updated at or after updated_since.
+    
+    Results are ordered by ``updated`` ascending so a truncated result set
+    never skips older changes. JQL only has minute precision, so the boundary
+    minute is included; callers de-duplicate with content hashes.
+    
+    JIRA reads JQL dates in the searching user's profile timezone, so the
+    timestamp is written in ``user_timezone``. When that is unknown, the
+    filter starts UNKNOWN_TIMEZONE_MARGIN earlier so no timezone can make it
+    start too late.
+    """
+    since = parse_jira_timestamp(updated_since)
+    if user_timezone is None:
+        since = since.astimezone(timezone.utc) - UNKNOWN_TIMEZONE_MARGIN
+    else:
+        since = since.astimezone(user_timezone)
+    # Drop any existing ORDER BY clause; incremental fetches need a stable order
+    base_jql = re.split(r"\s+order\s+by\s+", jql, flags=re.IGNORECASE)[0].strip()
+    condition = f'updated >= "{since.strftime("%Y/%m/%d %H:%M")}"'
+    filtered = f"({base_jql}) AND {condition}" if base_jql else condition
+    return f"{filtered} ORDER BY updated ASC"
+
 class JiraClient:
     """Client for interacting with JIRA API."""
     
@@ -23,12 +85,15 @@ class JiraClient:
         self.config = config.jira
         self.client = None
         self.use_mock = not bool(self.config.api_token)
+        self.rate_limiter = TokenBucket(self.config.requests_per_second)
         
         if not self.use_mock:
             try:
+                # Retries are handled in _search_page so Retry-After is shared by all page fetchers
                 self.client = JIRA(
                     server=self.config.base_url,
-                    basic_auth=(self.config.user_email, self.config.api_token)
+                    basic_auth=(self.config.user_email, self.config.api_token),
+                    max_retries=0
                 )
                 logger.info("JIRA client initialized", use_mock=False)
             except Exception as e:
@@ -37,54 +102,173 @@ class JiraClient:
         
         if self.use_mock:
             logger.info("Using mock JIRA client", use_mock=True)
+        
+        self._timezone_checked = False
+        self._timezone: Optional[tzinfo] = None
     
-    def get_feedback_tickets(self, jql: str, max_results: int = 50) -> List[JiraTicket]:
-        """Fetch feedback tickets from JIRA based on JQL query."""
-        logger.info("Fetching JIRA tickets", jql=jql, max_results=max_results, use_mock=self.use_mock)
+    def _user_timezone(self) -> Optional[tzinfo]:
+        """Return the JIRA user's profile timezone, looked up once; None if unavailable."""
+        if not self._timezone_checked:
+            self._timezone_checked = True
+            try:
+                self._timezone = ZoneInfo(self.client.myself()["timeZone"])
+            except Exception as e:
+                logger.warning("Could not read the JIRA user's timezone; widening incremental filters",
+                               error=str(e))
+        return self._timezone
+    
+    def get_feedback_tickets(self, jql: str, max_results: int = 50,
+                             updated_since: Optional[str] = None,
+                             expand: Optional[List[str]] = None) -> List[JiraTicket]:
+        """
+        Fetch feedback tickets from JIRA based on JQL query.
+        
+        Only TICKET_FIELDS are requested, and raw search JSON is mapped directly
+        into JiraTicket without building jira.Issue resources. expand defaults to
+        the JIRA_EXPAND setting.
+        
+        When updated_since (a JIRA timestamp) is given, only issues updated at or
+        after it are returned, oldest change first. Errors are then re-raised
+        rather than answered with mock tickets, which an incremental run would
+        otherwise record as processed.
+        """
+        logger.info("Fetching JIRA tickets", jql=jql, max_results=max_results,
+                    updated_since=updated_since, use_mock=self.use_mock)
         
         if self.use_mock:
-            return self._get_mock_tickets(max_results)
+            tickets = self._get_mock_tickets()
+            if updated_since is not None:
+                since = parse_jira_timestamp(updated_since)
+                tickets = sorted(
+                    (t for t in tickets if parse_jira_timestamp(t.updated) >= since),
+                    key=lambda t: parse_jira_timestamp(t.updated)
+                )
+            return tickets[:max_results]
+        
+        if updated_since is not None:
+            jql = build_updated_since_jql(jql, updated_since, self._user_timezone())
+        
+        if expand is None:
+            expand = self.config.expand
         
         try:
-            all_issues = []
-            start_at = 0
-            
-            while True:
-                issues = self.client.search_issues(jql, startAt=start_at, maxResults=50)
-                if not issues:
-                    break
-                
-                all_issues.extend(issues)
-                TICKETS_PROCESSED.inc(len(issues))
-                
-                if len(issues) < 50 or len(all_issues) >= max_results:
-                    break
-                
-                start_at += 50
-                # Respect rate limits
-                time.sleep(0.5)
-            
-            # Limit to max_results
-            all_issues = all_issues[:max_results]
+            with start_span("jira.search", jql=jql, max_results=max_results) as span:
+                all_issues = self._search_all_pages(jql, max_results, expand)
+                span.set_attribute("issue_count", len(all_issues))
             
             # Convert to JiraTicket model
-            return [
-                JiraTicket(
-                    id=str(issue.id),
-                    key=issue.key,
-                    summary=issue.fields.summary,
-                    description=issue.fields.description or "",
-                    reporter=issue.fields.reporter.displayName if issue.fields.reporter else None,
-                    created=str(issue.fields.created) if hasattr(issue.fields, "created") else None,
-                    labels=issue.fields.labels if hasattr(issue.fields, "labels") else []
-                )
-                for issue in all_issues
-            ]
+            return [ticket_from_issue_json(issue) for issue in all_issues]
             
         except Exception as e:
             logger.error("Error fetching JIRA tickets", error=str(e))
+            if updated_since is not None:
+                raise
             return self._get_mock_tickets(max_results=3)  # Return some mock data as fallback
     
+    def _search_all_pages(self, jql: str, max_results: int, expand: List[str]) -> List[Dict[str, Any]]:
+        """
+        Fetch up to max_results raw issues.
+        
+        On Jira Server / Data Center the first page reports the total and the
+        page size the server actually allows; the remaining pages are then
+        fetched concurrently, in order. Jira Cloud's enhanced search reports no
+        total and pages by token, so its pages are followed one after another.
+        """
+        first_page = self._search_page(jql, 0, min(self.config.page_size, max_results), expand)
+        
+        all_issues = first_page["issues"]
+        JIRA_ISSUES_FETCHED.inc(len(all_issues))
+        if "total" not in first_page:
+            return self._follow_page_tokens(jql, first_page, max_results, expand)
+        
+        total = min(first_page["total"], max_results)
+        # Servers cap maxResults; follow whatever page size they granted
+        page_size = first_page.get("maxResults") or len(all_issues)
+        
+        if not all_issues or len(all_issues) >= total or page_size <= 0:
+            return all_issues[:max_results]
+        
+        start_offsets = range(len(all_issues), total, page_size)
+        logger.info("Fetching remaining JIRA pages", total=total, page_size=page_size, pages=len(start_offsets))
+        
+        def fetch(start_at: int) -> List[Dict[str, Any]]:
+            issues = self._search_page(jql, start_at, min(page_size, total - start_at), expand)["issues"]
+            JIRA_ISSUES_FETCHED.inc(len(issues))
+            return issues
+        
+        # Each page fetch runs in a copy of this context so its span joins the current trace
+        contexts = [contextvars.copy_context() for _ in start_offsets]
+        with ThreadPoolExecutor(max_workers=max(1, self.config.fetch_concurrency)) as pool:
+            for issues in pool.map(lambda context, start_at: context.run(fetch, start_at), contexts, start_offsets):
+                all_issues.extend(issues)
+        
+        return all_issues[:max_results]
+    
+    def _follow_page_tokens(self, jql: str, first_page: Dict[str, Any], max_results: int,
+                            expand: List[str]) -> List[Dict[str, Any]]:
+        """Fetch the remaining pages of a Jira Cloud enhanced search by following nextPageToken."""
+        all_issues = first_page["issues"]
+        page_size = first_page.get("maxResults") or len(all_issues) or self.config.page_size
+        page = first_page
+        while not page.get("isLast", True) and page.get("nextPageToken") and len(all_issues) < max_results:
+            page = self._search_page(jql, len(all_issues), min(page_size, max_results - len(all_issues)), expand,
+                                     next_page_token=page["nextPageToken"])
+            if not page["issues"]:
+                break
+            JIRA_ISSUES_FETCHED.inc(len(page["issues"]))
+            all_issues.extend(page["issues"])
+        return all_issues[:max_results]
+    
+    def _search_page(self, jql: str, start_at: int, page_size: int, expand: List[str],
+                     next_page_token: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Fetch one raw page of issues, waiting out rate limits and 429/503 responses.
+        
+        With next_page_token the page comes from Jira Cloud's enhanced search,
+        which does not accept start offsets.
+        """
+        attempt = 0
+        # The page timing includes rate-limit waits and retries
+        with Timer(STAGE_DURATION.labels(stage="jira_fetch_page")), \
+             start_span("jira.search_page", start_at=start_at, page_size=page_size) as span:
+            while True:
+                span.set_attribute("attempts", attempt + 1)
+                self.rate_limiter.acquire()
+                try:
+                    # The client translates field names in place, so each call gets its own list
+                    if next_page_token is not None:
+                        return self.client.enhanced_search_issues(
+                            jql,
+                            nextPageToken=next_page_token,
+                            maxResults=page_size,
+                            fields=list(TICKET_FIELDS),
+                            expand=",".join(expand) if expand else None,
+                            json_result=True
+                        )
+                    return self.client.search_issues(
+                        jql,
+                        startAt=start_at,
+                        maxResults=page_size,
+                        fields=list(TICKET_FIELDS),
+                        expand=",".join(expand) if expand else None,
+                        json_result=True
+                    )
+                except JIRAError as e:
+                    record_error("jira_fetch_page", e)
+                    if e.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.config.max_retries:
+                        raise
+                    
+                    headers = e.response.headers if e.response is not None else {}
+                    delay = parse_retry_after(headers.get("Retry-After"))
+                    if delay is None:
+                        delay = min(60.0, 2 ** attempt)
+                    
+                    # Pause the shared bucket so concurrent page fetches back off too
+                    self.rate_limiter.pause(delay)
+                    attempt += 1
+                    logger.warning("JIRA rate limited, retrying page", status_code=e.status_code,
+                                   start_at=start_at, delay=delay, attempt=attempt)
+    
     def _get_mock_tickets(self, max_results: int = 5) -> List[JiraTicket]:
         """Generate mock JIRA tickets for development/testing."""
         mock_tickets = [
@@ -95,6 +279,7 @@ class JiraClient:
                 description="I was trying to export my data but couldn't find the button anywhere. After 5 minutes of searching, I found it hidden in a submenu. This should be more prominent.",
                 reporter="Jane Smith",
                 created="2023-11-01T10:30:00.000+0000",
+                updated="2023-11-01T10:30:00.000+0000",
                 labels=["ux-feedback", "export"]
             ),
             JiraTicket(
@@ -104,6 +289,7 @@ class JiraClient:
                 description="Every time I log in, the dashboard takes at least 10 seconds to load. This is frustrating when I need to quickly check something.",
                 reporter="John Doe",
                 created="2023-11-02T14:15:00.000+0000",
+                updated="2023-11-02T14:15:00.000+0000",
                 labels=["ux-feedback", "performance"]
             ),
             JiraTicket(
@@ -113,6 +299,7 @@ class JiraClient:
                 description="The dark mode you added in the last update is fantastic! It's easier on my eyes when working late at night. Great job!",
                 reporter="Alex Johnson",
                 created="2023-11-03T09:45:00.000+0000",
+                updated="2023-11-03T09:45:00.000+0000",
                 labels=["ux-feedback", "positive"]
             ),
             JiraTicket(
@@ -122,6 +309,7 @@ class JiraClient:
                 description="When I search for keywords that I know exist in my documents, the search often returns no results or irrelevant ones. The search algorithm needs improvement.",
                 reporter="Sarah Williams",
                 created="2023-11-04T11:20:00.000+0000",
+                updated="2023-11-04T11:20:00.000+0000",
                 labels=["ux-feedback", "search"]
             ),
             JiraTicket(
@@ -131,6 +319,7 @@ class JiraClient:
                 description="Currently I have to edit each task individually which is time-consuming. It would be great to have a way to select multiple tasks and edit them all at once.",
                 reporter="Mike Brown",
                 created="2023-11-05T16:00:00.000+0000",
+                updated="2023-11-05T16:00:00.000+0000",
                 labels=["ux-feedback", "feature-request"]
             )
         ]
@@ -140,8 +329,8 @@ class JiraClient:
 # Initialize a global instance of the client
 jira_client = JiraClient()
 
-def get_jira_feedback(jql: str, max_results: int = 50) -> List[Dict[str, Any]]:
+def get_jira_feedback(jql: str, max_results: int = 50, updated_since: Optional[str] = None) -> List[Dict[str, Any]]:
     """Tool to fetch JIRA feedback tickets based on JQL query."""
-    tickets = jira_client.get_feedback_tickets(jql, max_results)
+    tickets = jira_client.get_feedback_tickets(jql, max_results, updated_since=updated_since)
     # Convert to dict for easier use with the agent
     return [ticket.model_dump() for ticket in tickets] 
\ No newline at end of file
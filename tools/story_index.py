@@ -0,0 +1,198 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import config
+from observability import logger
+from tools.clustering import ticket_text, tokenize
+from tools.watermark_store import ticket_content_hash
+
+# Cap on query terms so long descriptions do not slow down lookups
+MAX_QUERY_TERMS = 64
+
+# Candidates fetched by keyword rank before re-scoring by token overlap
+REUSE_CANDIDATES = 5
+
+def token_similarity(a: str, b: str) -> float:
+    """Jaccard similarity of the token sets of two texts."""
+    a_tokens, b_tokens = set(tokenize(a)), set(tokenize(b))
+    if not a_tokens or not b_tokens:
+        return 0.0
+    return len(a_tokens & b_tokens) / len(a_tokens | b_tokens)
+
+def match_query(text: str) -> Optional[str]:
+    """Build an FTS5 query matching any of the text's tokens, or None if it has none."""
+    terms = list(dict.fromkeys(tokenize(text)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"' for term in terms)
+
+class StoryIndex:
+    """
+    Persistent keyword index of processed tickets and their generated stories.
+
+    Tickets live in a SQLite table with an FTS5 full-text index over their
+    summary and description; lookups rank candidates by BM25. The database
+    is memory-mapped so repeated lookups are served from the page cache.
+    """
+
+    def __init__(self, path: str, mmap_size: int = 256 * 1024 * 1024):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS stories (
+                id INTEGER PRIMARY KEY,
+                ticket_key TEXT NOT NULL UNIQUE,
+                content_hash TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                description TEXT NOT NULL,
+                result TEXT NOT NULL,
+                recorded_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS stories_content_hash ON stories (content_hash);
+            CREATE VIRTUAL TABLE IF NOT EXISTS stories_fts USING fts5(summary, description);
+            """
+        )
+        self._conn.commit()
+
+    def add(self, ticket: Dict[str, Any], result: Dict[str, Any]):
+        """Index a ticket with its analysis result, replacing any earlier entry for the ticket."""
+        self.add_many([(ticket, result)])
+
+    def add_many(self, entries: List[Tuple[Dict[str, Any], Dict[str, Any]]]):
+        """Index (ticket, result) pairs like ``add``, in a single transaction."""
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            for ticket, result in entries:
+                self._upsert(ticket, result, now)
+            self._conn.commit()
+
+    def _upsert(self, ticket: Dict[str, Any], result: Dict[str, Any], recorded_at: float):
+        summary = ticket.get("summary") or ""
+        description = ticket.get("description") or ""
+        values = (ticket_content_hash(ticket), summary, description, json.dumps(result), recorded_at)
+        row = self._conn.execute(
+            "SELECT id FROM stories WHERE ticket_key = ?", (ticket["key"],)
+        ).fetchone()
+        if row is None:
+            story_id = self._conn.execute(
+                "INSERT INTO stories (content_hash, summary, description, result, recorded_at, ticket_key) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                values + (ticket["key"],)
+            ).lastrowid
+        else:
+            story_id = row[0]
+            self._conn.execute(
+                "UPDATE stories SET content_hash = ?, summary = ?, description = ?, result = ?, recorded_at = ? "
+                "WHERE id = ?",
+                values + (story_id,)
+            )
+            self._conn.execute("DELETE FROM stories_fts WHERE rowid = ?", (story_id,))
+        self._conn.execute(
+            "INSERT INTO stories_fts (rowid, summary, description) VALUES (?, ?, ?)",
+            (story_id, summary, description)
+        )
+
+    def search(self, summary: str, description: str = "", k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Return up to ``k`` indexed stories most similar to a ticket, best first.
+
+        Each match has the ticket's key and summary, its BM25 ``score`` (higher
+        is better), its token ``similarity`` to the query in [0, 1], and the
+        stored ``user_story`` and ``pm_response``.
+        """
+        text = ticket_text({"summary": summary, "description": description})
+        query = match_query(text)
+        if query is None or k <= 0:
+            return []
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT s.ticket_key, s.summary, s.description, s.result, bm25(stories_fts) AS rank "
+                "FROM stories_fts JOIN stories s ON s.id = stories_fts.rowid "
+                "WHERE stories_fts MATCH ? ORDER BY rank LIMIT ?",
+                (query, k)
+            ).fetchall()
+
+        matches = []
+        for ticket_key, match_summary, match_description, result, rank in rows:
+            result = json.loads(result)
+            matches.append({
+                "ticket_id": ticket_key,
+                "summary": match_summary,
+                "score": round(-rank, 4),
+                "similarity": round(token_similarity(
+                    text, ticket_text({"summary": match_summary, "description": match_description})
+                ), 4),
+                "user_story": result.get("user_story", {}),
+                "pm_response": result.get("pm_response", "")
+            })
+        return matches
+
+    def find_reusable(self, ticket: Dict[str, Any], threshold: float = 0.9) -> Optional[Dict[str, Any]]:
+        """
+        Return a stored story that can stand in for the ticket's, if any.
+
+        Tickets with identical content always match; otherwise the closest
+        candidate must reach ``threshold`` token similarity.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT ticket_key, summary, result FROM stories WHERE content_hash = ? "
+                "ORDER BY ticket_key = ? DESC, recorded_at DESC LIMIT 1",
+                (ticket_content_hash(ticket), ticket["key"])
+            ).fetchone()
+        if row is not None:
+            result = json.loads(row[2])
+            return {
+                "ticket_id": row[0],
+                "summary": row[1],
+                "similarity": 1.0,
+                "user_story": result.get("user_story", {}),
+                "pm_response": result.get("pm_response", "")
+            }
+
+        if threshold > 1:
+            return None
+        candidates = self.search(ticket.get("summary") or "", ticket.get("description") or "", REUSE_CANDIDATES)
+        best = max(candidates, key=lambda match: match["similarity"], default=None)
+        if best is not None and best["similarity"] >= threshold:
+            return best
+        return None
+
+    def find_reusable_many(self, tickets: List[Dict[str, Any]],
+                           threshold: float = 0.9) -> List[Optional[Dict[str, Any]]]:
+        """Run ``find_reusable`` for each ticket, so callers can do all lookups in one thread hop."""
+        return [self.find_reusable(ticket, threshold) for ticket in tickets]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM stories").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_story_index: Optional[StoryIndex] = None
+
+def get_story_index() -> Optional[StoryIndex]:
+    """Return the shared story index, opening it on first use; None when disabled."""
+    global _story_index
+    if _story_index is None and config.story_index_path:
+        _story_index = StoryIndex(config.story_index_path)
+        logger.info("Opened story index", path=config.story_index_path, entries=len(_story_index))
+    return _story_index
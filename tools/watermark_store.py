@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import config
+from observability import logger
+
+# Watermark used for a query's first incremental run
+INITIAL_WATERMARK = "1970-01-01T00:00:00.000+0000"
+
+# Keys per ticket-state query, below SQLite's bound-parameter limit
+STATE_LOOKUP_CHUNK = 500
+
+def ticket_content_hash(ticket: Dict[str, Any]) -> str:
+    """Hash the ticket fields that feed into generation."""
+    content = json.dumps(
+        {"summary": ticket.get("summary", ""), "description": ticket.get("description") or ""},
+        sort_keys=True
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+class WatermarkStore:
+    """
+    SQLite store of incremental-analysis state per JQL query.
+
+    For each query it keeps the latest ``updated`` timestamp that was fully
+    processed, plus the content hash and analysis result of every ticket.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS watermarks (
+                jql TEXT PRIMARY KEY,
+                last_updated TEXT NOT NULL,
+                recorded_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS ticket_state (
+                jql TEXT NOT NULL,
+                ticket_key TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                result TEXT,
+                recorded_at REAL NOT NULL,
+                PRIMARY KEY (jql, ticket_key)
+            );
+            """
+        )
+        self._conn.commit()
+
+    def get_watermark(self, jql: str) -> Optional[str]:
+        """Return the last processed ``updated`` timestamp for a query."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_updated FROM watermarks WHERE jql = ?", (jql,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, jql: str, last_updated: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO watermarks (jql, last_updated, recorded_at) VALUES (?, ?, ?)",
+                (jql, last_updated, time.time())
+            )
+            self._conn.commit()
+
+    def get_ticket_state(self, jql: str, ticket_key: str) -> Optional[Tuple[str, Optional[Dict[str, Any]]]]:
+        """Return the stored content hash and result for a ticket, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, result FROM ticket_state WHERE jql = ? AND ticket_key = ?",
+                (jql, ticket_key)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]) if row[1] else None
+
+    def get_ticket_states(self, jql: str,
+                          ticket_keys: List[str]) -> Dict[str, Tuple[str, Optional[Dict[str, Any]]]]:
+        """Return the stored content hash and result of each ticket that has one, by key."""
+        states = {}
+        with self._lock:
+            for offset in range(0, len(ticket_keys), STATE_LOOKUP_CHUNK):
+                chunk = ticket_keys[offset:offset + STATE_LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    "SELECT ticket_key, content_hash, result FROM ticket_state "
+                    f"WHERE jql = ? AND ticket_key IN ({', '.join('?' for _ in chunk)})",
+                    (jql, *chunk)
+                ).fetchall()
+                for ticket_key, content_hash, result in rows:
+                    states[ticket_key] = (content_hash, json.loads(result) if result else None)
+        return states
+
+    def save_ticket_state(self, jql: str, ticket_key: str, content_hash: str, result: Optional[Dict[str, Any]]):
+        self.save_ticket_states(jql, [(ticket_key, content_hash, result)])
+
+    def save_ticket_states(self, jql: str, states: List[Tuple[str, str, Optional[Dict[str, Any]]]]):
+        """Store (ticket key, content hash, result) entries in a single transaction."""
+        if not states:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO ticket_state (jql, ticket_key, content_hash, result, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (jql, ticket_key, content_hash, json.dumps(result) if result is not None else None, now)
+                    for ticket_key, content_hash, result in states
+                ]
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_watermark_store: Optional[WatermarkStore] = None
+
+def get_watermark_store() -> WatermarkStore:
+    """Return the shared watermark store, opening it on first use."""
+    global _watermark_store
+    if _watermark_store is None:
+        _watermark_store = WatermarkStore(config.watermark_db_path)
+        logger.info("Opened watermark store", path=config.watermark_db_path)
+    return _watermark_store
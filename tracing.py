@@ -0,0 +1,150 @@
+import contextvars
+import secrets
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from structlog.contextvars import bind_contextvars, reset_contextvars
+
+from config import config
+from observability import logger
+
+class Span:
+    """
+    A timed operation within a trace.
+
+    IDs follow the W3C trace-context format (32 and 16 hex digits), so spans
+    can be handed to an OpenTelemetry collector unchanged.
+    """
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = "ok"
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.end_time is None else self.end_time - self.start_time
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "status": self.status,
+            "start_time": self.start_time,
+            "duration": self.duration,
+            "attributes": self.attributes
+        }
+
+class NoOpSpan(Span):
+    """Span handed out while tracing is off; it records nothing."""
+
+    def __init__(self):
+        super().__init__("noop", trace_id="0" * 32)
+        self.span_id = "0" * 16
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+NOOP_SPAN = NoOpSpan()
+
+class SpanExporter(ABC):
+    """Receives every span when it ends."""
+
+    @abstractmethod
+    def export(self, span: Span):
+        """Handle a finished span."""
+
+class InMemorySpanExporter(SpanExporter):
+    """Keeps finished spans in memory, for tests."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+    def find(self, name: str) -> List[Span]:
+        return [span for span in self.spans if span.name == name]
+
+    def clear(self):
+        self.spans.clear()
+
+class LogSpanExporter(SpanExporter):
+    """Writes each finished span as a structured log line."""
+
+    def export(self, span: Span):
+        # The span's own IDs, not whichever span is bound to the log context at export time
+        logger.info("Span finished", span=span.name, duration=round(span.duration, 6),
+                    trace_id=span.trace_id, span_id=span.span_id, parent_id=span.parent_id,
+                    status=span.status, **span.attributes)
+
+_exporter: Optional[SpanExporter] = None
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+def set_exporter(exporter: Optional[SpanExporter]):
+    """Install the exporter for finished spans; None turns tracing off."""
+    global _exporter
+    _exporter = exporter
+
+def create_exporter() -> Optional[SpanExporter]:
+    """Build the exporter selected by configuration."""
+    if config.tracing_exporter == "none":
+        return None
+    if config.tracing_exporter == "log":
+        return LogSpanExporter()
+    raise ValueError(f"Unknown tracing exporter: {config.tracing_exporter}")
+
+def current_span() -> Span:
+    """Return the active span, or a no-op span outside of any trace."""
+    return _current_span.get() or NOOP_SPAN
+
+@contextmanager
+def start_span(name: str, **attributes) -> Iterator[Span]:
+    """
+    Run the block as a span, a child of the active span if there is one.
+
+    While the span is active, log lines carry its ``trace_id`` and ``span_id``.
+    Tasks created inside the block inherit it as their parent. Threads do not
+    inherit it; run them through ``contextvars.copy_context().run``.
+    An exception marks the span as failed and is re-raised.
+    """
+    exporter = _exporter
+    if exporter is None:
+        yield NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    span = Span(
+        name,
+        trace_id=parent.trace_id if parent is not None else secrets.token_hex(16),
+        parent_id=parent.span_id if parent is not None else None,
+        attributes=attributes
+    )
+    span_token = _current_span.set(span)
+    log_tokens = bind_contextvars(trace_id=span.trace_id, span_id=span.span_id)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = "error"
+        span.set_attribute("error.type", type(e).__name__)
+        raise
+    finally:
+        span.end_time = time.time()
+        reset_contextvars(**log_tokens)
+        _current_span.reset(span_token)
+        exporter.export(span)
+
+set_exporter(create_exporter())
@@ -0,0 +1,111 @@
+"""
+Workflow worker process.
+
+Run one or more of these alongside the API when WORKFLOW_EXECUTION=queue:
+
+    python worker.py
+
+Each worker claims workflow jobs from the shared SQLite queue and runs them,
+writing progress to the shared workflow store that every API process reads.
+"""
+import asyncio
+import os
+import signal
+import socket
+import uuid
+from typing import Any, Dict
+
+from config import config
+from observability import logger
+from job_queue import create_job_queue, SQLiteJobQueue
+from profiling import LoopWatchdog
+import main
+
+class WorkflowWorker:
+    """Claims queued workflow jobs and runs up to ``concurrency`` at a time."""
+
+    def __init__(self, queue: SQLiteJobQueue, concurrency: int = 4, poll_interval: float = 1.0):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def run(self, stop: asyncio.Event):
+        """Process jobs until stop is set, then wait for running jobs to finish."""
+        logger.info("Worker started", worker_id=self.worker_id, concurrency=self.concurrency)
+        running = set()
+
+        while not stop.is_set():
+            job = None
+            if len(running) < self.concurrency:
+                job = await asyncio.to_thread(self.queue.claim, self.worker_id)
+
+            if job is not None:
+                running.add(asyncio.create_task(self._run_job(job)))
+                continue
+
+            # Idle or at capacity: wait for a job to finish, a stop request or the next poll
+            stopping = asyncio.create_task(stop.wait())
+            done, _ = await asyncio.wait(running | {stopping}, timeout=self.poll_interval,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            stopping.cancel()
+            running -= done
+
+        if running:
+            await asyncio.wait(running)
+        logger.info("Worker stopped", worker_id=self.worker_id)
+
+    async def _run_job(self, job: Dict[str, Any]):
+        job_id = job["job_id"]
+        logger.info("Running job", job_id=job_id, kind=job["kind"], attempt=job["attempts"])
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            if job["kind"] == "workflow":
+                await main.run_workflow(job_id)
+            elif job["kind"] == "analysis":
+                await main.run_analysis(job_id)
+            else:
+                raise ValueError(f"Unknown job kind: {job['kind']}")
+        except Exception as e:
+            logger.error("Job failed", job_id=job_id, error=str(e))
+            await asyncio.to_thread(self.queue.fail, job_id, str(e))
+        else:
+            await asyncio.to_thread(self.queue.complete, job_id)
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job_id: str):
+        """Keep the job's lease alive while it runs."""
+        while True:
+            await asyncio.sleep(self.queue.lease_timeout / 3)
+            await asyncio.to_thread(self.queue.extend_lease, job_id, self.worker_id)
+
+async def run_worker():
+    queue = create_job_queue()
+    if queue is None:
+        raise SystemExit("worker.py requires WORKFLOW_EXECUTION=queue")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:
+            pass
+
+    watchdog = None
+    if config.loop_watchdog_enabled:
+        watchdog = LoopWatchdog(config.loop_watchdog_threshold, config.loop_watchdog_interval)
+        watchdog.start()
+
+    worker = WorkflowWorker(queue, concurrency=config.worker_concurrency, poll_interval=config.worker_poll_interval)
+    try:
+        await worker.run(stop)
+    finally:
+        if watchdog is not None:
+            await watchdog.stop()
+        await main.close_openai_client()
+        queue.close()
+
+if __name__ == "__main__":
+    asyncio.run(run_worker())
@@ -0,0 +1,418 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from config import config
+from observability import logger
+
+# Fields stored as JSON in the SQLite backend
+JSON_FIELDS = ("results", "tickets", "request")
+
+# Fields every workflow record carries besides its steps
+WORKFLOW_FIELDS = (
+    "is_complete", "current_status", "results", "tickets", "request",
+    "timestamp", "updated_at", "version", "results_version", "tickets_version"
+)
+
+def new_workflow_record(request: Dict[str, Any], current_status: str = "Initializing agent...") -> Dict[str, Any]:
+    """Build the initial state of a workflow."""
+    now = time.time()
+    return {
+        "is_complete": False,
+        "current_status": current_status,
+        "results": [],
+        "tickets": [],
+        "request": request,
+        "timestamp": now,
+        "updated_at": now,
+        "version": 0,
+        "results_version": 0,
+        "tickets_version": 0
+    }
+
+class WorkflowStore(ABC):
+    """
+    Interface for workflow state backends.
+
+    Every change bumps the workflow's version; results, tickets and each step
+    also record the version at which they last changed so status reads can
+    send deltas. Only completed workflows are evicted.
+    """
+
+    # Whether calls do blocking I/O; async callers should run them off the event loop
+    blocking = False
+
+    @abstractmethod
+    def create(self, workflow_id: str, record: Dict[str, Any]):
+        """Store a new workflow record, replacing any workflow with the same ID."""
+
+    @abstractmethod
+    def get(self, workflow_id: str, since: int = 0,
+            changed_after: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Return a snapshot of the workflow, or None if it does not exist.
+
+        ``steps`` holds the steps from index ``since`` onwards and
+        ``step_count`` the total number of steps. With ``changed_after``, the
+        steps start earlier if a step before ``since`` was updated after that
+        version. ``step_offset`` is the index of the first returned step.
+        """
+
+    @abstractmethod
+    def update(self, workflow_id: str, **fields) -> int:
+        """Update workflow fields and return the new version."""
+
+    @abstractmethod
+    def append_step(self, workflow_id: str, step: Dict[str, Any]) -> int:
+        """Append a step and return the new version."""
+
+    @abstractmethod
+    def update_last_step(self, workflow_id: str, **fields) -> int:
+        """Update fields of the most recent step and return the new version."""
+
+    @abstractmethod
+    def clear_steps(self, workflow_id: str) -> int:
+        """Remove every step and return the new version."""
+
+    @abstractmethod
+    def delete(self, workflow_id: str):
+        """Remove a workflow and its steps, if it exists."""
+
+    @abstractmethod
+    def evict_expired(self) -> List[str]:
+        """Remove expired completed workflows and return their IDs."""
+
+    def __contains__(self, workflow_id: str) -> bool:
+        return self.get(workflow_id, since=2 ** 31) is not None
+
+    def close(self):
+        pass
+
+class InMemoryWorkflowStore(WorkflowStore):
+    """Process-local store with TTL and LRU eviction of completed workflows."""
+
+    def __init__(self, ttl: float = 3600.0, max_entries: int = 1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._workflows: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, workflow_id: str, record: Dict[str, Any]):
+        with self._lock:
+            self._workflows[workflow_id] = {**record, "steps": [], "step_versions": []}
+            self._evict_over_capacity()
+
+    def get(self, workflow_id: str, since: int = 0,
+            changed_after: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            workflow = self._workflows.get(workflow_id)
+            if workflow is None:
+                return None
+            self._workflows.move_to_end(workflow_id)
+            step_count = len(workflow["steps"])
+            offset = min(since, step_count)
+            if changed_after is not None:
+                offset = next(
+                    (index for index, version in enumerate(workflow["step_versions"][:offset])
+                     if version > changed_after),
+                    offset
+                )
+            snapshot = {key: workflow[key] for key in WORKFLOW_FIELDS}
+            snapshot["workflow_id"] = workflow_id
+            snapshot["steps"] = workflow["steps"][offset:]
+            snapshot["step_offset"] = offset
+            snapshot["step_count"] = step_count
+            return snapshot
+
+    def _touch(self, workflow: Dict[str, Any]) -> int:
+        workflow["version"] += 1
+        workflow["updated_at"] = time.time()
+        return workflow["version"]
+
+    def update(self, workflow_id: str, **fields) -> int:
+        with self._lock:
+            workflow = self._workflows[workflow_id]
+            workflow.update(fields)
+            version = self._touch(workflow)
+            if "results" in fields:
+                workflow["results_version"] = version
+            if "tickets" in fields:
+                workflow["tickets_version"] = version
+            return version
+
+    def append_step(self, workflow_id: str, step: Dict[str, Any]) -> int:
+        with self._lock:
+            workflow = self._workflows[workflow_id]
+            workflow["steps"].append(step)
+            version = self._touch(workflow)
+            workflow["step_versions"].append(version)
+            return version
+
+    def update_last_step(self, workflow_id: str, **fields) -> int:
+        with self._lock:
+            workflow = self._workflows[workflow_id]
+            workflow["steps"][-1].update(fields)
+            version = self._touch(workflow)
+            workflow["step_versions"][-1] = version
+            return version
+
+    def clear_steps(self, workflow_id: str) -> int:
+        with self._lock:
+            workflow = self._workflows[workflow_id]
+            workflow["steps"] = []
+            workflow["step_versions"] = []
+            return self._touch(workflow)
+
+    def delete(self, workflow_id: str):
+        with self._lock:
+            self._workflows.pop(workflow_id, None)
+
+    def evict_expired(self) -> List[str]:
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [
+                workflow_id for workflow_id, workflow in self._workflows.items()
+                if workflow["is_complete"] and workflow["updated_at"] < cutoff
+            ]
+            for workflow_id in expired:
+                del self._workflows[workflow_id]
+            return expired
+
+    def _evict_over_capacity(self):
+        """Drop least recently used completed workflows beyond max_entries."""
+        excess = len(self._workflows) - self.max_entries
+        if excess <= 0:
+            return
+        for workflow_id in [w for w, data in self._workflows.items() if data["is_complete"]][:excess]:
+            del self._workflows[workflow_id]
+
+class SQLiteWorkflowStore(WorkflowStore):
+    """
+    SQLite-backed store that survives restarts and can be shared by processes.
+
+    Steps are kept as append-only rows keyed by (workflow_id, step_index), so
+    status reads only load the steps a client has not seen yet.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, ttl: float = 3600.0, max_entries: int = 1000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS workflows (
+                workflow_id TEXT PRIMARY KEY,
+                is_complete INTEGER NOT NULL,
+                current_status TEXT NOT NULL,
+                results TEXT NOT NULL,
+                tickets TEXT NOT NULL,
+                request TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                version INTEGER NOT NULL,
+                results_version INTEGER NOT NULL,
+                tickets_version INTEGER NOT NULL,
+                step_count INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_workflows_eviction ON workflows (is_complete, updated_at);
+            CREATE TABLE IF NOT EXISTS workflow_steps (
+                workflow_id TEXT NOT NULL,
+                step_index INTEGER NOT NULL,
+                step TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (workflow_id, step_index)
+            );
+            """
+        )
+        self._conn.commit()
+
+    def create(self, workflow_id: str, record: Dict[str, Any]):
+        values = {key: record[key] for key in WORKFLOW_FIELDS}
+        for key in JSON_FIELDS:
+            values[key] = json.dumps(values[key])
+        values["is_complete"] = int(values["is_complete"])
+        columns = ", ".join(values)
+        placeholders = ", ".join("?" for _ in values)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO workflows (workflow_id, {columns}) VALUES (?, {placeholders})",
+                (workflow_id, *values.values())
+            )
+            self._conn.commit()
+            self._evict_over_capacity()
+
+    def get(self, workflow_id: str, since: int = 0,
+            changed_after: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT {', '.join(WORKFLOW_FIELDS)}, step_count FROM workflows WHERE workflow_id = ?",
+                (workflow_id,)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            offset = min(since, row[-1])
+            if changed_after is not None:
+                (first_changed,) = self._conn.execute(
+                    "SELECT MIN(step_index) FROM workflow_steps "
+                    "WHERE workflow_id = ? AND step_index < ? AND version > ?",
+                    (workflow_id, offset, changed_after)
+                ).fetchone()
+                if first_changed is not None:
+                    offset = first_changed
+            steps = self._conn.execute(
+                "SELECT step FROM workflow_steps WHERE workflow_id = ? AND step_index >= ? ORDER BY step_index",
+                (workflow_id, offset)
+            ).fetchall()
+
+        snapshot = dict(zip((*WORKFLOW_FIELDS, "step_count"), row))
+        for key in JSON_FIELDS:
+            snapshot[key] = json.loads(snapshot[key])
+        snapshot["is_complete"] = bool(snapshot["is_complete"])
+        snapshot["workflow_id"] = workflow_id
+        snapshot["steps"] = [json.loads(step) for (step,) in steps]
+        snapshot["step_offset"] = offset
+        return snapshot
+
+    def _touch(self, workflow_id: str, extra_sql: str = "", extra_params: tuple = ()) -> int:
+        """Bump the version (applying extra column updates) and return it."""
+        cursor = self._conn.execute(
+            f"UPDATE workflows SET version = version + 1, updated_at = ?{extra_sql} WHERE workflow_id = ?",
+            (time.time(), *extra_params, workflow_id)
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(workflow_id)
+        return self._conn.execute(
+            "SELECT version FROM workflows WHERE workflow_id = ?", (workflow_id,)
+        ).fetchone()[0]
+
+    def update(self, workflow_id: str, **fields) -> int:
+        assignments = []
+        params = []
+        for key, value in fields.items():
+            if key not in WORKFLOW_FIELDS:
+                raise ValueError(f"Unknown workflow field: {key}")
+            assignments.append(f", {key} = ?")
+            if key in JSON_FIELDS:
+                value = json.dumps(value)
+            elif key == "is_complete":
+                value = int(value)
+            params.append(value)
+        # Collections record the version at which they changed
+        if "results" in fields:
+            assignments.append(", results_version = version + 1")
+        if "tickets" in fields:
+            assignments.append(", tickets_version = version + 1")
+
+        with self._lock:
+            version = self._touch(workflow_id, "".join(assignments), tuple(params))
+            self._conn.commit()
+            return version
+
+    def append_step(self, workflow_id: str, step: Dict[str, Any]) -> int:
+        with self._lock:
+            version = self._touch(workflow_id, ", step_count = step_count + 1")
+            self._conn.execute(
+                "INSERT INTO workflow_steps (workflow_id, step_index, step, version) "
+                "SELECT workflow_id, step_count - 1, ?, version FROM workflows WHERE workflow_id = ?",
+                (json.dumps(step), workflow_id)
+            )
+            self._conn.commit()
+            return version
+
+    def update_last_step(self, workflow_id: str, **fields) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT step_index, step FROM workflow_steps WHERE workflow_id = ? "
+                "ORDER BY step_index DESC LIMIT 1",
+                (workflow_id,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(workflow_id)
+            step = {**json.loads(row[1]), **fields}
+            version = self._touch(workflow_id)
+            self._conn.execute(
+                "UPDATE workflow_steps SET step = ?, version = ? WHERE workflow_id = ? AND step_index = ?",
+                (json.dumps(step), version, workflow_id, row[0])
+            )
+            self._conn.commit()
+            return version
+
+    def clear_steps(self, workflow_id: str) -> int:
+        with self._lock:
+            version = self._touch(workflow_id, ", step_count = 0")
+            self._conn.execute("DELETE FROM workflow_steps WHERE workflow_id = ?", (workflow_id,))
+            self._conn.commit()
+            return version
+
+    def delete(self, workflow_id: str):
+        with self._lock:
+            self._delete_many([workflow_id])
+            self._conn.commit()
+
+    def _delete_many(self, workflow_ids: List[str]):
+        for workflow_id in workflow_ids:
+            self._conn.execute("DELETE FROM workflow_steps WHERE workflow_id = ?", (workflow_id,))
+            self._conn.execute("DELETE FROM workflows WHERE workflow_id = ?", (workflow_id,))
+
+    def evict_expired(self) -> List[str]:
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [
+                workflow_id for (workflow_id,) in self._conn.execute(
+                    "SELECT workflow_id FROM workflows WHERE is_complete = 1 AND updated_at < ?", (cutoff,)
+                )
+            ]
+            self._delete_many(expired)
+            self._conn.commit()
+            return expired
+
+    def _evict_over_capacity(self):
+        """Drop the least recently updated completed workflows beyond max_entries."""
+        count = self._conn.execute("SELECT COUNT(*) FROM workflows").fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        oldest = [
+            workflow_id for (workflow_id,) in self._conn.execute(
+                "SELECT workflow_id FROM workflows WHERE is_complete = 1 ORDER BY updated_at ASC LIMIT ?",
+                (excess,)
+            )
+        ]
+        self._delete_many(oldest)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def create_workflow_store() -> WorkflowStore:
+    """Create the workflow store selected by WORKFLOW_STORE."""
+    if config.workflow_store == "sqlite":
+        store = SQLiteWorkflowStore(
+            config.workflow_db_path,
+            ttl=config.workflow_ttl,
+            max_entries=config.workflow_max_entries
+        )
+    elif config.workflow_store == "memory":
+        store = InMemoryWorkflowStore(ttl=config.workflow_ttl, max_entries=config.workflow_max_entries)
+    else:
+        raise ValueError(f"Unknown workflow store: {config.workflow_store}")
+
+    logger.info("Initialized workflow store", backend=config.workflow_store)
+    return store